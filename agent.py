@@ -1,6 +1,8 @@
 # agent.py
 import os
-from typing import Dict, Any, Optional
+import logging
+import time
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional
 from dotenv import load_dotenv
 
 from langchain_openai import ChatOpenAI
@@ -8,6 +10,9 @@ from langchain_core.messages import HumanMessage, SystemMessage
 
 from auth_and_profile import get_or_create_user
 from memory_layer import HindsightMemory
+from hindsight_pool import get_bank
+from metrics import record_stage, stage, swallowed_error
+from response_cache import get_response_cache
 
 # Load environment variables from .env file
 load_dotenv()
@@ -15,6 +20,8 @@ load_dotenv()
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 USE_ENTERPRISE_MODE = os.environ.get("USE_ENTERPRISE_MODE", "false").lower() == "true"
 
+logger = logging.getLogger(__name__)
+
 llm = ChatOpenAI(
     model="gpt-4o-mini",  # or lab-preferred model
     api_key=OPENAI_API_KEY,
@@ -32,11 +39,9 @@ If memory_snippets is empty, just answer normally.
 
 def build_agent_for_user(user_id: str) -> Dict[str, Any]:
     profile = get_or_create_user(user_id)
-    memory = HindsightMemory(
-        base_url="http://localhost:8888",
-        bank_id=f"user-{user_id}",
-        enabled=profile.allow_memory,
-    )
+    memory = get_bank(HindsightMemory, "http://localhost:8888", f"user-{user_id}")
+    # Bank handles are shared, so consent is re-applied on every turn
+    memory.enabled = profile.allow_memory
     return {"profile": profile, "memory": memory}
 
 
@@ -57,37 +62,219 @@ def run_agent_turn(
         )
     
     # Original simple mode
+    with stage("chat.turn", user_id=user_id):
+        turn = _prepare_turn(user_id, user_message)
+        answer_text = turn["cached_answer"]
+        if answer_text is None:
+            human_msg = HumanMessage(content=user_message)
+
+            # Invoke LLM directly with messages
+            with stage("chat.llm"):
+                response = llm.invoke([turn["system_msg"], human_msg])
+            answer_text = response.content
+        _finish_turn(turn, user_message, answer_text)
+
+    return answer_text
+
+
+def stream_agent_turn(
+    user_id: str,
+    user_message: str,
+    product_id: Optional[str] = None,
+    department: Optional[str] = None
+) -> Iterator[str]:
+    """Like ``run_agent_turn`` but yields the answer in chunks as the LLM produces them.
+
+    The answer is cached and retained once the stream completes; a stream
+    abandoned by the client is not retained.
+    """
+    if USE_ENTERPRISE_MODE:
+        from enterprise_agent import stream_enterprise_agent_turn
+        yield from stream_enterprise_agent_turn(
+            user_id=user_id,
+            user_message=user_message,
+            product_id=product_id,
+            department=department
+        )
+        return
+
+    started = time.perf_counter()
+    turn = _prepare_turn(user_id, user_message)
+    if turn["cached_answer"] is not None:
+        yield turn["cached_answer"]
+        _finish_turn(turn, user_message, turn["cached_answer"])
+        record_stage("chat.turn", started, user_id=user_id)
+        return
+
+    parts = []
+    llm_started = time.perf_counter()
+    for chunk in llm.stream([turn["system_msg"], HumanMessage(content=user_message)]):
+        if chunk.content:
+            if not parts:
+                record_stage("chat.llm_first_token", llm_started)
+            parts.append(chunk.content)
+            yield chunk.content
+    record_stage("chat.llm", llm_started)
+    _finish_turn(turn, user_message, "".join(parts))
+    record_stage("chat.turn", started, user_id=user_id)
+
+
+def _prepare_turn(user_id: str, user_message: str) -> Dict[str, Any]:
+    """Recall memory and build the prompt for a simple-mode turn"""
     ctx = build_agent_for_user(user_id)
     memory: HindsightMemory = ctx["memory"]
 
     # 1) Recall from Hindsight to build context
     try:
-        recalled = memory.recall(query=user_message)  # natural-language query
-        memory_context = "\n".join(f"- {m}" for m in recalled) if recalled else "None."
+        with stage("chat.recall"):
+            recalled = memory.recall(query=user_message)  # natural-language query
     except Exception as e:
         # If Hindsight is unavailable, continue without memory
-        print(f"Warning: Could not recall memory: {e}")
-        memory_context = "None."
+        logger.warning(f"Could not recall memory: {e}")
+        swallowed_error("agent", "recall")
+        recalled = []
+
+    with stage("chat.prompt"):
+        turn = _build_turn(memory, recalled, user_id)
+    # Reuse a cached answer to a similar question over the same memory
+    with stage("chat.cache_lookup"):
+        turn["cached_answer"] = get_response_cache().lookup(
+            user_message, turn["system_msg"].content, [], turn["cache_scope"]
+        )
+    return turn
+
+
+def _build_turn(memory: HindsightMemory, recalled: List[str], user_id: str) -> Dict[str, Any]:
+    """Compose the prompt from recalled memories"""
+    memory_context = "\n".join(f"- {m}" for m in recalled) if recalled else "None."
 
     # 2) Compose messages
     system_msg = SystemMessage(
         content=SYSTEM_TEMPLATE.format(memory_snippets=memory_context)
     )
-    human_msg = HumanMessage(content=user_message)
+    return {
+        "memory": memory,
+        "system_msg": system_msg,
+        "cache_scope": user_id if recalled else None,
+        "cached_answer": None,
+    }
 
-    # Invoke LLM directly with messages
-    response = llm.invoke([system_msg, human_msg])
-    answer_text = response.content
 
-    # 3) Retain new info (depends on consent)
-    try:
-        memory.retain(
-            content=f"User said: {user_message}\nAssistant answered: {answer_text}",
-            context="chat_turn",
+def _finish_turn(turn: Dict[str, Any], user_message: str, answer_text: str):
+    """Cache a fresh answer and retain the turn"""
+    with stage("chat.finish"):
+        if turn["cached_answer"] is None:
+            get_response_cache().store(
+                user_message, turn["system_msg"].content, answer_text, [], turn["cache_scope"]
+            )
+
+        # 3) Retain new info (depends on consent)
+        try:
+            turn["memory"].retain(
+                content=f"User said: {user_message}\nAssistant answered: {answer_text}",
+                context="chat_turn",
+                background=True,
+            )
+        except Exception as e:
+            # If Hindsight is unavailable, continue without storing
+            logger.warning(f"Could not retain memory: {e}")
+            swallowed_error("agent", "retain")
+
+
+async def arun_agent_turn(
+    user_id: str,
+    user_message: str,
+    product_id: Optional[str] = None,
+    department: Optional[str] = None
+) -> str:
+    """Async ``run_agent_turn`` for the ASGI serving path"""
+    if USE_ENTERPRISE_MODE:
+        from enterprise_agent import get_enterprise_agent
+        return await get_enterprise_agent().arun_agent_turn(
+            user_id, user_message, product_id, department
         )
-    except Exception as e:
-        # If Hindsight is unavailable, continue without storing
-        print(f"Warning: Could not retain memory: {e}")
+
+    with stage("chat.turn", user_id=user_id):
+        turn = await _aprepare_turn(user_id, user_message)
+        answer_text = turn["cached_answer"]
+        if answer_text is None:
+            with stage("chat.llm"):
+                response = await llm.ainvoke([turn["system_msg"], HumanMessage(content=user_message)])
+            answer_text = response.content
+        await _afinish_turn(turn, user_message, answer_text)
 
     return answer_text
 
+
+async def astream_agent_turn(
+    user_id: str,
+    user_message: str,
+    product_id: Optional[str] = None,
+    department: Optional[str] = None
+) -> AsyncIterator[str]:
+    """Async ``stream_agent_turn`` for the ASGI serving path"""
+    if USE_ENTERPRISE_MODE:
+        from enterprise_agent import get_enterprise_agent
+        async for token in get_enterprise_agent().astream_agent_turn(
+            user_id, user_message, product_id, department
+        ):
+            yield token
+        return
+
+    started = time.perf_counter()
+    turn = await _aprepare_turn(user_id, user_message)
+    if turn["cached_answer"] is not None:
+        yield turn["cached_answer"]
+        await _afinish_turn(turn, user_message, turn["cached_answer"])
+        record_stage("chat.turn", started, user_id=user_id)
+        return
+
+    parts = []
+    llm_started = time.perf_counter()
+    async for chunk in llm.astream([turn["system_msg"], HumanMessage(content=user_message)]):
+        if chunk.content:
+            if not parts:
+                record_stage("chat.llm_first_token", llm_started)
+            parts.append(chunk.content)
+            yield chunk.content
+    record_stage("chat.llm", llm_started)
+    await _afinish_turn(turn, user_message, "".join(parts))
+    record_stage("chat.turn", started, user_id=user_id)
+
+
+async def _aprepare_turn(user_id: str, user_message: str) -> Dict[str, Any]:
+    """Async ``_prepare_turn``"""
+    memory: HindsightMemory = build_agent_for_user(user_id)["memory"]
+    try:
+        with stage("chat.recall"):
+            recalled = await memory.arecall(query=user_message)
+    except Exception as e:
+        logger.warning(f"Could not recall memory: {e}")
+        swallowed_error("agent", "recall")
+        recalled = []
+
+    with stage("chat.prompt"):
+        turn = _build_turn(memory, recalled, user_id)
+    with stage("chat.cache_lookup"):
+        turn["cached_answer"] = await get_response_cache().alookup(
+            user_message, turn["system_msg"].content, [], turn["cache_scope"]
+        )
+    return turn
+
+
+async def _afinish_turn(turn: Dict[str, Any], user_message: str, answer_text: str):
+    """Async ``_finish_turn``"""
+    with stage("chat.finish"):
+        if turn["cached_answer"] is None:
+            await get_response_cache().astore(
+                user_message, turn["system_msg"].content, answer_text, [], turn["cache_scope"]
+            )
+        try:
+            await turn["memory"].aretain(
+                content=f"User said: {user_message}\nAssistant answered: {answer_text}",
+                context="chat_turn",
+                background=True,
+            )
+        except Exception as e:
+            logger.warning(f"Could not retain memory: {e}")
+            swallowed_error("agent", "retain")
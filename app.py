@@ -1,13 +1,23 @@
 # app.py
+import json
 import os
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from auth_and_profile import get_or_create_user, set_user_consent
-from agent import run_agent_turn
+from agent import run_agent_turn, stream_agent_turn
 from enterprise_memory import EnterpriseMemoryManager
 from document_ingestion import DocumentIngestion
-from memory_reflection import UpdateTracker
+from memory_reflection import UpdateTracker, parse_rule_updates
+from job_queue import JobCancelled, LocalJobQueue
+from chunking import CHUNKERS, get_chunker
+from chunk_index import get_chunk_index
+from circuit_breaker import OPEN, breaker_states
+from consolidation import get_consolidator
+from metrics import get_metrics_registry
+from recall_cache import get_recall_cache
+from response_cache import get_response_cache
+from write_behind import get_write_behind
 
 app = Flask(__name__, static_folder="static")
 CORS(app)  # Enable CORS for frontend
@@ -17,6 +27,7 @@ HINDSIGHT_BASE_URL = os.environ.get("HINDSIGHT_BASE_URL", "http://localhost:8888
 COMPANY_ID = os.environ.get("COMPANY_ID", "default-company")
 UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", "./uploads")
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'md', 'docx'}
+RULE_UPLOAD_EXTENSIONS = {'csv', 'json'}
 
 # Create upload folder if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -24,6 +35,87 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 # Initialize enterprise memory manager
 memory_manager = EnterpriseMemoryManager(HINDSIGHT_BASE_URL, COMPANY_ID)
 
+# Background job queue for long-running ingestion
+job_queue = LocalJobQueue()
+
+
+def run_ingest_job(params: dict, ctx) -> dict:
+    """Job handler: ingest a saved upload or raw text into the company KB"""
+    company_kb = memory_manager.get_company_kb()
+    ingestion = DocumentIngestion(
+        company_kb,
+        chunker=get_chunker(params.get("chunking")),
+        index=get_chunk_index()
+    )
+    report = ingestion.ingest_document(
+        file_path=params["file_path"],
+        document_type=params["document_type"],
+        version=params["version"],
+        importance=params["importance"],
+        content=params.get("content"),
+        on_progress=ctx.report_progress,
+        should_cancel=ctx.is_cancelled
+    )
+    if ctx.is_cancelled():
+        raise JobCancelled()
+    
+    summary = report.to_dict()
+    result = {
+        "chunks_ingested": report.succeeded,
+        "chunks_failed": len(report.failed),
+        "chunks_skipped": report.skipped,
+        "chunks_added": report.added,
+        "chunks_changed": report.changed,
+        "failures": summary["failures"],
+    }
+    if params.get("filename"):
+        result["filename"] = params["filename"]
+    return result
+
+
+job_queue.register("ingest", run_ingest_job)
+
+
+def run_consolidation_job(params: dict, ctx) -> dict:
+    """Job handler: consolidate the current hot topics now, outside the off-peak window"""
+    consolidator = get_consolidator()
+    if consolidator is None:
+        raise RuntimeError("Consolidation is disabled (CONSOLIDATION_ENABLED=false)")
+    report = consolidator.run(
+        trigger="manual",
+        on_progress=ctx.report_progress,
+        should_cancel=ctx.is_cancelled
+    )
+    if ctx.is_cancelled():
+        raise JobCancelled()
+    return report.to_dict()
+
+
+job_queue.register("consolidate", run_consolidation_job)
+
+# Pick up queued jobs and jobs whose worker died; every web worker may call
+# this, since a job only runs in the worker that claims it (skipped in the
+# debug reloader's watcher process)
+if __name__ != "__main__" or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+    job_queue.resume_unfinished()
+    if get_consolidator() is not None:
+        get_consolidator().start()
+
+
+def job_response(job: dict) -> dict:
+    """Public view of a job record (raw text content is not echoed back)"""
+    params = {k: v for k, v in job["params"].items() if k != "content"}
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "params": params,
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
 
 @app.route("/")
 def index():
@@ -75,6 +167,56 @@ def chat():
         return jsonify({"error": str(e)}), 500
 
 
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/chat/stream")
+def chat_stream():
+    """Chat turn streamed as Server-Sent Events.
+    
+    Emits ``start`` right away, one ``token`` event per LLM chunk, then
+    ``done`` with the full reply (or ``error``). The turn is retained after
+    the last token, off the response path.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+    
+    data = request.get_json() or {}
+    user_id = data.get("user_id", "default")
+    message = data.get("message", "")
+    product_id = data.get("product_id")
+    department = data.get("department")
+    
+    if not message:
+        return jsonify({"error": "Message is required"}), 400
+    
+    profile = get_or_create_user(user_id)
+    
+    def generate():
+        # Sent before recall so the client sees the stream open immediately
+        yield sse_event("start", {"memory_enabled": profile.allow_memory})
+        parts = []
+        try:
+            for token in stream_agent_turn(user_id, message, product_id, department):
+                parts.append(token)
+                yield sse_event("token", {"text": token})
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+            return
+        yield sse_event("done", {
+            "reply": "".join(parts),
+            "memory_enabled": profile.allow_memory,
+        })
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/user/<user_id>/status")
 def user_status(user_id: str):
     profile = get_or_create_user(user_id)
@@ -86,7 +228,20 @@ def user_status(user_id: str):
 
 @app.get("/health")
 def health():
-    return jsonify({"status": "ok", "service": "gpt-lab-agent"})
+    """Liveness plus the circuit state of each Hindsight server ("degraded" while one is open)"""
+    hindsight = breaker_states()
+    degraded = any(snapshot["state"] == OPEN for snapshot in hindsight.values())
+    return jsonify({
+        "status": "degraded" if degraded else "ok",
+        "service": "gpt-lab-agent",
+        "hindsight": hindsight,
+    })
+
+
+@app.get("/metrics")
+def metrics():
+    """Stage latencies, counters and cache statistics in Prometheus text format"""
+    return Response(get_metrics_registry().render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/admin/verify-token")
@@ -105,6 +260,27 @@ def verify_token():
         return jsonify({"valid": False, "error": str(e)}), 500
 
 
+@app.get("/admin/cache-stats")
+def cache_stats():
+    """Recall and response cache hit/miss and write-behind statistics"""
+    try:
+        auth_token = request.headers.get("Authorization", "")
+        expected_token = os.environ.get('ADMIN_TOKEN', 'admin-secret')
+        expected_auth = f"Bearer {expected_token}"
+        
+        if not auth_token or auth_token.strip() != expected_auth:
+            return jsonify({"error": "Unauthorized - Invalid admin token"}), 401
+        
+        write_behind = get_write_behind()
+        return jsonify({
+            "recall_cache": get_recall_cache().stats(),
+            "response_cache": get_response_cache().stats(),
+            "write_behind": write_behind.stats() if write_behind else None,
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # Admin endpoints for enterprise features
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -141,22 +317,25 @@ def ingest_document():
         document_type = request.form.get('type', 'dfx_rule')
         version = request.form.get('version', '1.0')
         importance = request.form.get('importance', 'high')
-        
-        # Ingest document
-        company_kb = memory_manager.get_company_kb()
-        ingestion = DocumentIngestion(company_kb)
-        chunks = ingestion.ingest_document(
-            file_path=filepath,
-            document_type=document_type,
-            version=version,
-            importance=importance
-        )
+        chunking = request.form.get('chunking')
+        if chunking and chunking not in CHUNKERS:
+            return jsonify({"error": f"Unknown chunking strategy. Available: {sorted(CHUNKERS)}"}), 400
+        
+        # Queue ingestion; progress is available from /admin/jobs/<job_id>
+        job_id = job_queue.submit("ingest", {
+            "file_path": filepath,
+            "filename": filename,
+            "document_type": document_type,
+            "version": version,
+            "importance": importance,
+            "chunking": chunking,
+        })
         
         return jsonify({
-            "status": "success",
-            "chunks_ingested": chunks,
+            "status": "queued",
+            "job_id": job_id,
             "filename": filename
-        })
+        }), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -181,25 +360,67 @@ def ingest_text():
         version = data.get("version", "1.0")
         importance = data.get("importance", "high")
         source = data.get("source", "manual_input")
+        chunking = data.get("chunking")
         
         if not content:
             return jsonify({"error": "Content is required"}), 400
-        
-        # Ingest text
-        company_kb = memory_manager.get_company_kb()
-        ingestion = DocumentIngestion(company_kb)
-        chunks = ingestion.ingest_document(
-            file_path=source,
-            document_type=document_type,
-            version=version,
-            importance=importance,
-            content=content
-        )
+        if chunking and chunking not in CHUNKERS:
+            return jsonify({"error": f"Unknown chunking strategy. Available: {sorted(CHUNKERS)}"}), 400
+        
+        # Queue ingestion; progress is available from /admin/jobs/<job_id>
+        job_id = job_queue.submit("ingest", {
+            "file_path": source,
+            "document_type": document_type,
+            "version": version,
+            "importance": importance,
+            "chunking": chunking,
+            "content": content,
+        })
         
         return jsonify({
-            "status": "success",
-            "chunks_ingested": chunks
-        })
+            "status": "queued",
+            "job_id": job_id
+        }), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.get("/admin/jobs/<job_id>")
+def get_job(job_id: str):
+    """Status and progress of a background job"""
+    try:
+        auth_token = request.headers.get("Authorization", "")
+        expected_token = os.environ.get('ADMIN_TOKEN', 'admin-secret')
+        expected_auth = f"Bearer {expected_token}"
+        
+        if not auth_token or auth_token.strip() != expected_auth:
+            return jsonify({"error": "Unauthorized - Invalid admin token"}), 401
+        
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        
+        return jsonify(job_response(job))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.post("/admin/jobs/<job_id>/cancel")
+def cancel_job(job_id: str):
+    """Request cancellation of a queued or running job"""
+    try:
+        auth_token = request.headers.get("Authorization", "")
+        expected_token = os.environ.get('ADMIN_TOKEN', 'admin-secret')
+        expected_auth = f"Bearer {expected_token}"
+        
+        if not auth_token or auth_token.strip() != expected_auth:
+            return jsonify({"error": "Unauthorized - Invalid admin token"}), 401
+        
+        job = job_queue.cancel(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        
+        return jsonify(job_response(job))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -241,6 +462,97 @@ def update_rule():
         return jsonify({"error": str(e)}), 500
 
 
+@app.post("/admin/update-rules")
+def update_rules():
+    """Apply many rule updates from one CSV or JSON upload (or a JSON body)"""
+    try:
+        auth_token = request.headers.get("Authorization", "")
+        expected_token = os.environ.get('ADMIN_TOKEN', 'admin-secret')
+        expected_auth = f"Bearer {expected_token}"
+        
+        if not auth_token or auth_token.strip() != expected_auth:
+            return jsonify({"error": "Unauthorized - Invalid admin token"}), 401
+        
+        try:
+            if 'file' in request.files:
+                file = request.files['file']
+                extension = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else ''
+                if extension not in RULE_UPLOAD_EXTENSIONS:
+                    return jsonify({"error": f"File type not allowed. Allowed: {RULE_UPLOAD_EXTENSIONS}"}), 400
+                updates = parse_rule_updates(file.read().decode("utf-8-sig"), extension)
+            elif request.is_json:
+                updates = parse_rule_updates(request.get_data(as_text=True), "json")
+            else:
+                return jsonify({"error": "Upload a CSV or JSON file, or send a JSON body"}), 400
+        except (ValueError, UnicodeDecodeError) as e:
+            return jsonify({"error": f"Invalid rule updates: {e}"}), 400
+        
+        if not updates:
+            return jsonify({"error": "No rule updates found"}), 400
+        
+        company_kb = memory_manager.get_company_kb()
+        report = UpdateTracker(company_kb).update_rules(updates)
+        failures = [
+            {"rule_id": updates[r.index].rule_id, "version": updates[r.index].version, "error": r.error}
+            for r in report.failed
+        ]
+        
+        return jsonify({
+            "status": "success" if not failures else "partial",
+            "updated": report.succeeded,
+            "failed": len(failures),
+            "failures": failures,
+        }), 200 if report.succeeded else 500
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.get("/admin/consolidation")
+def consolidation_status():
+    """Scheduler settings, the topics next in line and the cost of recent runs"""
+    try:
+        auth_token = request.headers.get("Authorization", "")
+        expected_token = os.environ.get('ADMIN_TOKEN', 'admin-secret')
+        expected_auth = f"Bearer {expected_token}"
+        
+        if not auth_token or auth_token.strip() != expected_auth:
+            return jsonify({"error": "Unauthorized - Invalid admin token"}), 401
+        
+        consolidator = get_consolidator()
+        if consolidator is None:
+            return jsonify({"enabled": False})
+        
+        consolidator.flush_log()
+        return jsonify({
+            "enabled": True,
+            "in_window": consolidator.in_window(),
+            "hot_topics": [vars(topic) for topic in consolidator.store.hot_topics()],
+            "runs": consolidator.store.recent_runs(),
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.post("/admin/consolidation/run")
+def run_consolidation():
+    """Queue a consolidation run now; progress is available from /admin/jobs/<job_id>"""
+    try:
+        auth_token = request.headers.get("Authorization", "")
+        expected_token = os.environ.get('ADMIN_TOKEN', 'admin-secret')
+        expected_auth = f"Bearer {expected_token}"
+        
+        if not auth_token or auth_token.strip() != expected_auth:
+            return jsonify({"error": "Unauthorized - Invalid admin token"}), 401
+        
+        if get_consolidator() is None:
+            return jsonify({"error": "Consolidation is disabled (CONSOLIDATION_ENABLED=false)"}), 400
+        
+        job_id = job_queue.submit("consolidate", {})
+        return jsonify({"status": "queued", "job_id": job_id}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.post("/admin/reflect")
 def reflect():
     """Trigger reflection on a topic"""
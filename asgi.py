@@ -0,0 +1,103 @@
+# asgi.py
+import os
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import app as flask_app, sse_event
+from agent import arun_agent_turn, astream_agent_turn
+from auth_and_profile import get_or_create_user
+from hindsight_pool import aclose_async_clients
+
+# Threads serving the Flask routes mounted below (admin, uploads, static)
+WSGI_THREADS = int(os.environ.get("WSGI_THREADS", "16"))
+
+
+async def _chat_request(request: Request):
+    """Parsed chat body, or an error response matching the Flask routes"""
+    if "application/json" not in request.headers.get("content-type", ""):
+        return JSONResponse({"error": "Request must be JSON"}, status_code=400)
+    try:
+        data = await request.json() or {}
+    except ValueError:
+        return JSONResponse({"error": "Request must be JSON"}, status_code=400)
+    if not data.get("message"):
+        return JSONResponse({"error": "Message is required"}, status_code=400)
+    return data
+
+
+async def chat(request: Request):
+    data = await _chat_request(request)
+    if isinstance(data, JSONResponse):
+        return data
+    user_id = data.get("user_id", "default")
+    try:
+        reply = await arun_agent_turn(
+            user_id, data["message"], data.get("product_id"), data.get("department")
+        )
+        profile = get_or_create_user(user_id)
+        return JSONResponse({
+            "reply": reply,
+            "memory_enabled": profile.allow_memory,
+        })
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def chat_stream(request: Request):
+    """Async twin of the Flask ``/chat/stream`` route (same events)"""
+    data = await _chat_request(request)
+    if isinstance(data, JSONResponse):
+        return data
+    user_id = data.get("user_id", "default")
+    profile = get_or_create_user(user_id)
+
+    async def generate():
+        yield sse_event("start", {"memory_enabled": profile.allow_memory})
+        parts = []
+        try:
+            async for token in astream_agent_turn(
+                user_id, data["message"], data.get("product_id"), data.get("department")
+            ):
+                parts.append(token)
+                yield sse_event("token", {"text": token})
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+            return
+        yield sse_event("done", {
+            "reply": "".join(parts),
+            "memory_enabled": profile.allow_memory,
+        })
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await aclose_async_clients()
+
+
+# Chat turns run natively on the event loop; every other route is served by
+# the Flask app, so both servers expose the same API
+app = Starlette(
+    routes=[
+        Route("/chat", chat, methods=["POST"]),
+        Route("/chat/stream", chat_stream, methods=["POST"]),
+        Mount("/", app=WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+    ],
+    lifespan=lifespan,
+)
@@ -1,25 +1,11 @@
 # auth_and_profile.py
 
-from dataclasses import dataclass
-
-
-@dataclass
-class UserProfile:
-    user_id: str
-    allow_memory: bool
-
-
-# In real GPT-Lab system, load from DB; here, use a dict.
-USER_DB: dict[str, UserProfile] = {}
+from profile_store import UserProfile, get_profile_store
 
 
 def get_or_create_user(user_id: str) -> UserProfile:
-    if user_id not in USER_DB:
-        USER_DB[user_id] = UserProfile(user_id=user_id, allow_memory=False)
-    return USER_DB[user_id]
+    return get_profile_store().get_or_create(user_id)
 
 
 def set_user_consent(user_id: str, allow: bool):
-    profile = get_or_create_user(user_id)
-    profile.allow_memory = allow
-
+    get_profile_store().set_consent(user_id, allow)
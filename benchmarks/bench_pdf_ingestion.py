@@ -0,0 +1,110 @@
+"""Compare whole-document vs streaming PDF ingestion.
+
+Measures wall time and peak Python heap (tracemalloc) for extracting,
+chunking and batching a PDF without a Hindsight server: retains go to a
+client that discards them.
+
+Usage:
+    python benchmarks/bench_pdf_ingestion.py [path/to/file.pdf] [--repeat N]
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from document_ingestion import DocumentIngestion  # noqa: E402
+from memory_layer import RetainReport, retain_batched  # noqa: E402
+
+DEFAULT_PDF = ROOT / "uploads" / "Smart_Environmental_Monitoring_Device_DFX.pdf"
+
+
+class NullClient:
+    """Accepts retains and drops them"""
+
+    def retain_batch(self, bank_id, items, **kwargs):
+        pass
+
+
+class NullMemory:
+    """Just enough of EnhancedHindsightMemory for DocumentIngestion"""
+
+    def __init__(self):
+        self.client = NullClient()
+
+    def retain_many(self, items, **kwargs) -> RetainReport:
+        return retain_batched(self.client, "bench", items, **kwargs)
+
+
+def ingest_whole_document(file_path: str) -> int:
+    """Previous behaviour: concatenate all pages, then chunk into a list"""
+    import PyPDF2
+
+    text = ""
+    with open(file_path, "rb") as file:
+        reader = PyPDF2.PdfReader(file)
+        for page in reader.pages:
+            text += page.extract_text() + "\n"
+
+    words = text.split()
+    chunks = []
+    current_chunk = []
+    current_size = 0
+    for word in words:
+        current_chunk.append(word)
+        current_size += len(word) + 1
+        if current_size >= 1000:
+            chunks.append(" ".join(current_chunk))
+            current_chunk = []
+            current_size = 0
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+
+    items = [{"content": chunk, "context": f"dfx_rule_chunk_{i}"} for i, chunk in enumerate(chunks)]
+    return retain_batched(NullClient(), "bench", items).succeeded
+
+
+def ingest_streaming(file_path: str) -> int:
+    """Current behaviour: page -> word stream -> chunk -> batched retain"""
+    return DocumentIngestion(NullMemory()).ingest_document(file_path).succeeded
+
+
+def measure(fn, file_path: str, repeat: int) -> dict:
+    timings = []
+    peak = 0
+    chunks = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        chunks = fn(file_path)
+        timings.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {
+        "chunks": chunks,
+        "best_s": round(min(timings), 4),
+        "mean_s": round(sum(timings) / len(timings), 4),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdf", nargs="?", default=str(DEFAULT_PDF))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {
+        "file": args.pdf,
+        "whole_document": measure(ingest_whole_document, args.pdf, args.repeat),
+        "streaming": measure(ingest_streaming, args.pdf, args.repeat),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
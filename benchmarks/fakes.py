@@ -0,0 +1,180 @@
+"""In-process stand-ins for the Hindsight client and the chat model.
+
+Both simulate service latency with sleeps (so thread pools and the event
+loop behave as they would against real servers) and return results of a
+configurable size. ``install`` patches them into the application modules;
+call it before creating agents.
+"""
+import asyncio
+import itertools
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+_WORDS = (
+    "trace width clearance via pad solder mask copper pour impedance thermal relief "
+    "component spacing panel fiducial drill annular ring stencil reflow connector"
+).split()
+
+
+@dataclass
+class FakeConfig:
+    """Latency (seconds) and result sizes for the fakes"""
+    recall_latency: float = 0.02
+    retain_latency: float = 0.01
+    reflect_latency: float = 0.05
+    recall_results: int = 10  # Results returned by every recall
+    result_words: int = 60  # Words per synthetic recall result
+    llm_latency: float = 0.3  # Time to the full reply (invoke) or spread over tokens (stream)
+    llm_tokens: int = 40
+    jitter: float = 0.1  # +/- share of random variation on every latency
+
+
+CONFIG = FakeConfig()
+
+
+def _sleep_time(base: float) -> float:
+    return max(0.0, base * (1 + random.uniform(-CONFIG.jitter, CONFIG.jitter)))
+
+
+@dataclass
+class FakeRecallResult:
+    id: str
+    text: str
+    metadata: Dict[str, str] = field(default_factory=dict)
+    tags: List[str] = field(default_factory=list)
+    mentioned_at: Optional[str] = None
+
+
+class FakeHindsight:
+    """Hindsight client stand-in; stores nothing, counts calls.
+
+    Recall returns ``CONFIG.recall_results`` synthetic memories with
+    metadata headers like those the enterprise memory writes, so reranking
+    and context assembly do realistic work.
+    """
+
+    calls: Dict[str, int] = {}
+    _calls_lock = threading.Lock()
+    _ids = itertools.count()
+
+    def __init__(self, base_url: str = "", **kwargs):
+        self.base_url = base_url
+
+    @classmethod
+    def reset_calls(cls):
+        with cls._calls_lock:
+            cls.calls = {}
+
+    @classmethod
+    def _count(cls, name: str, n: int = 1):
+        with cls._calls_lock:
+            cls.calls[name] = cls.calls.get(name, 0) + n
+
+    def _results(self, query: str) -> SimpleNamespace:
+        rng = random.Random(query)
+        results = []
+        for rank in range(CONFIG.recall_results):
+            words = " ".join(rng.choice(_WORDS) for _ in range(CONFIG.result_words))
+            importance = rng.choice(["critical", "high", "normal", "low"])
+            results.append(FakeRecallResult(
+                id=str(next(self._ids)),
+                text=f"[IMPORTANCE: {importance}] [VERSION: 1.{rank}]\n{words}",
+                metadata={"importance": importance, "version": f"1.{rank}", "date": "2026-01-15T09:00:00"},
+                tags=[f"importance:{importance}"],
+            ))
+        return SimpleNamespace(results=results)
+
+    def retain(self, bank_id: str, content: Any, **kwargs):
+        self._count("retain")
+        time.sleep(_sleep_time(CONFIG.retain_latency))
+        return SimpleNamespace(success=True)
+
+    def retain_batch(self, bank_id: str, items: List[Dict[str, Any]], **kwargs):
+        self._count("retain_batch")
+        self._count("retained_items", len(items))
+        time.sleep(_sleep_time(CONFIG.retain_latency))
+        return SimpleNamespace(success=True)
+
+    def recall(self, bank_id: str, query: str, **kwargs):
+        self._count("recall")
+        time.sleep(_sleep_time(CONFIG.recall_latency))
+        return self._results(query)
+
+    def reflect(self, bank_id: str, query: str, **kwargs):
+        self._count("reflect")
+        time.sleep(_sleep_time(CONFIG.reflect_latency))
+        return SimpleNamespace(text=f"Summary of {query}")
+
+    async def aretain(self, bank_id: str, content: Any, **kwargs):
+        self._count("retain")
+        await asyncio.sleep(_sleep_time(CONFIG.retain_latency))
+        return SimpleNamespace(success=True)
+
+    async def aretain_batch(self, bank_id: str, items: List[Dict[str, Any]], **kwargs):
+        self._count("retain_batch")
+        self._count("retained_items", len(items))
+        await asyncio.sleep(_sleep_time(CONFIG.retain_latency))
+        return SimpleNamespace(success=True)
+
+    async def arecall(self, bank_id: str, query: str, **kwargs):
+        self._count("recall")
+        await asyncio.sleep(_sleep_time(CONFIG.recall_latency))
+        return self._results(query)
+
+    async def areflect(self, bank_id: str, query: str, **kwargs):
+        self._count("reflect")
+        await asyncio.sleep(_sleep_time(CONFIG.reflect_latency))
+        return SimpleNamespace(text=f"Summary of {query}")
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class FakeChatModel:
+    """Chat model stand-in with the invoke/stream methods the agents call"""
+
+    def _reply(self) -> List[str]:
+        return [f"{random.choice(_WORDS)} " for _ in range(CONFIG.llm_tokens)]
+
+    def invoke(self, messages):
+        time.sleep(_sleep_time(CONFIG.llm_latency))
+        return SimpleNamespace(content="".join(self._reply()))
+
+    def stream(self, messages):
+        tokens = self._reply()
+        for token in tokens:
+            time.sleep(_sleep_time(CONFIG.llm_latency) / len(tokens))
+            yield SimpleNamespace(content=token)
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(_sleep_time(CONFIG.llm_latency))
+        return SimpleNamespace(content="".join(self._reply()))
+
+    async def astream(self, messages):
+        tokens = self._reply()
+        for token in tokens:
+            await asyncio.sleep(_sleep_time(CONFIG.llm_latency) / len(tokens))
+            yield SimpleNamespace(content=token)
+
+
+def install(config: Optional[FakeConfig] = None):
+    """Route Hindsight clients and both agents' chat model to the fakes"""
+    global CONFIG
+    if config is not None:
+        CONFIG = config
+
+    import agent
+    import enterprise_agent
+    import hindsight_pool
+
+    hindsight_pool.Hindsight = FakeHindsight
+    model = FakeChatModel()
+    agent.llm = model
+    enterprise_agent.llm = model
@@ -0,0 +1,100 @@
+"""Timing and resource measurement shared by the benchmark scenarios"""
+import asyncio
+import math
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, min(len(sorted_values) - 1, rank))]
+
+
+def peak_rss_kib() -> Optional[int]:
+    """High-water resident set size of this process"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # bytes on macOS, KiB on Linux
+
+
+def summarize(latencies: List[float], wall_s: float, errors: int = 0) -> Dict[str, Any]:
+    """Latency percentiles (ms), throughput and peak RSS for one scenario run"""
+    ordered = sorted(latencies)
+    return {
+        "ops": len(latencies),
+        "errors": errors,
+        "wall_s": round(wall_s, 4),
+        "ops_per_s": round(len(latencies) / wall_s, 2) if wall_s > 0 else None,
+        "mean_ms": round(1000 * sum(ordered) / len(ordered), 3) if ordered else None,
+        "p50_ms": round(1000 * percentile(ordered, 50), 3),
+        "p95_ms": round(1000 * percentile(ordered, 95), 3),
+        "p99_ms": round(1000 * percentile(ordered, 99), 3),
+        "max_ms": round(1000 * ordered[-1], 3) if ordered else None,
+        "peak_rss_kib": peak_rss_kib(),
+    }
+
+
+def run_threaded(
+    operation: Callable[[int], Any],
+    iterations: int,
+    concurrency: int = 1,
+    warmup: int = 0
+) -> Dict[str, Any]:
+    """Call ``operation(i)`` ``iterations`` times from ``concurrency`` threads"""
+    for i in range(warmup):
+        operation(-1 - i)
+
+    def timed(i: int):
+        start = time.perf_counter()
+        try:
+            operation(i)
+            return time.perf_counter() - start, False
+        except Exception:
+            return time.perf_counter() - start, True
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        outcomes = list(pool.map(timed, range(iterations)))
+    wall = time.perf_counter() - start
+    return summarize([t for t, _ in outcomes], wall, sum(failed for _, failed in outcomes))
+
+
+def run_async(
+    operation: Callable[[int], Awaitable[Any]],
+    iterations: int,
+    concurrency: int = 1,
+    warmup: int = 0
+) -> Dict[str, Any]:
+    """Await ``operation(i)`` ``iterations`` times with at most ``concurrency`` in flight"""
+
+    async def main():
+        for i in range(warmup):
+            await operation(-1 - i)
+        limit = asyncio.Semaphore(max(1, concurrency))
+
+        async def timed(i: int):
+            async with limit:
+                start = time.perf_counter()
+                try:
+                    await operation(i)
+                    return time.perf_counter() - start, False
+                except Exception:
+                    return time.perf_counter() - start, True
+
+        start = time.perf_counter()
+        outcomes = await asyncio.gather(*(timed(i) for i in range(iterations)))
+        return outcomes, time.perf_counter() - start
+
+    outcomes, wall = asyncio.run(main())
+    return summarize([t for t, _ in outcomes], wall, sum(failed for _, failed in outcomes))
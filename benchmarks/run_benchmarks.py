@@ -0,0 +1,250 @@
+"""Offline benchmarks for chat turns, ingestion and rule updates.
+
+Hindsight and the chat model are replaced by in-process fakes
+(benchmarks/fakes.py) with configurable latency and result sizes, so the
+numbers measure this application's own overhead and concurrency under a
+known service profile. Each scenario runs in a fresh subprocess, with its
+SQLite files in a temporary directory, so peak RSS and caches do not leak
+between scenarios. Results are printed (or written) as JSON.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--scenario NAME ...] [--iterations N]
+        [--concurrency N] [--recall-latency-ms MS] [--llm-latency-ms MS]
+        [--recall-results N] [--backend hindsight|local] [--output results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+DEFAULT_PDF = ROOT / "uploads" / "Smart_Environmental_Monitoring_Device_DFX.pdf"
+QUESTIONS = [
+    "What is the minimum trace width for the power board?",
+    "Which solder mask clearance applies to fine-pitch connectors?",
+    "How far apart should fiducials be on a panel?",
+    "What changed in the thermal relief rule?",
+]
+
+
+def _question(i: int) -> str:
+    # Distinct text per call so recall and response caches do not short-circuit turns
+    return f"{QUESTIONS[i % len(QUESTIONS)]} (case {i})"
+
+
+def scenario_chat(args):
+    """Basic-mode ``run_agent_turn`` with user memory enabled"""
+    from harness import run_threaded
+    import agent
+    from auth_and_profile import set_user_consent
+
+    users = [f"bench-{n}" for n in range(max(1, args.concurrency))]
+    for user_id in users:
+        set_user_consent(user_id, True)
+    return run_threaded(
+        lambda i: agent.run_agent_turn(users[i % len(users)], _question(i)),
+        args.iterations, args.concurrency, args.warmup,
+    )
+
+
+def scenario_chat_enterprise(args):
+    """``EnterpriseAgent.run_agent_turn`` across company, product, department and user banks"""
+    from harness import run_threaded
+    from auth_and_profile import set_user_consent
+    from enterprise_agent import EnterpriseAgent
+
+    bench_agent = EnterpriseAgent(company_id="bench")
+    users = [f"bench-{n}" for n in range(max(1, args.concurrency))]
+    for user_id in users:
+        set_user_consent(user_id, True)
+    return run_threaded(
+        lambda i: bench_agent.run_agent_turn(users[i % len(users)], _question(i), "board-a", "hardware"),
+        args.iterations, args.concurrency, args.warmup,
+    )
+
+
+def scenario_chat_enterprise_async(args):
+    """``EnterpriseAgent.arun_agent_turn`` on one event loop (the ASGI serving path)"""
+    from harness import run_async
+    from auth_and_profile import set_user_consent
+    from enterprise_agent import EnterpriseAgent
+
+    bench_agent = EnterpriseAgent(company_id="bench")
+    users = [f"bench-{n}" for n in range(max(1, args.concurrency))]
+    for user_id in users:
+        set_user_consent(user_id, True)
+    return run_async(
+        lambda i: bench_agent.arun_agent_turn(users[i % len(users)], _question(i), "board-a", "hardware"),
+        args.iterations, args.concurrency, args.warmup,
+    )
+
+
+def scenario_ingest_pdf(args):
+    """``DocumentIngestion.ingest_document`` of the bundled DFX PDF into a fresh bank each time"""
+    from harness import run_threaded
+    from chunk_index import get_chunk_index
+    from document_ingestion import DocumentIngestion
+    from enhanced_memory import EnhancedHindsightMemory
+
+    def ingest(i: int):
+        memory = EnhancedHindsightMemory(base_url="http://bench", bank_id=f"bench-ingest-{i}")
+        DocumentIngestion(memory, index=get_chunk_index()).ingest_document(args.pdf)
+
+    return run_threaded(ingest, args.iterations, args.concurrency, args.warmup)
+
+
+def scenario_rule_update(args):
+    """``UpdateTracker.update_rule`` fanned out over ``--rules`` rules, each getting new versions"""
+    from harness import run_threaded
+    from enterprise_memory import EnterpriseMemoryManager
+    from memory_reflection import UpdateTracker
+
+    tracker = UpdateTracker(EnterpriseMemoryManager("http://bench", "bench").get_company_kb())
+
+    def update(i: int):
+        rule = abs(i) % args.rules
+        tracker.update_rule(
+            f"DFX-{rule:04d}",
+            f"Minimum trace width for signal layers is 0.{abs(i) % 9 + 1} mm.",
+            f"{abs(i) // args.rules + 1}.0",
+            change_summary="Benchmark update",
+        )
+
+    return run_threaded(update, args.iterations, args.concurrency, args.warmup)
+
+
+SCENARIOS = {
+    "chat": scenario_chat,
+    "chat_enterprise": scenario_chat_enterprise,
+    "chat_enterprise_async": scenario_chat_enterprise_async,
+    "ingest_pdf": scenario_ingest_pdf,
+    "rule_update": scenario_rule_update,
+}
+
+
+def run_child(args) -> dict:
+    """Run one scenario in this process (set up by ``run_scenario``)"""
+    import fakes
+
+    fakes.install(fakes.FakeConfig(
+        recall_latency=args.recall_latency_ms / 1000,
+        retain_latency=args.retain_latency_ms / 1000,
+        llm_latency=args.llm_latency_ms / 1000,
+        recall_results=args.recall_results,
+        llm_tokens=args.llm_tokens,
+    ))
+    result = SCENARIOS[args.child](args)
+    # Let background writes land so their cost is counted in the call totals
+    from write_behind import get_write_behind
+    buffer = get_write_behind()
+    if buffer is not None:
+        buffer.flush()
+    result["hindsight_calls"] = dict(fakes.FakeHindsight.calls)
+    return result
+
+
+def run_scenario(name: str, args, argv) -> dict:
+    """Run a scenario in a fresh interpreter with isolated state files"""
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as state_dir:
+        env = dict(os.environ)
+        env.update({
+            "OPENAI_API_KEY": env.get("OPENAI_API_KEY") or "benchmark",
+            "USE_ENTERPRISE_MODE": "false",
+            "MEMORY_BACKEND": args.backend,
+            "PROFILE_DB_PATH": os.path.join(state_dir, "profiles.db"),
+            "JOBS_DB_PATH": os.path.join(state_dir, "jobs.db"),
+            "CHUNK_INDEX_PATH": os.path.join(state_dir, "chunk_index.db"),
+            "LEXICAL_INDEX_PATH": os.path.join(state_dir, "lexical_index.db"),
+            "RULE_REGISTRY_PATH": os.path.join(state_dir, "rule_registry.db"),
+            "RECALL_CACHE_VERSIONS_PATH": os.path.join(state_dir, "recall_cache.db"),
+            "WRITE_BEHIND_SPILL_PATH": os.path.join(state_dir, "write_behind.jsonl"),
+            "LOCAL_STORE_PATH": os.path.join(state_dir, "local_memory"),
+        })
+        completed = subprocess.run(
+            [sys.executable, __file__, "--child", name] + argv,
+            env=env, cwd=state_dir, capture_output=True, text=True,
+        )
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1:] or ["failed"]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable; default: all)")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--recall-latency-ms", type=float, default=20)
+    parser.add_argument("--retain-latency-ms", type=float, default=10)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--recall-results", type=int, default=10)
+    parser.add_argument("--llm-tokens", type=int, default=40)
+    parser.add_argument("--rules", type=int, default=20, help="Distinct rules in rule_update")
+    parser.add_argument("--pdf", default=str(DEFAULT_PDF))
+    parser.add_argument("--backend", choices=["hindsight", "local"], default="hindsight",
+                        help="Fake Hindsight server, or the embedded local store")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args, _ = parser.parse_known_args()
+    args.pdf = os.path.abspath(args.pdf)
+
+    if args.child:
+        print(json.dumps(run_child(args)))
+        return
+
+    # Children get the same options, minus the parent-only ones
+    argv, skip = [], False
+    for arg in sys.argv[1:]:
+        if skip:
+            skip = False
+            continue
+        if arg in ("--scenario", "--output"):
+            skip = True
+            continue
+        if arg.startswith(("--scenario=", "--output=")):
+            continue
+        argv.append(arg)
+    argv += ["--pdf", args.pdf]
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "options": {k: v for k, v in vars(args).items() if k not in ("child", "output", "scenario")},
+        },
+        "scenarios": {},
+    }
+    for name in args.scenario or list(SCENARIOS):
+        results["scenarios"][name] = run_scenario(name, args, argv)
+        print(f"{name}: {json.dumps(results['scenarios'][name])}", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# chunk_index.py
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHUNK_INDEX_PATH = os.environ.get("CHUNK_INDEX_PATH", "./chunk_index.db")
+
+
+def chunk_hash(content: str) -> str:
+    """Content address of a chunk, insensitive to whitespace differences"""
+    normalized = " ".join(content.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class ChunkIndex:
+    """Local content-addressed index of chunks already retained per bank.
+
+    Maps chunk hash -> (bank_id, source, version, position) so re-ingesting a
+    document only sends chunks the bank has not seen. One connection is
+    shared by all threads behind ``_lock``.
+    """
+
+    def __init__(self, db_path: str = CHUNK_INDEX_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self._conn as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    bank_id TEXT NOT NULL,
+                    chunk_hash TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    version TEXT,
+                    position INTEGER NOT NULL,
+                    ingested_at TEXT NOT NULL,
+                    PRIMARY KEY (bank_id, chunk_hash)
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS chunks_by_source ON chunks (bank_id, source)"
+            )
+
+    def present(self, bank_id: str, digests: Iterable[str]) -> Set[str]:
+        """Which of ``digests`` the bank already holds, in one query"""
+        digests = list(set(digests))
+        if not digests:
+            return set()
+        placeholders = ", ".join("?" * len(digests))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT chunk_hash FROM chunks WHERE bank_id = ? AND chunk_hash IN ({placeholders})",
+                (bank_id, *digests)
+            ).fetchall()
+        return {digest for (digest,) in rows}
+
+    def positions(self, bank_id: str, source: str) -> Dict[int, str]:
+        """Chunk hash at each position of the last ingested version of ``source``"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, chunk_hash FROM chunks WHERE bank_id = ? AND source = ?",
+                (bank_id, source)
+            ).fetchall()
+        return dict(rows)
+
+    def record(
+        self,
+        bank_id: str,
+        source: str,
+        version: Optional[str],
+        entries: Iterable[Tuple[str, int]],
+        replace: bool = True
+    ):
+        """Record ``(hash, position)`` entries as present in ``bank_id``.
+
+        Hashes already owned by another source keep their original owner.
+        With ``replace`` the entries are the whole new version of ``source``,
+        so its rows from older versions that are not among them are deleted.
+        """
+        entries = list(entries)
+        now = datetime.now().isoformat()
+        with self._lock, self._conn as conn:
+            if replace:
+                current = {digest for digest, _ in entries}
+                rows = conn.execute(
+                    "SELECT chunk_hash FROM chunks WHERE bank_id = ? AND source = ?", (bank_id, source)
+                ).fetchall()
+                conn.executemany(
+                    "DELETE FROM chunks WHERE bank_id = ? AND chunk_hash = ?",
+                    [(bank_id, digest) for (digest,) in rows if digest not in current]
+                )
+            conn.executemany(
+                """
+                INSERT INTO chunks (bank_id, chunk_hash, source, version, position, ingested_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (bank_id, chunk_hash) DO UPDATE SET
+                    version = excluded.version,
+                    position = excluded.position
+                WHERE chunks.source = excluded.source
+                """,
+                [(bank_id, digest, source, version, position, now) for digest, position in entries]
+            )
+
+
+_chunk_index: Optional[ChunkIndex] = None
+_chunk_index_lock = threading.Lock()
+
+
+def get_chunk_index() -> ChunkIndex:
+    """Process-wide chunk index"""
+    global _chunk_index
+    with _chunk_index_lock:
+        if _chunk_index is None:
+            _chunk_index = ChunkIndex()
+    return _chunk_index
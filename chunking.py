@@ -0,0 +1,192 @@
+# chunking.py
+import os
+import re
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+from tokenizer import Tokenizer, get_tokenizer
+
+CHUNK_STRATEGY = os.environ.get("CHUNK_STRATEGY", "markdown")
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "32"))
+
+# End of a sentence: terminal punctuation followed by whitespace, except
+# after a list number ("2. Limit PCB layers..." is one sentence)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])(?<!\b\d\.)(?<!\b\d\d\.)\s+")
+# Markdown heading ("## Title") or numbered section heading ("3.2 Solder Mask")
+_HEADING_RE = re.compile(r"^(#{1,6}\s+\S.*|\d+(\.\d+)*\.?\s+[A-Z][^.!?]{0,80})$")
+# Table rows and list items are kept whole
+_TABLE_ROW_RE = re.compile(r"^\|.*\|$")
+_LIST_ITEM_RE = re.compile(r"^([-*+]|\d+[.)])\s+")
+# Sentences held back waiting for a terminator are flushed past this size
+_MAX_PENDING_CHARS = 4000
+
+# A unit of text and whether it starts a new section
+Unit = Tuple[str, bool]
+
+
+class Chunker(ABC):
+    """Packs a stream of text units into chunks of at most ``max_tokens``.
+
+    Subclasses decide what a unit is (word, sentence, table row...) by
+    implementing ``_units``. Packing is a single pass: every unit is
+    tokenized once, and the last ``overlap_tokens`` worth of units are
+    repeated at the start of the next chunk within the same section.
+    """
+
+    separator = " "
+
+    def __init__(
+        self,
+        max_tokens: int = CHUNK_MAX_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        tokenizer: Optional[Tokenizer] = None
+    ):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.tokenizer = tokenizer or get_tokenizer()
+
+    def chunk(self, pages: Iterable[str]) -> Iterator[str]:
+        """Lazily chunk a stream of page (or line) strings"""
+        current = deque()  # (text, tokens) of the chunk being built
+        current_tokens = 0
+        has_new_content = False
+
+        for text, starts_section in self._units(pages):
+            if starts_section and has_new_content:
+                yield self.separator.join(t for t, _ in current)
+                current.clear()
+                current_tokens = 0
+                has_new_content = False
+            elif starts_section:
+                # Overlap never crosses a section boundary
+                current.clear()
+                current_tokens = 0
+
+            tokens = self.tokenizer.count(text)
+            pieces = [(text, tokens)]
+            if tokens > self.max_tokens:
+                pieces = [
+                    (piece, self.tokenizer.count(piece))
+                    for piece in self.tokenizer.split(text, self.max_tokens)
+                ]
+
+            for piece, piece_tokens in pieces:
+                if has_new_content and current_tokens + piece_tokens > self.max_tokens:
+                    yield self.separator.join(t for t, _ in current)
+                    # Keep the tail as overlap for the next chunk
+                    while current and (
+                        current_tokens > self.overlap_tokens
+                        or current_tokens + piece_tokens > self.max_tokens
+                    ):
+                        current_tokens -= current.popleft()[1]
+                    has_new_content = False
+                current.append((piece, piece_tokens))
+                current_tokens += piece_tokens
+                has_new_content = True
+
+        if has_new_content:
+            yield self.separator.join(t for t, _ in current)
+
+    @abstractmethod
+    def _units(self, pages: Iterable[str]) -> Iterator[Unit]:
+        """Yield ``(text, starts_section)`` units from the page stream"""
+
+
+class WordChunker(Chunker):
+    """Whitespace-separated words, ignoring document structure"""
+
+    def _units(self, pages: Iterable[str]) -> Iterator[Unit]:
+        for page in pages:
+            for word in page.split():
+                yield word, False
+
+
+class SentenceChunker(Chunker):
+    """Sentences, so chunks never end mid-sentence"""
+
+    def _units(self, pages: Iterable[str]) -> Iterator[Unit]:
+        for sentence in iter_sentences(pages):
+            yield sentence, False
+
+
+class MarkdownChunker(Chunker):
+    """Structure-aware units: headings start new chunks, table rows and list
+    items stay whole, and paragraph text is split into sentences.
+    """
+
+    separator = "\n"
+
+    def _units(self, pages: Iterable[str]) -> Iterator[Unit]:
+        # Paragraph lines are split as they arrive, so a long paragraph
+        # (or a page of text with no blank lines) is never held whole
+        splitter = _SentenceSplitter()
+        for page in pages:
+            for raw_line in page.splitlines():
+                if raw_line and raw_line.isspace():
+                    # Soft break: PDF text extraction puts a whitespace-only
+                    # line between words of running text, not between paragraphs
+                    continue
+                line = raw_line.strip()
+                is_heading = bool(_HEADING_RE.match(line))
+                is_atomic = bool(_TABLE_ROW_RE.match(line) or _LIST_ITEM_RE.match(line))
+                if not line or is_heading or is_atomic:
+                    for sentence in splitter.flush():
+                        yield sentence, False
+                    if line:
+                        yield line, is_heading
+                else:
+                    for sentence in splitter.feed(line + " "):
+                        yield sentence, False
+        for sentence in splitter.flush():
+            yield sentence, False
+
+
+class _SentenceSplitter:
+    """Incremental sentence splitter holding at most one unfinished sentence"""
+
+    def __init__(self):
+        self.pending = ""
+
+    def feed(self, piece: str) -> List[str]:
+        """Add ``piece``; returns the sentences it completed"""
+        self.pending += piece
+        parts = _SENTENCE_END_RE.split(self.pending)
+        self.pending = parts.pop()
+        sentences = [sentence.strip() for sentence in parts if sentence.strip()]
+        if len(self.pending) > _MAX_PENDING_CHARS:
+            sentences += self.flush()
+        return sentences
+
+    def flush(self) -> List[str]:
+        """End the current run of text; returns its unfinished sentence, if any"""
+        pending, self.pending = self.pending.strip(), ""
+        return [pending] if pending else []
+
+
+def iter_sentences(pieces: Iterable[str]) -> Iterator[str]:
+    """Split a stream of text pieces into sentences, carrying partial
+    sentences across piece boundaries.
+    """
+    splitter = _SentenceSplitter()
+    for piece in pieces:
+        yield from splitter.feed(piece)
+    yield from splitter.flush()
+
+
+CHUNKERS: Dict[str, Type[Chunker]] = {
+    "words": WordChunker,
+    "sentence": SentenceChunker,
+    "markdown": MarkdownChunker,
+}
+
+
+def get_chunker(strategy: Optional[str] = None, **kwargs) -> Chunker:
+    """Chunker for a strategy name (defaults to ``CHUNK_STRATEGY``)"""
+    strategy = strategy or CHUNK_STRATEGY
+    if strategy not in CHUNKERS:
+        raise ValueError(f"Unknown chunking strategy: {strategy}. Available: {sorted(CHUNKERS)}")
+    return CHUNKERS[strategy](**kwargs)
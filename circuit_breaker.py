@@ -0,0 +1,226 @@
+# circuit_breaker.py
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+import logging
+
+from metrics import get_metrics_registry
+
+try:
+    from aiohttp import ClientConnectionError
+except ImportError:
+    ClientConnectionError = ConnectionError
+
+logger = logging.getLogger(__name__)
+
+BREAKER_ENABLED = os.environ.get("BREAKER_ENABLED", "true").lower() == "true"
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "5"))  # Consecutive failures that open it
+BREAKER_RESET_TIMEOUT = float(os.environ.get("BREAKER_RESET_TIMEOUT", "30.0"))  # Seconds open before a probe
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling a server whose circuit is open"""
+
+
+# Errors of the HTTP client that mean the server could not be reached or did not answer in time
+_TRANSPORT_ERRORS = (ConnectionError, TimeoutError, ClientConnectionError)
+
+
+def _answered(error: BaseException) -> bool:
+    status = getattr(error, "status", None)
+    return isinstance(status, int) and status > 0
+
+
+def is_outage(error: BaseException) -> bool:
+    """Whether ``error`` means the server is unreachable or failing: a connection error, a timeout or a 5xx.
+
+    4xx answers (except 408 and 429) show the server is up, and errors
+    raised locally, such as a TypeError, say nothing about it.
+    """
+    if _answered(error):
+        return error.status >= 500 or error.status in (408, 429)
+    return isinstance(error, _TRANSPORT_ERRORS)
+
+
+class CircuitBreaker:
+    """Fails calls to one server fast once it has stopped answering.
+
+    After ``failure_threshold`` consecutive outage errors (see
+    ``is_outage``: connection failures, timeouts, 5xx) the circuit opens and calls raise
+    ``CircuitOpenError`` without touching the network. Once
+    ``reset_timeout`` seconds have passed a single call is let through as a
+    probe (half-open): success closes the circuit, failure opens it again.
+    Client errors such as 400 or 404 show the server is up and never trip it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+        enabled: bool = BREAKER_ENABLED
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.enabled = enabled
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> bool:
+        """Raise ``CircuitOpenError`` unless a call may go through now; True if it is the half-open probe"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(f"Hindsight at {self.name} is unavailable (retrying in {retry_in:.0f}s)")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Hindsight at {self.name} is reachable again; circuit closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error: BaseException):
+        if isinstance(error, CircuitOpenError):
+            return
+        if not is_outage(error):
+            if _answered(error):
+                # The server answered, so it is up
+                self.record_success()
+            else:
+                # A local error; a probe that hit it proved nothing either way
+                self.abandon(True)
+            return
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+                self.trips += 1
+                logger.warning(
+                    f"Hindsight at {self.name} failed {self.failures} times; failing fast for "
+                    f"{self.reset_timeout}s ({error})"
+                )
+
+    def abandon(self, probe: bool):
+        """A call ended without an answer (e.g. it was cancelled); an unfinished probe reopens the circuit.
+
+        The reset timeout is not restarted, so the next call probes again.
+        """
+        if not probe:
+            return
+        with self._lock:
+            if self.state == HALF_OPEN and self._probe_in_flight:
+                self.state = OPEN
+                self._probe_in_flight = False
+
+    def is_open(self) -> bool:
+        """True while calls are being rejected (open, and not yet due for a probe)"""
+        with self._lock:
+            return (
+                self.enabled
+                and self.state == OPEN
+                and time.monotonic() - self._opened_at < self.reset_timeout
+            )
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        probe = self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        except BaseException:
+            self.abandon(probe)
+            raise
+        self.record_success()
+        return result
+
+    async def acall(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        probe = self.before_call()
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        except BaseException:
+            # asyncio.CancelledError, e.g. a recall timed out by the agent
+            self.abandon(probe)
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 1)
+            return {
+                "state": self.state if self.enabled else "disabled",
+                "consecutive_failures": self.failures,
+                "trips": self.trips,
+                "rejected_calls": self.rejected,
+                "retry_in_seconds": retry_in,
+                "last_error": self.last_error,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(base_url: str) -> CircuitBreaker:
+    """Circuit breaker shared by every client of one Hindsight server"""
+    with _breakers_lock:
+        breaker = _breakers.get(base_url)
+        if breaker is None:
+            breaker = _breakers[base_url] = CircuitBreaker(base_url)
+    return breaker
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of every server's circuit, by base URL"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+def _breaker_samples():
+    for base_url, snapshot in breaker_states().items():
+        for state in (CLOSED, OPEN, HALF_OPEN):
+            yield (
+                "hindsight_circuit_state", "gauge", "1 for the current circuit state of each Hindsight server",
+                {"base_url": base_url, "state": state}, int(snapshot["state"] == state)
+            )
+        yield (
+            "hindsight_circuit_rejected_total", "counter", "Calls failed fast by an open circuit",
+            {"base_url": base_url}, snapshot["rejected_calls"]
+        )
+
+
+get_metrics_registry().register_collector(_breaker_samples)
@@ -0,0 +1,614 @@
+# consolidation.py
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from chunk_index import chunk_hash
+from circuit_breaker import get_breaker
+from memory_metadata import MemoryRecord, strip_metadata_header
+from metrics import get_metrics_registry, stage, swallowed_error
+from recall_cache import get_recall_cache, normalize_query
+from tokenizer import count_tokens
+
+logger = logging.getLogger(__name__)
+
+CONSOLIDATION_ENABLED = os.environ.get("CONSOLIDATION_ENABLED", "false").lower() == "true"
+CONSOLIDATION_DB_PATH = os.environ.get("CONSOLIDATION_DB_PATH", "./consolidation.db")
+CONSOLIDATION_WINDOW = os.environ.get("CONSOLIDATION_WINDOW", "01:00-05:00")  # Local off-peak hours; empty for any time
+CONSOLIDATION_INTERVAL = float(os.environ.get("CONSOLIDATION_INTERVAL", "3600"))  # Seconds between scheduled runs
+CONSOLIDATION_CONCURRENCY = int(os.environ.get("CONSOLIDATION_CONCURRENCY", "2"))  # Topics reflected on at once
+CONSOLIDATION_MAX_TOPICS = int(os.environ.get("CONSOLIDATION_MAX_TOPICS", "20"))  # Topics per run
+CONSOLIDATION_MIN_RECALLS = int(os.environ.get("CONSOLIDATION_MIN_RECALLS", "5"))  # Recalls before a topic is hot
+CONSOLIDATION_LOOKBACK_HOURS = int(os.environ.get("CONSOLIDATION_LOOKBACK_HOURS", "24"))
+CONSOLIDATION_MIN_MEMORIES = int(os.environ.get("CONSOLIDATION_MIN_MEMORIES", "4"))  # Raw memories worth a summary
+CONSOLIDATION_MAX_SOURCES = int(os.environ.get("CONSOLIDATION_MAX_SOURCES", "30"))  # Memories a summary may cover
+CONSOLIDATION_REFRESH_HOURS = int(os.environ.get("CONSOLIDATION_REFRESH_HOURS", "168"))  # Summary age before a rebuild
+# Banks whose id contains any of these are never logged or consolidated (per-user memory by default)
+CONSOLIDATION_EXCLUDE_BANKS = [
+    part for part in os.environ.get("CONSOLIDATION_EXCLUDE_BANKS", "-user-").split(",") if part
+]
+
+# Tag on every summary retained by the scheduler; summaries also carry "<tag>:<summary id>"
+CONSOLIDATION_TAG = "consolidation_summary"
+# Tag of summaries stored by MemoryReflection.reflect_and_summarize (never used as sources)
+_REFLECTION_TAG = "consolidated_knowledge"
+# A summary replaces the memories it covers only when a recall returns at least this many of them
+_MIN_COVERED_IN_RESULT = 2
+_LOG_FLUSH_INTERVAL = 60.0
+_LEASE_SECONDS = 3600.0
+_MAX_TOPIC_CHARS = 200
+
+RUNS = get_metrics_registry().counter(
+    "consolidation_runs_total", "Consolidation runs by trigger (schedule or manual)", ("trigger",)
+)
+COLLAPSED_MEMORIES = get_metrics_registry().counter(
+    "consolidation_collapsed_memories_total", "Recalled memories replaced by a consolidation summary"
+)
+
+
+def content_key(text: str) -> str:
+    """Identity of a recalled memory for coverage, independent of its metadata header"""
+    return chunk_hash(strip_metadata_header(text))
+
+
+def parse_window(window: str) -> Optional[Tuple[int, int]]:
+    """``"HH:MM-HH:MM"`` as minutes after midnight, or None for "any time" """
+    if not window.strip():
+        return None
+    try:
+        start, end = (part.strip() for part in window.split("-"))
+        return tuple(int(h) * 60 + int(m) for h, m in (start.split(":"), end.split(":")))
+    except ValueError:
+        raise ValueError(f"Invalid CONSOLIDATION_WINDOW {window!r}; expected HH:MM-HH:MM")
+
+
+@dataclass
+class HotTopic:
+    bank_id: str
+    topic: str
+    base_url: str
+    recalls: int
+
+
+@dataclass
+class ConsolidationRun:
+    """Outcome and cost of one consolidation run"""
+    run_id: str
+    trigger: str
+    started_at: str
+    duration_seconds: float = 0.0
+    topics: int = 0
+    summaries: int = 0
+    memories_covered: int = 0
+    reflect_calls: int = 0
+    retain_calls: int = 0
+    source_tokens: int = 0  # Tokens of the memories summarized
+    summary_tokens: int = 0  # Tokens of the summaries written
+    details: List[Dict[str, Any]] = field(default_factory=list)
+    failures: List[Dict[str, Any]] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class _BankSummaries:
+    summaries: Dict[str, MemoryRecord]  # topic -> summary as a recall record
+    covers: Dict[str, List[str]]  # content key -> topics whose summary covers it
+    live_tags: Dict[str, str]  # "<tag>:<summary id>" -> topic
+
+
+class ConsolidationStore:
+    """Recall log, live summaries and run reports in a SQLite sidecar.
+
+    Like the rule registry, per-bank summary lookups are cached and the
+    cache is emptied when SQLite's ``data_version`` shows another worker
+    has committed.
+    """
+
+    def __init__(self, db_path: str = CONSOLIDATION_DB_PATH):
+        self.db_path = db_path
+        self._banks: Dict[str, _BankSummaries] = {}
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS recall_log (
+                    bank_id TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    hour TEXT NOT NULL,
+                    base_url TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (bank_id, topic, hour)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    bank_id TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    summary_id TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    memory_id TEXT,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (bank_id, topic)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS covered (
+                    bank_id TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    content_key TEXT NOT NULL,
+                    PRIMARY KEY (bank_id, topic, content_key)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    trigger TEXT NOT NULL,
+                    started_at TEXT NOT NULL,
+                    report TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+        self._data_version = self._read_data_version()
+
+    def log_recalls(self, counts: Dict[Tuple[str, str, str], int]):
+        """Add ``(bank_id, topic, base_url) -> recalls`` to the current hour's log"""
+        hour = datetime.now().strftime("%Y-%m-%dT%H")
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO recall_log (bank_id, topic, hour, base_url, count) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (bank_id, topic, hour) DO UPDATE SET count = count + excluded.count",
+                    [(bank_id, topic, hour, base_url, n) for (bank_id, topic, base_url), n in counts.items()]
+                )
+
+    def hot_topics(
+        self,
+        min_recalls: int = CONSOLIDATION_MIN_RECALLS,
+        lookback_hours: int = CONSOLIDATION_LOOKBACK_HOURS,
+        refresh_hours: int = CONSOLIDATION_REFRESH_HOURS,
+        limit: int = CONSOLIDATION_MAX_TOPICS
+    ) -> List[HotTopic]:
+        """Most recalled topics without a fresh summary, busiest first"""
+        now = datetime.now()
+        since = (now - timedelta(hours=lookback_hours)).strftime("%Y-%m-%dT%H")
+        stale_before = (now - timedelta(hours=refresh_hours)).isoformat()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT l.bank_id, l.topic, MAX(l.base_url), SUM(l.count) AS recalls FROM recall_log l "
+                "LEFT JOIN summaries s ON s.bank_id = l.bank_id AND s.topic = l.topic "
+                "WHERE l.hour >= ? AND (s.created_at IS NULL OR s.created_at < ?) "
+                "GROUP BY l.bank_id, l.topic HAVING recalls >= ? ORDER BY recalls DESC LIMIT ?",
+                (since, stale_before, min_recalls, limit)
+            ).fetchall()
+        return [HotTopic(*row) for row in rows]
+
+    def prune_log(self, lookback_hours: int = CONSOLIDATION_LOOKBACK_HOURS):
+        since = (datetime.now() - timedelta(hours=lookback_hours)).strftime("%Y-%m-%dT%H")
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM recall_log WHERE hour < ?", (since,))
+
+    def save_summary(
+        self,
+        bank_id: str,
+        topic: str,
+        summary_id: str,
+        text: str,
+        memory_id: Optional[str],
+        covered: List[str]
+    ):
+        """Make ``text`` the topic's summary, replacing any earlier one and its coverage"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO summaries (bank_id, topic, summary_id, text, memory_id, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (bank_id, topic) DO UPDATE SET summary_id = excluded.summary_id, "
+                    "text = excluded.text, memory_id = excluded.memory_id, created_at = excluded.created_at",
+                    (bank_id, topic, summary_id, text, memory_id, datetime.now().isoformat())
+                )
+                self._conn.execute("DELETE FROM covered WHERE bank_id = ? AND topic = ?", (bank_id, topic))
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO covered (bank_id, topic, content_key) VALUES (?, ?, ?)",
+                    [(bank_id, topic, key) for key in covered]
+                )
+            self._banks.pop(bank_id, None)
+
+    def expire_summaries(self, bank_id: str, mentioning: List[str]) -> int:
+        """Retire a bank's summaries that mention any of ``mentioning`` (e.g. an updated rule id)"""
+        if not mentioning:
+            return 0
+        with self._lock:
+            with self._conn:
+                topics = [
+                    topic for topic, text in self._conn.execute(
+                        "SELECT topic, text FROM summaries WHERE bank_id = ?", (bank_id,)
+                    ) if any(term in text for term in mentioning)
+                ]
+                for topic in topics:
+                    self._conn.execute("DELETE FROM summaries WHERE bank_id = ? AND topic = ?", (bank_id, topic))
+                    self._conn.execute("DELETE FROM covered WHERE bank_id = ? AND topic = ?", (bank_id, topic))
+            if topics:
+                self._banks.pop(bank_id, None)
+        return len(topics)
+
+    def collapse(self, bank_id: str, records: List[MemoryRecord]) -> List[MemoryRecord]:
+        """Replace recalled memories covered by a summary with the summary itself.
+
+        A summary stands in for its memories only when at least two of them
+        were recalled, taking the place of the first one. Summaries that
+        were rebuilt or retired since being retained are dropped.
+        """
+        bank = self._bank_summaries(bank_id)
+        if not bank.summaries:
+            return [record for record in records if CONSOLIDATION_TAG not in record.tags]
+
+        keys = [content_key(record.text) for record in records]
+        hits = Counter(topic for key in keys for topic in bank.covers.get(key, ()))
+        collapsing = {topic for topic, n in hits.items() if n >= _MIN_COVERED_IN_RESULT}
+        shown = set()
+        collapsed = 0
+        result = []
+        for record, key in zip(records, keys):
+            if CONSOLIDATION_TAG in record.tags:
+                topic = next((bank.live_tags[tag] for tag in record.tags if tag in bank.live_tags), None)
+                if topic is not None and topic not in shown:
+                    shown.add(topic)
+                    result.append(record)
+                continue
+            topic = next((t for t in bank.covers.get(key, ()) if t in collapsing), None)
+            if topic is None:
+                result.append(record)
+                continue
+            collapsed += 1
+            if topic not in shown:
+                shown.add(topic)
+                result.append(bank.summaries[topic])
+        COLLAPSED_MEMORIES.inc(collapsed)
+        return result
+
+    def save_run(self, run: ConsolidationRun):
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO runs (run_id, trigger, started_at, report) VALUES (?, ?, ?, ?)",
+                    (run.run_id, run.trigger, run.started_at, json.dumps(run.to_dict()))
+                )
+
+    def recent_runs(self, limit: int = 10) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT report FROM runs ORDER BY started_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [json.loads(report) for (report,) in rows]
+
+    def last_run_started(self, trigger: str) -> Optional[datetime]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(started_at) FROM runs WHERE trigger = ?", (trigger,)
+            ).fetchone()
+        return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+    def acquire_lease(self, holder: str, seconds: float = _LEASE_SECONDS) -> bool:
+        """Take the run lease shared by all workers; True if ``holder`` now has it"""
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO leases (name, holder, expires_at) VALUES ('run', ?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                    "WHERE leases.expires_at < ? OR leases.holder = excluded.holder",
+                    (holder, now + seconds, now)
+                )
+                row = self._conn.execute("SELECT holder FROM leases WHERE name = 'run'").fetchone()
+        return row is not None and row[0] == holder
+
+    def release_lease(self, holder: str):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM leases WHERE name = 'run' AND holder = ?", (holder,))
+
+    def _bank_summaries(self, bank_id: str) -> _BankSummaries:
+        with self._lock:
+            self._check_data_version()
+            bank = self._banks.get(bank_id)
+            if bank is None:
+                bank = _BankSummaries({}, {}, {})
+                for topic, summary_id, text, memory_id, created_at in self._conn.execute(
+                    "SELECT topic, summary_id, text, memory_id, created_at FROM summaries WHERE bank_id = ?",
+                    (bank_id,)
+                ):
+                    tag = f"{CONSOLIDATION_TAG}:{summary_id}"
+                    bank.live_tags[tag] = topic
+                    bank.summaries[topic] = MemoryRecord(
+                        text=text,
+                        importance="high",
+                        source="consolidation",
+                        tags=[CONSOLIDATION_TAG, tag],
+                        date=datetime.fromisoformat(created_at),
+                        id=memory_id,
+                    )
+                for topic, key in self._conn.execute(
+                    "SELECT topic, content_key FROM covered WHERE bank_id = ?", (bank_id,)
+                ):
+                    bank.covers.setdefault(key, []).append(topic)
+                self._banks[bank_id] = bank
+            return bank
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_data_version(self):
+        """Drop the cache if another connection has committed since the last check"""
+        version = self._read_data_version()
+        if version != self._data_version:
+            self._data_version = version
+            self._banks.clear()
+
+
+class Consolidator:
+    """Background engine that replaces hot topics' raw memories with summaries.
+
+    Recalls are tallied per (bank, normalized query) in memory and flushed to
+    the store's recall log every minute. During the off-peak ``window`` a run
+    starts every ``interval`` seconds: the most recalled topics without a
+    fresh summary are reflected on, ``concurrency`` at a time, and each
+    summary is retained and recorded with the memories it covers. Recall
+    then returns the summary in place of those memories (``collapse``). A
+    lease in the store keeps runs to one worker process at a time.
+    """
+
+    def __init__(
+        self,
+        store: Optional[ConsolidationStore] = None,
+        window: str = CONSOLIDATION_WINDOW,
+        interval: float = CONSOLIDATION_INTERVAL,
+        concurrency: int = CONSOLIDATION_CONCURRENCY
+    ):
+        self.store = store or ConsolidationStore()
+        self.window = parse_window(window)
+        self.interval = interval
+        self.concurrency = max(1, concurrency)
+        self._holder = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._pending: Counter = Counter()
+        self._pending_lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def note_recall(self, base_url: str, bank_id: str, query: str):
+        """Count a recall of ``query`` towards its topic's heat"""
+        if any(part in bank_id for part in CONSOLIDATION_EXCLUDE_BANKS):
+            return
+        topic = normalize_query(query)[:_MAX_TOPIC_CHARS]
+        if not topic:
+            return
+        with self._pending_lock:
+            self._pending[(bank_id, topic, base_url)] += 1
+
+    def collapse(self, bank_id: str, records: List[MemoryRecord]) -> List[MemoryRecord]:
+        try:
+            return self.store.collapse(bank_id, records)
+        except Exception as e:
+            logger.warning(f"Failed to apply consolidation summaries: {e}")
+            swallowed_error("consolidation", "collapse")
+            return records
+
+    def expire_summaries(self, bank_id: str, mentioning: List[str]):
+        """Stop using summaries that mention updated content; they are rebuilt on a later run"""
+        try:
+            if self.store.expire_summaries(bank_id, mentioning):
+                get_recall_cache().invalidate_bank(bank_id)
+        except Exception as e:
+            logger.warning(f"Failed to expire consolidation summaries: {e}")
+            swallowed_error("consolidation", "expire")
+
+    def flush_log(self):
+        with self._pending_lock:
+            counts, self._pending = self._pending, Counter()
+        if not counts:
+            return
+        try:
+            self.store.log_recalls(counts)
+        except Exception as e:
+            logger.warning(f"Failed to write recall log: {e}")
+            swallowed_error("consolidation", "log")
+
+    def start(self):
+        """Start the scheduler thread (idempotent)"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="consolidation", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stopping.set()
+        self.flush_log()
+
+    def in_window(self, now: Optional[datetime] = None) -> bool:
+        if self.window is None:
+            return True
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        start, end = self.window
+        if start <= end:
+            return start <= minute < end
+        return minute >= start or minute < end  # Window spans midnight
+
+    def run(
+        self,
+        trigger: str = "manual",
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None
+    ) -> ConsolidationRun:
+        """Consolidate the current hot topics now; raises RuntimeError if a run is already going"""
+        if not self._run_lock.acquire(blocking=False):
+            raise RuntimeError("A consolidation run is already in progress")
+        try:
+            if not self.store.acquire_lease(self._holder):
+                raise RuntimeError("A consolidation run is already in progress in another worker")
+            try:
+                return self._run(trigger, on_progress, should_cancel)
+            finally:
+                self.store.release_lease(self._holder)
+        finally:
+            self._run_lock.release()
+
+    def _run(
+        self,
+        trigger: str,
+        on_progress: Optional[Callable[[int, int], None]],
+        should_cancel: Optional[Callable[[], bool]]
+    ) -> ConsolidationRun:
+        self.flush_log()
+        report = ConsolidationRun(run_id=uuid.uuid4().hex, trigger=trigger, started_at=datetime.now().isoformat())
+        started = time.perf_counter()
+        with stage("consolidation.run", trigger=trigger):
+            topics = self.store.hot_topics()
+            report.topics = len(topics)
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="consolidate") as pool:
+                futures = {pool.submit(self._consolidate, topic, should_cancel): topic for topic in topics}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    topic = futures[future]
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        logger.warning(f"Consolidating {topic.topic!r} in {topic.bank_id} failed: {e}")
+                        swallowed_error("consolidation", "topic")
+                        outcome = {"error": str(e)}
+                    self._tally(report, topic, outcome)
+                    if on_progress is not None:
+                        on_progress(done, len(topics))
+            self.store.prune_log()
+        report.duration_seconds = round(time.perf_counter() - started, 3)
+        self.store.save_run(report)
+        RUNS.inc(trigger=trigger)
+        logger.info(
+            f"Consolidation run wrote {report.summaries} summaries covering {report.memories_covered} "
+            f"memories in {report.duration_seconds}s ({len(report.failures)} failures)"
+        )
+        return report
+
+    def _consolidate(self, topic: HotTopic, should_cancel: Optional[Callable[[], bool]]) -> Dict[str, Any]:
+        """Summarize one topic; returns its contribution to the run report"""
+        from enhanced_memory import EnhancedHindsightMemory
+        from hindsight_pool import get_bank
+
+        if should_cancel is not None and should_cancel():
+            return {"skipped": "cancelled"}
+        if get_breaker(topic.base_url).is_open():
+            return {"error": "Hindsight unavailable"}
+
+        memory = get_bank(EnhancedHindsightMemory, topic.base_url, topic.bank_id)
+        with stage("consolidation.topic", bank_id=topic.bank_id):
+            records = memory.recall_records(
+                topic.topic, prioritize_recent=False, limit=CONSOLIDATION_MAX_SOURCES, consolidated=False
+            )
+            # Rules stay verbatim, and summaries are not summarized again
+            sources = [
+                record for record in records
+                if record.importance != "critical"
+                and CONSOLIDATION_TAG not in record.tags
+                and _REFLECTION_TAG not in record.tags
+            ]
+            if len(sources) < CONSOLIDATION_MIN_MEMORIES:
+                return {"skipped": "too_few_memories", "memories": len(sources)}
+
+            summary = memory.reflect(f"Summarize and consolidate knowledge about: {topic.topic}")
+            if not summary:
+                return {"error": "reflection returned nothing", "reflect_calls": 1}
+
+            summary_id = uuid.uuid4().hex
+            memory_ids = memory.retain_with_metadata(
+                content=summary,
+                context="consolidation",
+                importance="high",
+                source="consolidation",
+                tags=[CONSOLIDATION_TAG, f"{CONSOLIDATION_TAG}:{summary_id}"]
+            )
+            if memory_ids is None:
+                return {"error": "failed to retain summary", "reflect_calls": 1, "retain_calls": 1}
+
+            covered = list(dict.fromkeys(content_key(record.text) for record in sources))
+            self.store.save_summary(
+                topic.bank_id, topic.topic, summary_id, summary,
+                memory_ids[0] if memory_ids else None, covered
+            )
+            get_recall_cache().invalidate_bank(topic.bank_id)
+        return {
+            "summaries": 1,
+            "memories_covered": len(covered),
+            "reflect_calls": 1,
+            "retain_calls": 1,
+            "source_tokens": sum(count_tokens(record.text) for record in sources),
+            "summary_tokens": count_tokens(summary),
+        }
+
+    def _tally(self, report: ConsolidationRun, topic: HotTopic, outcome: Dict[str, Any]):
+        for name in ("summaries", "memories_covered", "reflect_calls", "retain_calls", "source_tokens", "summary_tokens"):
+            setattr(report, name, getattr(report, name) + outcome.get(name, 0))
+        detail = {"bank_id": topic.bank_id, "topic": topic.topic, "recalls": topic.recalls}
+        if "error" in outcome:
+            report.failures.append({**detail, "error": outcome["error"]})
+        else:
+            report.details.append({
+                **detail,
+                "memories_covered": outcome.get("memories_covered", 0),
+                "skipped": outcome.get("skipped"),
+            })
+
+    def _loop(self):
+        while not self._stopping.wait(_LOG_FLUSH_INTERVAL):
+            self.flush_log()
+            if not self._due():
+                continue
+            try:
+                self.run(trigger="schedule")
+            except RuntimeError as e:
+                logger.info(f"Skipping scheduled consolidation: {e}")
+            except Exception as e:
+                logger.warning(f"Scheduled consolidation failed: {e}")
+                swallowed_error("consolidation", "run")
+
+    def _due(self) -> bool:
+        now = datetime.now()
+        if not self.in_window(now):
+            return False
+        last = self.store.last_run_started("schedule")
+        return last is None or (now - last).total_seconds() >= self.interval
+
+
+_consolidator: Optional[Consolidator] = None
+_consolidator_lock = threading.Lock()
+
+
+def get_consolidator() -> Optional[Consolidator]:
+    """Process-wide consolidation engine, or None when ``CONSOLIDATION_ENABLED`` is false"""
+    global _consolidator
+    if not CONSOLIDATION_ENABLED:
+        return None
+    with _consolidator_lock:
+        if _consolidator is None:
+            _consolidator = Consolidator()
+    return _consolidator
@@ -0,0 +1,161 @@
+# context_assembly.py
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from memory_metadata import IMPORTANCE_ORDER, MemoryRecord, strip_metadata_header
+from tokenizer import get_tokenizer
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1500"))
+# Per-source caps, e.g. "company=600,product=400,department=300,user=300"
+CONTEXT_SOURCE_BUDGETS = os.environ.get(
+    "CONTEXT_SOURCE_BUDGETS", "company=600,product=400,department=300,user=300"
+)
+# Overflowing memories are cut down to what is left, unless that is less than this
+CONTEXT_MIN_SNIPPET_TOKENS = int(os.environ.get("CONTEXT_MIN_SNIPPET_TOKENS", "24"))
+
+_ELLIPSIS = " …"
+
+
+def parse_source_budgets(spec: str) -> Dict[str, int]:
+    """``"company=600,user=300"`` -> ``{"company": 600, "user": 300}``"""
+    budgets = {}
+    for part in spec.split(","):
+        name, sep, value = part.partition("=")
+        if sep and value.strip():
+            budgets[name.strip()] = int(value)
+    return budgets
+
+
+@dataclass
+class SourceUsage:
+    budget: int
+    tokens: int = 0
+    included: int = 0
+    truncated: int = 0
+    dropped: int = 0
+
+
+@dataclass
+class AssembledContext:
+    """Prompt sections per source plus the token accounting for the turn"""
+    sections: Dict[str, str]
+    budget: int
+    tokens: int = 0
+    usage: Dict[str, SourceUsage] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "budget": self.budget,
+            "tokens": self.tokens,
+            "sources": {name: vars(usage) for name, usage in self.usage.items()},
+        }
+
+
+@dataclass
+class _Candidate:
+    source: str
+    rank: int
+    text: str
+    tokens: int
+    priority: float
+
+
+class ContextAssembler:
+    """Fits recalled memories from several sources into a token budget.
+
+    Metadata headers are replaced by a short "(v2.0, 2026-03-01)" label so
+    the model can still tell versions apart. Memories then compete for the
+    budget in priority order: the reranker's ``score`` when set, otherwise
+    the recall rank (1 for the best match, 1/2 for the next, ...) weighted
+    by importance. A memory is included whole if both the turn budget and
+    its source's budget allow, cut short if at least ``min_snippet_tokens``
+    remain, and dropped otherwise. Sections list the kept memories in the
+    order they were given.
+    """
+
+    def __init__(
+        self,
+        budget: int = CONTEXT_TOKEN_BUDGET,
+        source_budgets: Optional[Dict[str, int]] = None,
+        min_snippet_tokens: int = CONTEXT_MIN_SNIPPET_TOKENS
+    ):
+        self.budget = budget
+        self.source_budgets = (
+            source_budgets if source_budgets is not None
+            else parse_source_budgets(CONTEXT_SOURCE_BUDGETS)
+        )
+        self.min_snippet_tokens = min_snippet_tokens
+        self.tokenizer = get_tokenizer()
+
+    def assemble(self, recalled: Dict[str, List[MemoryRecord]]) -> AssembledContext:
+        result = AssembledContext(sections={}, budget=self.budget)
+        for name in recalled:
+            result.usage[name] = SourceUsage(budget=self.source_budgets.get(name, self.budget))
+
+        candidates = []
+        seen = set()
+        for name, records in recalled.items():
+            for rank, record in enumerate(records):
+                text = strip_metadata_header(record.text)
+                if not text:
+                    continue
+                label = _label(record)
+                if text in seen:
+                    result.usage[name].dropped += 1  # Same memory from another bank
+                    continue
+                seen.add(text)
+                if record.score is not None:
+                    priority = record.score  # Already reranked with importance
+                else:
+                    priority = (IMPORTANCE_ORDER.get(record.importance, 1) + 1) / (rank + 1)
+                candidates.append(_Candidate(
+                    source=name,
+                    rank=rank,
+                    text=f"{label}{text}",
+                    tokens=self.tokenizer.count(label + text),
+                    priority=priority,
+                ))
+
+        kept: Dict[str, List[_Candidate]] = {name: [] for name in recalled}
+        remaining = self.budget
+        for candidate in sorted(candidates, key=lambda c: c.priority, reverse=True):
+            usage = result.usage[candidate.source]
+            room = min(remaining, usage.budget - usage.tokens)
+            if candidate.tokens > room:
+                if room < self.min_snippet_tokens:
+                    usage.dropped += 1
+                    continue
+                candidate.text, candidate.tokens = self._truncate(candidate.text, room)
+                usage.truncated += 1
+            usage.tokens += candidate.tokens
+            usage.included += 1
+            remaining -= candidate.tokens
+            kept[candidate.source].append(candidate)
+
+        for name, items in kept.items():
+            items.sort(key=lambda c: c.rank)
+            result.sections[name] = "\n".join(f"- {c.text}" for c in items) if items else "None."
+        result.tokens = self.budget - remaining
+        return result
+
+    def _truncate(self, text: str, room: int) -> Tuple[str, int]:
+        """``text`` cut short with an ellipsis to at most ``room`` tokens, and its token count"""
+        cut = room - self.tokenizer.count(_ELLIPSIS)
+        while True:
+            snippet = self.tokenizer.truncate(text, cut) + _ELLIPSIS
+            tokens = self.tokenizer.count(snippet)
+            # Token boundaries can shift where the ellipsis joins the text
+            if tokens <= room or cut <= 0:
+                return snippet, tokens
+            cut -= tokens - room
+
+
+def _label(record: MemoryRecord) -> str:
+    """Compact version/date prefix standing in for the stripped header"""
+    parts = []
+    if record.version:
+        parts.append(f"v{record.version}")
+    if record.date:
+        parts.append(record.date.strftime("%Y-%m-%d"))
+    return f"({', '.join(parts)}) " if parts else ""
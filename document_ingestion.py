@@ -1,16 +1,42 @@
 # document_ingestion.py
+from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 import logging
 
+from chunk_index import ChunkIndex, chunk_hash
+from chunking import Chunker, get_chunker
+from memory_layer import RetainReport
+from metrics import INGESTED_CHUNKS, stage
+
 logger = logging.getLogger(__name__)
 
+# Chunks looked up in the chunk index per query
+_LOOKUP_BATCH = 64
+
+
+@dataclass
+class IngestionReport(RetainReport):
+    """Retain report plus how each chunk compared to what the bank already had"""
+    skipped: int = 0
+    added: int = 0
+    changed: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        summary = super().to_dict()
+        summary.update(skipped=self.skipped, added=self.added, changed=self.changed)
+        return summary
+
 
 class DocumentIngestion:
     """Handles ingestion of company documents into memory"""
     
-    def __init__(self, memory):
+    def __init__(self, memory, chunker: Optional[Chunker] = None, index: Optional[ChunkIndex] = None):
         self.memory = memory
+        self.chunker = chunker or get_chunker()
+        # Without an index every chunk is retained
+        self.index = index
     
     def ingest_document(
         self, 
@@ -18,36 +44,92 @@ class DocumentIngestion:
         document_type: str = "dfx_rule",
         version: str = "1.0",
         importance: str = "high",
-        content: Optional[str] = None
-    ):
-        """Ingest a document into memory"""
+        content: Optional[str] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None
+    ) -> IngestionReport:
+        """Ingest a document into memory, returning the per-chunk retain report.
+        
+        Pages are extracted, chunked and retained as a stream, so memory use
+        is bounded by the chunk and batch size rather than the document size.
+        With a chunk index, chunks the bank already holds are skipped and the
+        rest are counted as added, or changed when they replace a chunk at the
+        same position of a previously ingested version of ``file_path``.
+        """
         try:
-            # Load content if not provided
-            if content is None:
-                content = self._load_document(file_path)
+            with stage("ingest.document", source=file_path):
+                bank_id = getattr(self.memory, "bank_id", None)
+                index = self.index if bank_id else None
+                previous_positions = index.positions(bank_id, file_path) if index else {}
             
-            # Split into chunks (for large documents)
-            chunks = self._chunk_document(content, chunk_size=1000)
+                # Stream pages from the file unless content was provided
+                pages = [content] if content is not None else self._iter_pages(file_path)
             
-            # Store each chunk with metadata
-            for i, chunk in enumerate(chunks):
-                self.memory.retain_with_metadata(
-                    content=chunk,
-                    context=f"{document_type}_chunk_{i}",
-                    importance=importance,
-                    source=file_path,
-                    version=version,
-                    tags=[document_type, "company_standard"]
-                )
+                # Split into chunks (for large documents)
+                chunks = self.chunker.chunk(pages)
+            
+                # (hash, position) of every chunk sent to retain, in send order
+                sent: List[Tuple[Optional[str], int]] = []
+                unchanged: List[Tuple[str, int]] = []
+            
+                def new_chunks() -> Iterator[Tuple[int, str]]:
+                    seen = set()
+                    numbered = enumerate(chunks)
+                    while True:
+                        batch = list(islice(numbered, _LOOKUP_BATCH))
+                        if not batch:
+                            return
+                        digests = [chunk_hash(chunk) if index else None for _, chunk in batch]
+                        held = index.present(bank_id, digests) if index else set()
+                        for (position, chunk), digest in zip(batch, digests):
+                            if index and (digest in seen or digest in held):
+                                unchanged.append((digest, position))
+                                continue
+                            seen.add(digest)
+                            sent.append((digest, position))
+                            yield position, chunk
             
-            logger.info(f"Ingested {len(chunks)} chunks from {file_path}")
-            return len(chunks)
+                # Store chunks with metadata in batches as they are produced
+                retained = self.memory.retain_many((
+                    {
+                        "content": chunk,
+                        "context": f"{document_type}_chunk_{position}",
+                        "importance": importance,
+                        "source": file_path,
+                        "version": version,
+                        "tags": [document_type, "company_standard"],
+                    }
+                    for position, chunk in new_chunks()
+                ), on_progress=on_progress, should_cancel=should_cancel)
+            
+                report = IngestionReport(results=retained.results, skipped=len(unchanged))
+                stored = [sent[r.index] for r in retained.results if r.ok]
+                for _, position in stored:
+                    if position in previous_positions:
+                        report.changed += 1
+                    else:
+                        report.added += 1
+                if index:
+                    # A cancelled ingest saw only part of the new version; keep the old rows
+                    cancelled = should_cancel is not None and should_cancel()
+                    index.record(bank_id, file_path, version, stored + unchanged, replace=not cancelled)
+            
+                logger.info(
+                    f"Ingested {report.succeeded}/{len(report.results)} chunks from {file_path} "
+                    f"({report.skipped} unchanged skipped)"
+                )
+                if report.failed:
+                    logger.warning(f"{len(report.failed)} chunks from {file_path} failed to retain")
+                INGESTED_CHUNKS.inc(report.succeeded, outcome="stored")
+                INGESTED_CHUNKS.inc(len(report.failed), outcome="failed")
+                INGESTED_CHUNKS.inc(report.skipped, outcome="skipped")
+                return report
         except Exception as e:
             logger.error(f"Failed to ingest document {file_path}: {e}")
             raise
     
-    def _load_document(self, file_path: str) -> str:
-        """Extract text from document"""
+    def _iter_pages(self, file_path: str) -> Iterator[str]:
+        """Yield document text one page (PDF) or line (text files) at a time"""
         file_path_obj = Path(file_path)
         
         if not file_path_obj.exists():
@@ -55,44 +137,23 @@ class DocumentIngestion:
         
         # Handle different file types
         if file_path.endswith('.txt') or file_path.endswith('.md'):
-            return file_path_obj.read_text(encoding='utf-8')
+            with open(file_path, encoding='utf-8') as file:
+                yield from file
         elif file_path.endswith('.pdf'):
             # For PDF, try to use PyPDF2 if available
             try:
                 import PyPDF2
-                text = ""
-                with open(file_path, 'rb') as file:
-                    reader = PyPDF2.PdfReader(file)
-                    for page in reader.pages:
-                        text += page.extract_text() + "\n"
-                return text
             except ImportError:
                 logger.warning("PyPDF2 not available, cannot read PDF. Install with: pip install PyPDF2")
                 raise ImportError("PyPDF2 required for PDF processing")
+            with open(file_path, 'rb') as file:
+                reader = PyPDF2.PdfReader(file)
+                for page in reader.pages:
+                    yield page.extract_text() or ""
         else:
             # Try to read as text
             try:
-                return file_path_obj.read_text(encoding='utf-8')
-            except:
+                with open(file_path, encoding='utf-8') as file:
+                    yield from file
+            except UnicodeDecodeError:
                 raise ValueError(f"Unsupported file type: {file_path}")
-    
-    def _chunk_document(self, content: str, chunk_size: int = 1000) -> List[str]:
-        """Split document into manageable chunks"""
-        words = content.split()
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        
-        for word in words:
-            current_chunk.append(word)
-            current_size += len(word) + 1
-            if current_size >= chunk_size:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = []
-                current_size = 0
-        
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-        
-        return chunks if chunks else [content]
-
@@ -0,0 +1,75 @@
+# embeddings.py
+import hashlib
+import os
+import re
+from typing import List
+
+import numpy as np
+
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "hashing")  # "hashing" or "openai"
+EMBEDDING_DIM = int(os.environ.get("EMBEDDING_DIM", "512"))
+OPENAI_EMBEDDING_MODEL = os.environ.get("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """Local, dependency-free text embeddings.
+
+    Words and word bigrams are hashed into a fixed number of signed buckets
+    and the vector is L2-normalized, so cosine similarity is a dot product.
+    Good at near-duplicate and keyword overlap, not at paraphrase.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _WORD_RE.findall(text.lower())
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            for feature in features:
+                digest = int.from_bytes(
+                    hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little"
+                )
+                sign = 1.0 if digest & 1 else -1.0
+                matrix[row, (digest >> 1) % self.dim] += sign
+        return _normalize(matrix)
+
+
+class OpenAIEmbedder:
+    """OpenAI embeddings through langchain-openai (network call per batch)"""
+
+    def __init__(self, model: str = OPENAI_EMBEDDING_MODEL):
+        from langchain_openai import OpenAIEmbeddings
+        self._embeddings = OpenAIEmbeddings(model=model)
+        self.dim = None
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        matrix = np.asarray(self._embeddings.embed_documents(texts), dtype=np.float32)
+        self.dim = matrix.shape[1]
+        return _normalize(matrix)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+_embedder = None
+
+
+def get_embedder():
+    """Process-wide embedder for the configured ``EMBEDDING_BACKEND``"""
+    global _embedder
+    if _embedder is None:
+        _embedder = OpenAIEmbedder() if EMBEDDING_BACKEND == "openai" else HashingEmbedder()
+    return _embedder
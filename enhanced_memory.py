@@ -1,17 +1,32 @@
 # enhanced_memory.py
-from typing import List, Optional
+import asyncio
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 from datetime import datetime
 import logging
 
-try:
-    from hindsight_client import Hindsight
-except ImportError:
-    try:
-        from hindsight import Hindsight
-    except ImportError:
-        raise ImportError(
-            "Hindsight client not found. Please install: pip install hindsight-all"
-        )
+from chunk_index import chunk_hash
+from circuit_breaker import CircuitOpenError
+from consolidation import get_consolidator
+from hindsight_pool import get_async_client, get_client
+from lexical_index import get_lexical_index, hybrid_fuse
+from metrics import RECALLED_MEMORIES, RECALLS, stage, swallowed_error
+from recall_cache import get_recall_cache, normalize_query
+from rule_registry import get_rule_registry
+from memory_layer import (
+    RETAIN_BATCH_SIZE,
+    RETAIN_MAX_CONCURRENCY,
+    RETAIN_MAX_RETRIES,
+    RetainReport,
+    recall_results,
+    retain_batched,
+)
+from memory_metadata import (
+    IMPORTANCE_ORDER,
+    MemoryRecord,
+    build_metadata,
+    importance_tag_filter,
+    record_from_result,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -20,22 +35,32 @@ class EnhancedHindsightMemory:
     """Enhanced memory with metadata support for enterprise use"""
     
     def __init__(self, base_url: str, bank_id: str, enabled: bool = True):
-        self.client = Hindsight(base_url=base_url)
+        self.base_url = base_url
+        self.client = get_client(base_url)
         self.bank_id = bank_id
         self.enabled = enabled
     
-    def retain(self, content: str, context: str | None = None):
+    def retain(self, content: str, context: str | None = None, background: bool = False):
         """Basic retain for backward compatibility"""
         if not self.enabled:
             return
+        if background and self._submit_background({"content": content, "context": context}):
+            return
         try:
-            self.client.retain(
-                bank_id=self.bank_id,
-                content=content,
-                context=context,
-            )
+            with stage("memory.retain", bank_id=self.bank_id):
+                response = self.client.retain(
+                    bank_id=self.bank_id,
+                    content=content,
+                    context=context,
+                )
+            self._index_lexical([{"content": content}], response)
+        except CircuitOpenError:
+            self._hold_for_replay({"content": content, "context": context})
         except Exception as e:
             logger.warning(f"Failed to retain memory: {e}")
+            swallowed_error("memory", "retain")
+        finally:
+            get_recall_cache().invalidate_bank(self.bank_id)
     
     def retain_with_metadata(
         self, 
@@ -44,13 +69,205 @@ class EnhancedHindsightMemory:
         importance: str = "normal",  # "critical", "high", "normal", "low"
         source: str | None = None,
         version: str | None = None,
-        tags: List[str] | None = None
+        tags: List[str] | None = None,
+        background: bool = False
+    ) -> Optional[List[str]]:
+        """Store content with rich metadata for intelligent tracking.
+        
+        Metadata is sent as structured Hindsight metadata and tags (used for
+        filtering and sorting) and also kept as a readable header in the text.
+        With ``background``, or while the server's circuit is open, the write
+        is queued in the write-behind buffer. Returns the new memory's ids
+        (empty if the backend does not report ids or the write was queued),
+        or None if the write failed.
+        """
+        if not self.enabled:
+            return None
+        
+        retain_kwargs = self._metadata_item({
+            "content": content,
+            "context": context,
+            "importance": importance,
+            "source": source,
+            "version": version,
+            "tags": tags,
+        })
+        if background and self._submit_background(retain_kwargs):
+            return []
+        
+        try:
+            with stage("memory.retain", bank_id=self.bank_id):
+                response = self.client.retain(bank_id=self.bank_id, **retain_kwargs)
+            self._index_lexical([retain_kwargs], response)
+            return list(getattr(response, "memory_ids", None) or [])
+        except CircuitOpenError:
+            return [] if self._hold_for_replay(retain_kwargs) else None
+        except Exception as e:
+            logger.warning(f"Failed to retain memory: {e}")
+            swallowed_error("memory", "retain")
+            return None
+        finally:
+            get_recall_cache().invalidate_bank(self.bank_id)
+    
+    async def aretain(self, content: str, context: str | None = None, background: bool = False):
+        """Async ``retain`` for the ASGI serving path"""
+        await self._aretain_kwargs({"content": content, "context": context}, background)
+    
+    async def aretain_with_metadata(
+        self,
+        content: str,
+        context: str | None = None,
+        importance: str = "normal",
+        source: str | None = None,
+        version: str | None = None,
+        tags: List[str] | None = None,
+        background: bool = False
     ):
-        """Store content with rich metadata for intelligent tracking"""
+        """Async ``retain_with_metadata`` for the ASGI serving path"""
+        if not self.enabled:
+            return
+        await self._aretain_kwargs(self._metadata_item({
+            "content": content,
+            "context": context,
+            "importance": importance,
+            "source": source,
+            "version": version,
+            "tags": tags,
+        }), background)
+    
+    async def _aretain_kwargs(self, retain_kwargs: Dict[str, Any], background: bool):
         if not self.enabled:
             return
+        # submit() may block briefly under backpressure; keep it off the loop
+        if background and await asyncio.to_thread(self._submit_background, retain_kwargs):
+            return
+        try:
+            with stage("memory.retain", bank_id=self.bank_id):
+                response = await get_async_client(self.base_url).aretain(bank_id=self.bank_id, **retain_kwargs)
+            await asyncio.to_thread(self._index_lexical, [retain_kwargs], response)
+        except CircuitOpenError:
+            await asyncio.to_thread(self._hold_for_replay, retain_kwargs)
+        except Exception as e:
+            logger.warning(f"Failed to retain memory: {e}")
+            swallowed_error("memory", "retain")
+        finally:
+            get_recall_cache().invalidate_bank(self.bank_id)
+    
+    def retain_many(
+        self,
+        items: Iterable[Dict[str, Any]],
+        batch_size: int = RETAIN_BATCH_SIZE,
+        max_concurrency: int = RETAIN_MAX_CONCURRENCY,
+        max_retries: int = RETAIN_MAX_RETRIES,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None
+    ) -> RetainReport:
+        """Bulk version of retain_with_metadata.
+        
+        Each item takes the same keys as ``retain_with_metadata`` (content,
+        context, importance, source, version, tags). Returns a report with
+        the outcome of every item. ``on_progress`` and ``should_cancel`` are
+        passed through to ``retain_batched``.
+        """
+        if not self.enabled:
+            return RetainReport()
         
-        # Add metadata to content
+        payload = (self._metadata_item(item) for item in items)
+        hashes: List[str] = []
+        try:
+            report = retain_batched(
+                self.client, self.bank_id, self._lexically_indexed(payload, hashes, batch_size),
+                batch_size, max_concurrency, max_retries, on_progress, should_cancel
+            )
+            index = get_lexical_index()
+            failed = [hashes[r.index] for r in report.results if not r.ok]
+            if index is not None and failed:
+                index.remove(self.bank_id, content_hashes=failed)
+            ids = {hashes[r.index]: r.memory_ids[0] for r in report.results if r.ok and r.memory_ids}
+            if index is not None and ids:
+                index.set_memory_ids(self.bank_id, ids)
+            return report
+        finally:
+            get_recall_cache().invalidate_bank(self.bank_id)
+    
+    def _submit_background(self, retain_kwargs: Dict[str, Any]) -> bool:
+        """Queue a write-behind retain; False when write-behind is disabled"""
+        from write_behind import get_write_behind
+        buffer = get_write_behind()
+        if buffer is None:
+            return False
+        buffer.submit(self.base_url, self.bank_id, retain_kwargs)
+        self._index_lexical([retain_kwargs])
+        return True
+    
+    def _hold_for_replay(self, retain_kwargs: Dict[str, Any]) -> bool:
+        """Queue a write the server could not take for later delivery; False if it was dropped"""
+        if self._submit_background(retain_kwargs):
+            return True
+        logger.warning(f"Hindsight unavailable and write-behind disabled; dropping write to {self.bank_id}")
+        swallowed_error("memory", "retain")
+        return False
+    
+    def _index_lexical(self, items: List[Dict[str, Any]], response: Any = None):
+        """Add retained items to the lexical index (with ids, if the backend reports them)"""
+        index = get_lexical_index()
+        if index is None or not items:
+            return
+        try:
+            index.add(self.bank_id, items, getattr(response, "memory_ids", None))
+        except Exception as e:
+            logger.warning(f"Failed to update lexical index: {e}")
+            swallowed_error("lexical_index", "add")
+    
+    def _lexically_indexed(
+        self,
+        items: Iterable[Dict[str, Any]],
+        hashes: List[str],
+        batch_size: int
+    ) -> Iterator[Dict[str, Any]]:
+        """Pass retain items through, indexing them in batches; records each item's hash"""
+        pending: List[Dict[str, Any]] = []
+        try:
+            for item in items:
+                hashes.append(chunk_hash(item["content"]))
+                pending.append(item)
+                if len(pending) >= batch_size:
+                    self._index_lexical(pending)
+                    pending = []
+                yield item
+        finally:
+            self._index_lexical(pending)
+    
+    def _metadata_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn a retain_with_metadata-style item into retain keyword arguments"""
+        importance = item.get("importance", "normal")
+        date = datetime.now()
+        metadata, tags = build_metadata(
+            importance, item.get("source"), item.get("version"), item.get("tags"), date
+        )
+        # Identifies the retained text on every memory extracted from it, so
+        # recall can match those memories with the lexical index entry
+        metadata["content_hash"] = chunk_hash(item["content"])
+        return {
+            "content": self._format_with_metadata(
+                item["content"], importance, item.get("source"), item.get("version"),
+                item.get("tags"), date
+            ),
+            "context": item.get("context") or "general",
+            "metadata": metadata,
+            "tags": tags,
+        }
+    
+    def _format_with_metadata(
+        self,
+        content: str,
+        importance: str = "normal",
+        source: str | None = None,
+        version: str | None = None,
+        tags: List[str] | None = None,
+        date: datetime | None = None
+    ) -> str:
+        """Prefix content with a human-readable metadata header"""
         metadata_parts = [f"[IMPORTANCE: {importance}]"]
         if version:
             metadata_parts.append(f"[VERSION: {version}]")
@@ -58,32 +275,71 @@ class EnhancedHindsightMemory:
             metadata_parts.append(f"[SOURCE: {source}]")
         if tags:
             metadata_parts.append(f"[TAGS: {', '.join(tags)}]")
-        metadata_parts.append(f"[DATE: {datetime.now().isoformat()}]")
+        metadata_parts.append(f"[DATE: {(date or datetime.now()).isoformat()}]")
         
         metadata_header = " ".join(metadata_parts)
-        enhanced_content = f"{metadata_header}\n{content}"
-        
-        try:
-            self.client.retain(
-                bank_id=self.bank_id,
-                content=enhanced_content,
-                context=context or "general",
-            )
-        except Exception as e:
-            logger.warning(f"Failed to retain memory: {e}")
+        return f"{metadata_header}\n{content}"
     
     def recall(self, query: str) -> List[str]:
         """Basic recall for backward compatibility"""
         if not self.enabled:
             return []
+        cache = get_recall_cache()
+        cache_key = ("recall", normalize_query(query))
+        cached = cache.get(self.bank_id, cache_key)
+        if cached is not None:
+            RECALLS.inc(outcome="cache_hit")
+            return list(cached)
+        version = cache.bank_version(self.bank_id)
         try:
-            results = self.client.recall(
-                bank_id=self.bank_id,
-                query=query,
-            )
-            return [r.text for r in results]
+            with stage("memory.recall", bank_id=self.bank_id):
+                results = self.client.recall(
+                    bank_id=self.bank_id,
+                    query=query,
+                )
+            memories = [r.text for r in recall_results(results)]
+            RECALLS.inc(outcome="backend")
+            RECALLED_MEMORIES.inc(len(memories), source="semantic")
+            cache.put(self.bank_id, cache_key, memories, version)
+            return list(memories)
+        except CircuitOpenError:
+            RECALLS.inc(outcome="circuit_open")
+            return []
+        except Exception as e:
+            logger.warning(f"Failed to recall memory: {e}")
+            RECALLS.inc(outcome="error")
+            swallowed_error("memory", "recall")
+            return []
+    
+    async def arecall(self, query: str) -> List[str]:
+        """Async ``recall`` for the ASGI serving path"""
+        if not self.enabled:
+            return []
+        cache = get_recall_cache()
+        cache_key = ("recall", normalize_query(query))
+        cached = cache.get(self.bank_id, cache_key)
+        if cached is not None:
+            RECALLS.inc(outcome="cache_hit")
+            return list(cached)
+        version = cache.bank_version(self.bank_id)
+        try:
+            with stage("memory.recall", bank_id=self.bank_id):
+                results = await get_async_client(self.base_url).arecall(
+                    bank_id=self.bank_id,
+                    query=query,
+                )
+            memories = [r.text for r in recall_results(results)]
+            RECALLS.inc(outcome="backend")
+            RECALLED_MEMORIES.inc(len(memories), source="semantic")
+            cache.put(self.bank_id, cache_key, memories, version)
+            return list(memories)
+        except CircuitOpenError:
+            RECALLS.inc(outcome="circuit_open")
+            return []
         except Exception as e:
             logger.warning(f"Failed to recall memory: {e}")
+            RECALLS.inc(outcome="error")
+            swallowed_error("memory", "recall")
             return []
     
     def recall_with_priority(
@@ -94,61 +350,236 @@ class EnhancedHindsightMemory:
         limit: int = 10
     ) -> List[str]:
         """Recall with intelligent prioritization"""
+        records = self.recall_records(
+            query,
+            prioritize_recent=prioritize_recent,
+            min_importance=min_importance,
+            limit=limit
+        )
+        return [record.text for record in records]
+    
+    def recall_records(
+        self,
+        query: str,
+        prioritize_recent: bool = True,
+        min_importance: str = "low",
+        tags: List[str] | None = None,
+        limit: int = 10,
+        consolidated: bool = True
+    ) -> List[MemoryRecord]:
+        """Recall memories with structured metadata.
+        
+        Importance and ``tags`` filters are applied by Hindsight before
+        results are returned; ``tags`` must all be present on a memory.
+        Results are cached until the bank is next written to. With
+        ``consolidated`` (and consolidation enabled) the query counts towards
+        its topic's heat and summaries replace the memories they cover.
+        """
         if not self.enabled:
             return []
         
+        consolidator = self._note_recall(query) if consolidated else None
+        cache = get_recall_cache()
+        cache_key = self._records_cache_key(query, prioritize_recent, min_importance, tags, limit, consolidated)
+        cached = cache.get(self.bank_id, cache_key)
+        if cached is not None:
+            RECALLS.inc(outcome="cache_hit")
+            return list(cached)
+        version = cache.bank_version(self.bank_id)
+        
         try:
             # Hindsight's recall already does semantic search
-            results = self.client.recall(
-                bank_id=self.bank_id,
-                query=query,
+            with stage("memory.recall", bank_id=self.bank_id):
+                results = self.client.recall(
+                    bank_id=self.bank_id,
+                    query=query,
+                    **self._recall_filter(min_importance, tags)
+                )
+            lexical = self._lexical_records(query, tags)
+            records = self._records_from_results(
+                results, lexical, prioritize_recent, min_importance, limit, consolidator
             )
-            
-            memories = [r.text for r in results]
-            
-            # Post-process to prioritize recent/important memories
-            if prioritize_recent:
-                memories = self._prioritize_by_recency(memories)
-            
-            # Filter by importance
-            memories = self._filter_by_importance(memories, min_importance)
-            
-            return memories[:limit]
+            RECALLS.inc(outcome="backend")
+            cache.put(self.bank_id, cache_key, records, version)
+            return list(records)
+        except CircuitOpenError:
+            RECALLS.inc(outcome="circuit_open")
+            return []
         except Exception as e:
             logger.warning(f"Failed to recall memory: {e}")
+            RECALLS.inc(outcome="error")
+            swallowed_error("memory", "recall")
             return []
     
-    def _prioritize_by_recency(self, memories: List[str]) -> List[str]:
+    async def arecall_with_priority(
+        self,
+        query: str,
+        prioritize_recent: bool = True,
+        min_importance: str = "normal",
+        limit: int = 10
+    ) -> List[str]:
+        """Async ``recall_with_priority`` for the ASGI serving path"""
+        records = await self.arecall_records(
+            query,
+            prioritize_recent=prioritize_recent,
+            min_importance=min_importance,
+            limit=limit
+        )
+        return [record.text for record in records]
+    
+    async def arecall_records(
+        self,
+        query: str,
+        prioritize_recent: bool = True,
+        min_importance: str = "low",
+        tags: List[str] | None = None,
+        limit: int = 10,
+        consolidated: bool = True
+    ) -> List[MemoryRecord]:
+        """Async ``recall_records``; shares the recall cache with the sync path"""
+        if not self.enabled:
+            return []
+        
+        consolidator = self._note_recall(query) if consolidated else None
+        cache = get_recall_cache()
+        cache_key = self._records_cache_key(query, prioritize_recent, min_importance, tags, limit, consolidated)
+        cached = cache.get(self.bank_id, cache_key)
+        if cached is not None:
+            RECALLS.inc(outcome="cache_hit")
+            return list(cached)
+        version = cache.bank_version(self.bank_id)
+        
+        try:
+            with stage("memory.recall", bank_id=self.bank_id):
+                results, lexical = await asyncio.gather(
+                    get_async_client(self.base_url).arecall(
+                        bank_id=self.bank_id,
+                        query=query,
+                        **self._recall_filter(min_importance, tags)
+                    ),
+                    asyncio.to_thread(self._lexical_records, query, tags),
+                )
+            records = self._records_from_results(
+                results, lexical, prioritize_recent, min_importance, limit, consolidator
+            )
+            RECALLS.inc(outcome="backend")
+            cache.put(self.bank_id, cache_key, records, version)
+            return list(records)
+        except CircuitOpenError:
+            RECALLS.inc(outcome="circuit_open")
+            return []
+        except Exception as e:
+            logger.warning(f"Failed to recall memory: {e}")
+            RECALLS.inc(outcome="error")
+            swallowed_error("memory", "recall")
+            return []
+    
+    def _records_cache_key(
+        self,
+        query: str,
+        prioritize_recent: bool,
+        min_importance: str,
+        tags: List[str] | None,
+        limit: int,
+        consolidated: bool
+    ) -> tuple:
+        return (
+            "records",
+            normalize_query(query),
+            prioritize_recent,
+            min_importance,
+            tuple(tags or ()),
+            limit,
+            consolidated,
+        )
+    
+    def _note_recall(self, query: str):
+        """Log the query for the consolidation scheduler; returns the consolidator, if enabled"""
+        consolidator = get_consolidator()
+        if consolidator is not None:
+            consolidator.note_recall(self.base_url, self.bank_id, query)
+        return consolidator
+    
+    def _recall_filter(self, min_importance: str, tags: List[str] | None) -> Dict[str, Any]:
+        """Recall ``tags``/``tags_match`` arguments for the requested filters"""
+        if tags:
+            return {"tags": tags, "tags_match": "all_strict"}
+        importance_tags, tags_match = importance_tag_filter(min_importance)
+        return {"tags": importance_tags, "tags_match": tags_match}
+    
+    def _lexical_records(self, query: str, tags: List[str] | None) -> List[MemoryRecord]:
+        """BM25 matches from the local lexical index (empty when it is disabled)"""
+        index = get_lexical_index()
+        if index is None:
+            return []
+        try:
+            with stage("memory.lexical_search", bank_id=self.bank_id):
+                hits = index.search(self.bank_id, query, tags=tags)
+            RECALLED_MEMORIES.inc(len(hits), source="lexical")
+            return [record_from_result(hit) for hit in hits]
+        except Exception as e:
+            logger.warning(f"Lexical recall failed: {e}")
+            swallowed_error("lexical_index", "search")
+            return []
+    
+    def _records_from_results(
+        self,
+        results: Any,
+        lexical: List[MemoryRecord],
+        prioritize_recent: bool,
+        min_importance: str,
+        limit: int,
+        consolidator: Any = None
+    ) -> List[MemoryRecord]:
+        records = [record_from_result(r) for r in recall_results(results)]
+        RECALLED_MEMORIES.inc(len(records), source="semantic")
+        
+        # Exact term matches (rule IDs, part numbers) that semantic search ranks low
+        if lexical:
+            records = hybrid_fuse(records, lexical)
+        
+        # Old versions of registered rules never reach the prompt
+        records = get_rule_registry().filter_superseded(self.bank_id, records)
+        
+        # One dense summary instead of the many raw memories it covers
+        if consolidator is not None:
+            records = consolidator.collapse(self.bank_id, records)
+        
+        # Re-check importance on structured fields (covers memories
+        # retained before importance tags existed)
+        records = self._filter_by_importance(records, min_importance)
+        
+        # Prioritize recent memories
+        if prioritize_recent:
+            records = self._prioritize_by_recency(records)
+        
+        return records[:limit]
+    
+    def _prioritize_by_recency(self, records: List[MemoryRecord]) -> List[MemoryRecord]:
         """Sort memories by date, most recent first"""
-        def extract_date(memory: str) -> datetime:
-            try:
-                if "[DATE:" in memory:
-                    date_str = memory.split("[DATE:")[1].split("]")[0].strip()
-                    return datetime.fromisoformat(date_str)
-            except:
-                pass
-            return datetime.min  # Put undated items at end
-        
-        return sorted(memories, key=extract_date, reverse=True)
-    
-    def _filter_by_importance(self, memories: List[str], min_level: str) -> List[str]:
+        return sorted(records, key=lambda r: r.date or datetime.min, reverse=True)
+    
+    def _filter_by_importance(self, records: List[MemoryRecord], min_level: str) -> List[MemoryRecord]:
         """Filter memories by importance level"""
-        importance_order = {"critical": 3, "high": 2, "normal": 1, "low": 0}
-        min_value = importance_order.get(min_level, 0)
-        
-        filtered = []
-        for memory in memories:
-            importance = "normal"
-            if "[IMPORTANCE:" in memory:
-                try:
-                    importance = memory.split("[IMPORTANCE:")[1].split("]")[0].strip()
-                except:
-                    pass
-            
-            if importance_order.get(importance, 1) >= min_value:
-                filtered.append(memory)
-        
-        return filtered
+        min_value = IMPORTANCE_ORDER.get(min_level, 0)
+        return [r for r in records if r.importance_level >= min_value]
+    
+    def tombstone(self, memory_ids: List[str]) -> int:
+        """Hide superseded memories from recall, where the backend supports it"""
+        if not self.enabled or not memory_ids or not hasattr(self.client, "tombstone"):
+            return 0
+        try:
+            hidden = self.client.tombstone(bank_id=self.bank_id, memory_ids=memory_ids)
+            index = get_lexical_index()
+            if index is not None:
+                index.remove(self.bank_id, memory_ids=memory_ids)
+            return hidden
+        except Exception as e:
+            logger.warning(f"Failed to tombstone memories: {e}")
+            swallowed_error("memory", "tombstone")
+            return 0
+        finally:
+            get_recall_cache().invalidate_bank(self.bank_id)
     
     def reflect(self, query: str) -> Optional[str]:
         """Use Hindsight's reflect feature to create higher-level insights"""
@@ -158,11 +589,12 @@ class EnhancedHindsightMemory:
         try:
             # Check if reflect method exists
             if hasattr(self.client, 'reflect'):
-                reflection = self.client.reflect(
-                    bank_id=self.bank_id,
-                    query=query
-                )
-                return reflection
+                with stage("memory.reflect", bank_id=self.bank_id):
+                    reflection = self.client.reflect(
+                        bank_id=self.bank_id,
+                        query=query
+                    )
+                return getattr(reflection, "text", reflection)
             else:
                 # Fallback: use recall and summarize
                 memories = self.recall_with_priority(query, limit=20)
@@ -170,6 +602,7 @@ class EnhancedHindsightMemory:
                     return "\n".join(memories[:5])
         except Exception as e:
             logger.warning(f"Reflection failed: {e}")
+            swallowed_error("memory", "reflect")
         
         return None
 
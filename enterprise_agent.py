@@ -1,6 +1,11 @@
 # enterprise_agent.py
+import asyncio
+import contextvars
 import os
-from typing import Dict, Any, Optional
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, AsyncIterator, Iterator, Optional
 from dotenv import load_dotenv
 
 from langchain_openai import ChatOpenAI
@@ -9,6 +14,11 @@ from langchain_core.messages import HumanMessage, SystemMessage
 from auth_and_profile import get_or_create_user
 from enterprise_memory import EnterpriseMemoryManager
 from enhanced_memory import EnhancedHindsightMemory
+from response_cache import get_response_cache
+from context_assembly import ContextAssembler
+from metrics import CONTEXT_MEMORIES, CONTEXT_TOKENS, PROMPT_TOKENS, record_stage, stage, swallowed_error
+from reranking import RERANK_CANDIDATES, get_reranker
+from tokenizer import count_tokens
 
 # Load environment variables
 load_dotenv()
@@ -16,6 +26,13 @@ load_dotenv()
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 HINDSIGHT_BASE_URL = os.environ.get("HINDSIGHT_BASE_URL", "http://localhost:8888")
 COMPANY_ID = os.environ.get("COMPANY_ID", "default-company")
+RECALL_TIMEOUT = float(os.environ.get("RECALL_TIMEOUT", "5.0"))
+RECALL_MAX_WORKERS = int(os.environ.get("RECALL_MAX_WORKERS", "16"))
+
+# Most memories per source that reach the prompt after reranking
+SOURCE_LIMITS = {"company": 5, "product": 5, "department": 5, "user": 3}
+
+logger = logging.getLogger(__name__)
 
 llm = ChatOpenAI(
     model="gpt-4o-mini",
@@ -26,10 +43,25 @@ llm = ChatOpenAI(
 class EnterpriseAgent:
     """Enterprise agent with multi-source memory"""
     
-    def __init__(self, company_id: str = COMPANY_ID, base_url: str = HINDSIGHT_BASE_URL):
+    def __init__(
+        self,
+        company_id: str = COMPANY_ID,
+        base_url: str = HINDSIGHT_BASE_URL,
+        recall_timeout: float = RECALL_TIMEOUT,
+        recall_max_workers: int = RECALL_MAX_WORKERS
+    ):
         self.company_id = company_id
         self.memory_manager = EnterpriseMemoryManager(base_url, company_id)
         self.llm = llm
+        self.response_cache = get_response_cache()
+        self.reranker = get_reranker()
+        self.context_assembler = ContextAssembler()
+        self.recall_timeout = recall_timeout
+        # Shared, bounded pool so concurrent chat turns cannot spawn unbounded threads
+        self._recall_pool = ThreadPoolExecutor(
+            max_workers=recall_max_workers,
+            thread_name_prefix="bank-recall"
+        )
     
     def run_agent_turn(
         self, 
@@ -39,52 +71,197 @@ class EnterpriseAgent:
         department: Optional[str] = None
     ) -> str:
         """Run agent turn with enterprise memory"""
+        with stage("enterprise.turn", user_id=user_id):
+            turn = self._prepare_turn(user_id, user_message, product_id, department)
+            answer_text = turn["cached_answer"]
+            if answer_text is None:
+                human_msg = HumanMessage(content=user_message)
+                with stage("enterprise.llm"):
+                    response = self.llm.invoke([turn["system_msg"], human_msg])
+                answer_text = response.content
+            self._finish_turn(turn, user_message, answer_text)
+        
+        return answer_text
+    
+    def stream_agent_turn(
+        self,
+        user_id: str,
+        user_message: str,
+        product_id: Optional[str] = None,
+        department: Optional[str] = None
+    ) -> Iterator[str]:
+        """Run agent turn, yielding the answer in chunks as the LLM produces them.
+        
+        The full answer is cached and retained once the stream completes.
+        """
+        started = time.perf_counter()
+        turn = self._prepare_turn(user_id, user_message, product_id, department)
+        if turn["cached_answer"] is not None:
+            yield turn["cached_answer"]
+            self._finish_turn(turn, user_message, turn["cached_answer"])
+            record_stage("enterprise.turn", started, user_id=user_id)
+            return
+        
+        parts = []
+        llm_started = time.perf_counter()
+        for chunk in self.llm.stream([turn["system_msg"], HumanMessage(content=user_message)]):
+            if chunk.content:
+                if not parts:
+                    record_stage("enterprise.llm_first_token", llm_started)
+                parts.append(chunk.content)
+                yield chunk.content
+        record_stage("enterprise.llm", llm_started)
+        self._finish_turn(turn, user_message, "".join(parts))
+        record_stage("enterprise.turn", started, user_id=user_id)
+    
+    async def arun_agent_turn(
+        self,
+        user_id: str,
+        user_message: str,
+        product_id: Optional[str] = None,
+        department: Optional[str] = None
+    ) -> str:
+        """Async ``run_agent_turn`` for the ASGI serving path"""
+        with stage("enterprise.turn", user_id=user_id):
+            turn = await self._aprepare_turn(user_id, user_message, product_id, department)
+            answer_text = turn["cached_answer"]
+            if answer_text is None:
+                human_msg = HumanMessage(content=user_message)
+                with stage("enterprise.llm"):
+                    response = await self.llm.ainvoke([turn["system_msg"], human_msg])
+                answer_text = response.content
+            await self._afinish_turn(turn, user_message, answer_text)
+        
+        return answer_text
+    
+    async def astream_agent_turn(
+        self,
+        user_id: str,
+        user_message: str,
+        product_id: Optional[str] = None,
+        department: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Async ``stream_agent_turn`` for the ASGI serving path"""
+        started = time.perf_counter()
+        turn = await self._aprepare_turn(user_id, user_message, product_id, department)
+        if turn["cached_answer"] is not None:
+            yield turn["cached_answer"]
+            await self._afinish_turn(turn, user_message, turn["cached_answer"])
+            record_stage("enterprise.turn", started, user_id=user_id)
+            return
+        
+        parts = []
+        llm_started = time.perf_counter()
+        async for chunk in self.llm.astream([turn["system_msg"], HumanMessage(content=user_message)]):
+            if chunk.content:
+                if not parts:
+                    record_stage("enterprise.llm_first_token", llm_started)
+                parts.append(chunk.content)
+                yield chunk.content
+        record_stage("enterprise.llm", llm_started)
+        await self._afinish_turn(turn, user_message, "".join(parts))
+        record_stage("enterprise.turn", started, user_id=user_id)
+    
+    def _prepare_turn(
+        self,
+        user_id: str,
+        user_message: str,
+        product_id: Optional[str],
+        department: Optional[str]
+    ) -> Dict[str, Any]:
+        """Recall from every relevant bank and build the system prompt"""
+        recall_plan = self._recall_plan(user_id, product_id, department)
+        
+        # Knowledge-base banks whose writes retire cached answers; user memory
+        # is covered by the per-user cache scope and the context hash
+        kb_bank_ids = [bank.bank_id for name, (bank, _) in recall_plan.items() if name != "user"]
+        kb_versions = self.response_cache.bank_versions(kb_bank_ids)
+        
+        # Fan out to all banks at once; a slow bank only loses its own results
+        with stage("enterprise.recall"):
+            recalled = self._recall_banks(user_message, recall_plan)
+        with stage("enterprise.rerank"):
+            recalled = self.reranker.rerank(user_message, recalled, SOURCE_LIMITS)
+        with stage("enterprise.prompt"):
+            turn = self._build_turn(user_id, recall_plan, recalled, kb_bank_ids, kb_versions)
+        
+        # Reuse a cached answer to a similar question over the same context
+        with stage("enterprise.cache_lookup"):
+            turn["cached_answer"] = self.response_cache.lookup(
+                user_message, turn["system_msg"].content, kb_bank_ids, turn["cache_scope"]
+            )
+        return turn
+    
+    async def _aprepare_turn(
+        self,
+        user_id: str,
+        user_message: str,
+        product_id: Optional[str],
+        department: Optional[str]
+    ) -> Dict[str, Any]:
+        """Async ``_prepare_turn``: bank recalls run concurrently on the event loop"""
+        recall_plan = self._recall_plan(user_id, product_id, department)
+        kb_bank_ids = [bank.bank_id for name, (bank, _) in recall_plan.items() if name != "user"]
+        kb_versions = self.response_cache.bank_versions(kb_bank_ids)
+        
+        with stage("enterprise.recall"):
+            recalled = await self._arecall_banks(user_message, recall_plan)
+        with stage("enterprise.rerank"):
+            recalled = self.reranker.rerank(user_message, recalled, SOURCE_LIMITS)
+        with stage("enterprise.prompt"):
+            turn = self._build_turn(user_id, recall_plan, recalled, kb_bank_ids, kb_versions)
+        with stage("enterprise.cache_lookup"):
+            turn["cached_answer"] = await self.response_cache.alookup(
+                user_message, turn["system_msg"].content, kb_bank_ids, turn["cache_scope"]
+            )
+        return turn
+    
+    def _recall_plan(
+        self,
+        user_id: str,
+        product_id: Optional[str],
+        department: Optional[str]
+    ) -> Dict[str, tuple]:
+        """Banks to recall from for this turn, with recall_records kwargs"""
         # Get all relevant memory banks
         company_kb = self.memory_manager.get_company_kb()
         user_memory = self.memory_manager.get_user_memory(user_id)
         
-        # Recall from company knowledge base (DFX rules, etc.)
-        company_context = company_kb.recall_with_priority(
-            query=user_message,
-            prioritize_recent=True,
-            min_importance="normal",
-            limit=5
-        )
-        
-        # Recall from user-specific memory
-        user_context = user_memory.recall_with_priority(
-            query=user_message,
-            prioritize_recent=True,
-            limit=3
-        )
+        # Recall plan per bank: (memory bank, recall_records kwargs). Banks
+        # return candidates in relevance order; the reranker picks the best
+        candidates = {"prioritize_recent": False, "min_importance": "normal", "limit": RERANK_CANDIDATES}
+        recall_plan = {
+            # Company knowledge base (DFX rules, etc.)
+            "company": (company_kb, candidates),
+            # User-specific memory
+            "user": (user_memory, candidates),
+        }
         
         # If product-specific, get product KB
-        product_context = []
         if product_id:
             product_kb = self.memory_manager.get_product_kb(product_id)
-            product_context = product_kb.recall_with_priority(
-                query=user_message,
-                prioritize_recent=True,
-                limit=5
-            )
+            recall_plan["product"] = (product_kb, candidates)
         
         # If department-specific, get department KB
-        dept_context = []
         if department:
             dept_kb = self.memory_manager.get_department_kb(department)
-            dept_context = dept_kb.recall_with_priority(
-                query=user_message,
-                prioritize_recent=True,
-                limit=5
-            )
+            recall_plan["department"] = (dept_kb, candidates)
         
-        # Build comprehensive context
-        memory_context = self._build_context(
-            company_context,
-            user_context,
-            product_context,
-            dept_context
-        )
+        return recall_plan
+    
+    def _build_turn(
+        self,
+        user_id: str,
+        recall_plan: Dict[str, tuple],
+        recalled: Dict[str, list],
+        kb_bank_ids: list,
+        kb_versions: Dict[str, int]
+    ) -> Dict[str, Any]:
+        """Compose the system prompt from recalled memories"""
+        # Fit memories into the token budget (headers stripped, overflow cut)
+        assembled = self.context_assembler.assemble(recalled)
+        memory_context = {name: "None." for name in ("company", "product", "department", "user")}
+        memory_context.update(assembled.sections)
         
         # Generate response with all context
         system_msg = SystemMessage(content=f"""You are an expert assistant for {self.company_id}.
@@ -108,29 +285,123 @@ IMPORTANT INSTRUCTIONS:
 - Be precise and reference specific rules when applicable
 - If information is outdated, mention that and use the latest version""")
         
-        human_msg = HumanMessage(content=user_message)
-        response = self.llm.invoke([system_msg, human_msg])
-        answer_text = response.content
-        
-        # Store interaction with metadata
-        user_memory.retain_with_metadata(
-            content=f"Q: {user_message}\nA: {answer_text}",
-            context="user_interaction",
-            importance="normal",
-            source="chat",
-            tags=["interaction", "user_query"]
+        prompt_tokens = count_tokens(system_msg.content)
+        PROMPT_TOKENS.observe(prompt_tokens)
+        for source, usage in assembled.usage.items():
+            CONTEXT_TOKENS.observe(usage.tokens, source=source)
+            for outcome in ("included", "truncated", "dropped"):
+                CONTEXT_MEMORIES.inc(getattr(usage, outcome), source=source, outcome=outcome)
+        logger.info(
+            f"Context for {user_id}: {assembled.tokens}/{assembled.budget} memory tokens, "
+            f"{prompt_tokens} system prompt tokens"
         )
         
-        return answer_text
-    
-    def _build_context(self, company: list, user: list, product: list, dept: list) -> Dict:
-        """Build structured context from multiple memory sources"""
         return {
-            "company": "\n".join(f"- {m}" for m in company) if company else "None.",
-            "user": "\n".join(f"- {m}" for m in user) if user else "None.",
-            "product": "\n".join(f"- {m}" for m in product) if product else "None.",
-            "department": "\n".join(f"- {m}" for m in dept) if dept else "None."
+            "user_memory": recall_plan["user"][0],
+            "system_msg": system_msg,
+            "kb_bank_ids": kb_bank_ids,
+            "kb_versions": kb_versions,
+            "cache_scope": user_id if recalled["user"] else None,
+            "cached_answer": None,
         }
+    
+    def _finish_turn(self, turn: Dict[str, Any], user_message: str, answer_text: str):
+        """Cache a fresh answer and store the interaction"""
+        with stage("enterprise.finish"):
+            if turn["cached_answer"] is None:
+                self.response_cache.store(
+                    user_message, turn["system_msg"].content, answer_text,
+                    turn["kb_bank_ids"], turn["cache_scope"], turn["kb_versions"]
+                )
+            
+            # Store interaction with metadata (write-behind, off the response path)
+            turn["user_memory"].retain_with_metadata(
+                content=f"Q: {user_message}\nA: {answer_text}",
+                context="user_interaction",
+                importance="normal",
+                source="chat",
+                tags=["interaction", "user_query"],
+                background=True
+            )
+    
+    async def _afinish_turn(self, turn: Dict[str, Any], user_message: str, answer_text: str):
+        """Async ``_finish_turn``"""
+        with stage("enterprise.finish"):
+            if turn["cached_answer"] is None:
+                await self.response_cache.astore(
+                    user_message, turn["system_msg"].content, answer_text,
+                    turn["kb_bank_ids"], turn["cache_scope"], turn["kb_versions"]
+                )
+            
+            await turn["user_memory"].aretain_with_metadata(
+                content=f"Q: {user_message}\nA: {answer_text}",
+                context="user_interaction",
+                importance="normal",
+                source="chat",
+                tags=["interaction", "user_query"],
+                background=True
+            )
+    
+    def _recall_banks(self, query: str, recall_plan: Dict[str, tuple]) -> Dict[str, list]:
+        """Recall from several banks concurrently with a shared timeout.
+        
+        Banks that fail or do not answer within ``recall_timeout`` seconds
+        contribute an empty list, so the turn proceeds with partial context.
+        A recall that has already started cannot be interrupted: it finishes
+        in the background, holding its pool thread and pooled Hindsight
+        client until the client's own request timeout at the latest.
+        """
+        # Each recall runs in a copy of this context so its spans nest under the turn
+        futures = {
+            self._recall_pool.submit(
+                contextvars.copy_context().run, bank.recall_records, query=query, **kwargs
+            ): name
+            for name, (bank, kwargs) in recall_plan.items()
+        }
+        results: Dict[str, list] = {name: [] for name in recall_plan}
+        
+        done, not_done = wait(futures, timeout=self.recall_timeout)
+        for future in done:
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.warning(f"Recall from {name} bank failed: {e}")
+                swallowed_error("enterprise_agent", "recall")
+        for future in not_done:
+            # Only stops recalls still waiting for a pool thread
+            future.cancel()
+            logger.warning(
+                f"Recall from {futures[future]} bank timed out after {self.recall_timeout}s"
+            )
+            swallowed_error("enterprise_agent", "recall_timeout")
+        
+        return results
+    
+    async def _arecall_banks(self, query: str, recall_plan: Dict[str, tuple]) -> Dict[str, list]:
+        """Async ``_recall_banks`` with the same timeout and partial-result behaviour"""
+        tasks = {
+            asyncio.ensure_future(bank.arecall_records(query=query, **kwargs)): name
+            for name, (bank, kwargs) in recall_plan.items()
+        }
+        results: Dict[str, list] = {name: [] for name in recall_plan}
+        
+        done, pending = await asyncio.wait(tasks, timeout=self.recall_timeout)
+        for task in done:
+            name = tasks[task]
+            try:
+                results[name] = task.result()
+            except Exception as e:
+                logger.warning(f"Recall from {name} bank failed: {e}")
+                swallowed_error("enterprise_agent", "recall")
+        for task in pending:
+            task.cancel()
+            logger.warning(
+                f"Recall from {tasks[task]} bank timed out after {self.recall_timeout}s"
+            )
+            swallowed_error("enterprise_agent", "recall_timeout")
+        
+        return results
 
 
 # Global enterprise agent instance
@@ -156,3 +427,14 @@ def run_enterprise_agent_turn(
     agent = get_enterprise_agent(company_id or COMPANY_ID)
     return agent.run_agent_turn(user_id, user_message, product_id, department)
 
+
+def stream_enterprise_agent_turn(
+    user_id: str,
+    user_message: str,
+    product_id: Optional[str] = None,
+    department: Optional[str] = None,
+    company_id: Optional[str] = None
+) -> Iterator[str]:
+    """Convenience function to stream an enterprise agent turn"""
+    agent = get_enterprise_agent(company_id or COMPANY_ID)
+    yield from agent.stream_agent_turn(user_id, user_message, product_id, department)
@@ -1,6 +1,7 @@
 # enterprise_memory.py
 from typing import Dict, Optional
 from enhanced_memory import EnhancedHindsightMemory
+from hindsight_pool import get_bank
 
 
 class EnterpriseMemoryManager:
@@ -10,35 +11,22 @@ class EnterpriseMemoryManager:
         self.base_url = base_url
         self.company_id = company_id
     
+    def _get_bank(self, bank_id: str) -> EnhancedHindsightMemory:
+        """Shared bank handle, reused across requests and threads"""
+        return get_bank(EnhancedHindsightMemory, self.base_url, bank_id)
+    
     def get_company_kb(self) -> EnhancedHindsightMemory:
         """Company-wide knowledge base (DFX rules, standards, etc.)"""
-        return EnhancedHindsightMemory(
-            base_url=self.base_url,
-            bank_id=f"company-{self.company_id}-kb",
-            enabled=True
-        )
+        return self._get_bank(f"company-{self.company_id}-kb")
     
     def get_product_kb(self, product_id: str) -> EnhancedHindsightMemory:
         """Product-specific knowledge base"""
-        return EnhancedHindsightMemory(
-            base_url=self.base_url,
-            bank_id=f"company-{self.company_id}-product-{product_id}",
-            enabled=True
-        )
+        return self._get_bank(f"company-{self.company_id}-product-{product_id}")
     
     def get_user_memory(self, user_id: str) -> EnhancedHindsightMemory:
         """User-specific memory"""
-        return EnhancedHindsightMemory(
-            base_url=self.base_url,
-            bank_id=f"company-{self.company_id}-user-{user_id}",
-            enabled=True
-        )
+        return self._get_bank(f"company-{self.company_id}-user-{user_id}")
     
     def get_department_kb(self, department: str) -> EnhancedHindsightMemory:
         """Department-specific knowledge base"""
-        return EnhancedHindsightMemory(
-            base_url=self.base_url,
-            bank_id=f"company-{self.company_id}-dept-{department}",
-            enabled=True
-        )
-
+        return self._get_bank(f"company-{self.company_id}-dept-{department}")
@@ -0,0 +1,252 @@
+import asyncio
+import atexit
+import os
+import queue
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Tuple
+import logging
+
+from circuit_breaker import CircuitBreaker, get_breaker
+
+try:
+    from hindsight_client import Hindsight
+except ImportError:
+    try:
+        from hindsight import Hindsight
+    except ImportError:
+        raise ImportError(
+            "Hindsight client not found. Please install: pip install hindsight-all"
+        )
+
+logger = logging.getLogger(__name__)
+
+HINDSIGHT_POOL_SIZE = int(os.environ.get("HINDSIGHT_POOL_SIZE", "8"))
+HINDSIGHT_POOL_TIMEOUT = float(os.environ.get("HINDSIGHT_POOL_TIMEOUT", "30.0"))
+# "hindsight" talks to the Hindsight server; "local" keeps banks in-process (local_store.py)
+MEMORY_BACKEND = os.environ.get("MEMORY_BACKEND", "hindsight")
+
+
+class _PooledConnection:
+    """A long-lived Hindsight client together with the event loop it runs on.
+
+    The sync Hindsight client drives an async HTTP session on the calling
+    thread's event loop, so the session is only reusable on the loop that
+    created it. Pinning a private loop to each client keeps its keep-alive
+    connections valid no matter which worker thread checks it out.
+    """
+
+    def __init__(self, base_url: str):
+        self.client = Hindsight(base_url=base_url)
+        self.loop = asyncio.new_event_loop()
+
+    def close(self):
+        try:
+            asyncio.set_event_loop(self.loop)
+            if hasattr(self.client, "close"):
+                self.client.close()
+        except Exception as e:
+            logger.warning(f"Failed to close Hindsight client: {e}")
+        finally:
+            asyncio.set_event_loop(None)
+            self.loop.close()
+
+
+class HindsightClientPool:
+    """Bounded pool of long-lived Hindsight clients for one server"""
+
+    def __init__(
+        self,
+        base_url: str,
+        max_size: int = HINDSIGHT_POOL_SIZE,
+        timeout: float = HINDSIGHT_POOL_TIMEOUT
+    ):
+        self.base_url = base_url
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator[Hindsight]:
+        """Check out a client for exclusive use by the current thread"""
+        conn = self._acquire()
+        previous_loop = _current_event_loop()
+        asyncio.set_event_loop(conn.loop)
+        try:
+            yield conn.client
+        finally:
+            asyncio.set_event_loop(previous_loop)
+            self._idle.put(conn)
+
+    def _acquire(self) -> _PooledConnection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.max_size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return _PooledConnection(self.base_url)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                f"No Hindsight connection to {self.base_url} available "
+                f"after {self.timeout}s (pool size {self.max_size})"
+            )
+
+    def close(self):
+        """Close all idle clients in the pool"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+class PooledHindsightClient:
+    """Drop-in stand-in for ``Hindsight`` that borrows a pooled client per call.
+
+    Calls go through the server's circuit breaker, so while it is open they
+    raise ``CircuitOpenError`` before a client is even checked out.
+    """
+
+    def __init__(self, pool: HindsightClientPool):
+        self._pool = pool
+        self._breaker = get_breaker(pool.base_url)
+
+    def __getattr__(self, name: str):
+        # Only expose methods the underlying client actually has, so
+        # ``hasattr(client, "reflect")`` keeps working as a feature check
+        if name.startswith("_") or not callable(getattr(Hindsight, name, None)):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            probe = self._breaker.before_call()
+            try:
+                with self._pool.connection() as client:
+                    # Only the server call counts; waiting for a pooled client says nothing about the server
+                    try:
+                        result = getattr(client, name)(*args, **kwargs)
+                    except Exception as e:
+                        self._breaker.record_failure(e)
+                        raise
+            except BaseException:
+                self._breaker.abandon(probe)
+                raise
+            self._breaker.record_success()
+            return result
+
+        return call
+
+
+class GuardedAsyncClient:
+    """Async ``Hindsight`` client whose coroutine methods go through the server's circuit breaker"""
+
+    def __init__(self, client: Hindsight, breaker: CircuitBreaker):
+        self._client = client
+        self._breaker = breaker
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._client, name)
+        if name == "aclose" or not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await self._breaker.acall(attr, *args, **kwargs)
+
+        return call
+
+
+def _current_event_loop():
+    try:
+        return asyncio.get_event_loop_policy().get_event_loop()
+    except RuntimeError:
+        return None
+
+
+_pools: Dict[str, HindsightClientPool] = {}
+_banks: Dict[Tuple[type, str, str], object] = {}
+_registry_lock = threading.RLock()
+
+
+def get_client(base_url: str) -> PooledHindsightClient:
+    """Shared, thread-safe client for a Hindsight server"""
+    if MEMORY_BACKEND == "local":
+        from local_store import get_local_store
+        return get_local_store()
+    with _registry_lock:
+        pool = _pools.get(base_url)
+        if pool is None:
+            pool = HindsightClientPool(base_url)
+            _pools[base_url] = pool
+    return PooledHindsightClient(pool)
+
+
+# Async clients per event loop: an aiohttp session only works on the loop
+# it was created on, but serves any number of concurrent requests there
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, GuardedAsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_async_client(base_url: str) -> GuardedAsyncClient:
+    """Hindsight client for the ``a*`` methods on the running event loop"""
+    if MEMORY_BACKEND == "local":
+        from local_store import get_local_store
+        return get_local_store()
+    loop = asyncio.get_running_loop()
+    with _registry_lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(base_url)
+        if client is None:
+            client = GuardedAsyncClient(Hindsight(base_url=base_url), get_breaker(base_url))
+            clients[base_url] = client
+    return client
+
+
+async def aclose_async_clients():
+    """Close the async clients of the running event loop (ASGI shutdown)"""
+    with _registry_lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Failed to close Hindsight client: {e}")
+
+
+def get_bank(memory_cls: type, base_url: str, bank_id: str):
+    """Cached memory bank handle of ``memory_cls`` keyed by server and bank_id"""
+    key = (memory_cls, base_url, bank_id)
+    with _registry_lock:
+        bank = _banks.get(key)
+        if bank is None:
+            bank = memory_cls(base_url=base_url, bank_id=bank_id)
+            _banks[key] = bank
+    return bank
+
+
+@atexit.register
+def close_all():
+    """Close every pooled client"""
+    with _registry_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,315 @@
+# job_queue.py
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", "./jobs.db")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# A running job is handed to another worker once its owner has not
+# heartbeated for this long
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "60"))
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised by a job handler once it has noticed a cancellation request"""
+
+
+class JobStore:
+    """SQLite journal of jobs, so queued and running work survives restarts"""
+
+    def __init__(self, db_path: str = JOBS_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    progress_done INTEGER NOT NULL DEFAULT 0,
+                    progress_total INTEGER NOT NULL DEFAULT 0,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    owner TEXT,
+                    heartbeat_at REAL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, kind in (("owner", "TEXT"), ("heartbeat_at", "REAL")):
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def create(self, kind: str, params: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(params), now, now)
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = datetime.now().isoformat()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?",
+                (*fields.values(), job_id)
+            )
+
+    def transition(self, job_id: str, from_status: str, held_by: Optional[str] = None, **fields) -> bool:
+        """Update a job only if it is still in ``from_status`` (and owned by
+        ``held_by``, when given); False if another process got there first"""
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = datetime.now().isoformat()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        condition = "id = ? AND status = ?"
+        args = [job_id, from_status]
+        if held_by is not None:
+            condition += " AND owner = ?"
+            args.append(held_by)
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE {condition}",
+                (*fields.values(), *args)
+            )
+        return cursor.rowcount == 1
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        """Atomically move a queued job to running under ``owner``"""
+        return self.transition(job_id, QUEUED, status=RUNNING, owner=owner, heartbeat_at=time.time())
+
+    def heartbeat(self, owner: str):
+        """Renew the lease on every job ``owner`` is running"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = ?",
+                (time.time(), owner, RUNNING)
+            )
+
+    def requeue_stale(self, lease_seconds: float) -> List[str]:
+        """Put running jobs whose owner stopped heartbeating back in the queue; returns their ids"""
+        expired = time.time() - lease_seconds
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (RUNNING, expired)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = ?, owner = NULL, updated_at = ? WHERE id = ?",
+                [(QUEUED, datetime.now().isoformat(), job_id) for (job_id,) in rows]
+            )
+        return [job_id for (job_id,) in rows]
+
+    def queued(self) -> List[str]:
+        """Ids of queued jobs, oldest first"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)
+            ).fetchall()
+        return [job_id for (job_id,) in rows]
+
+    def cancel_requested(self, job_id: str) -> bool:
+        """Whether cancellation was requested (True for unknown jobs), without reading the payload"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is None or bool(row[0])
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def _to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "params": json.loads(row["params"]),
+            "progress": {"done": row["progress_done"], "total": row["progress_total"]},
+            "cancel_requested": bool(row["cancel_requested"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+
+class JobContext:
+    """Handle given to a running job for progress reporting and cancellation"""
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    def report_progress(self, done: int, total: int):
+        self.store.update(self.job_id, progress_done=done, progress_total=total)
+
+    def is_cancelled(self) -> bool:
+        return self.store.cancel_requested(self.job_id)
+
+
+class JobQueue(ABC):
+    """Interface for background job execution.
+
+    Handlers are registered by job kind and called as ``handler(params, ctx)``
+    with JSON-serializable params. Implementations decide where they run:
+    ``LocalJobQueue`` uses an in-process worker pool; a queue backed by a
+    separate worker process only needs to provide the same methods.
+    """
+
+    @abstractmethod
+    def register(self, kind: str, handler: Callable[[Dict[str, Any], JobContext], Any]):
+        ...
+
+    @abstractmethod
+    def submit(self, kind: str, params: Dict[str, Any]) -> str:
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+
+class LocalJobQueue(JobQueue):
+    """In-process job queue backed by a thread pool and a SQLite journal.
+
+    Several processes (uvicorn workers) may share one journal: a job runs
+    where it is first claimed with a conditional update, and the claiming
+    process renews a heartbeat while it runs. Running jobs are only taken
+    over once their heartbeat is older than ``lease_seconds``, so a job
+    still running in a live sibling is never started twice.
+    """
+
+    def __init__(
+        self,
+        store: Optional[JobStore] = None,
+        max_workers: int = JOB_WORKERS,
+        lease_seconds: float = JOB_LEASE_SECONDS
+    ):
+        self.store = store or JobStore()
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, Callable] = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._stopping = threading.Event()
+        self._monitor = threading.Thread(target=self._maintain, name="job-heartbeat", daemon=True)
+        self._monitor.start()
+
+    def register(self, kind: str, handler: Callable[[Dict[str, Any], JobContext], Any]):
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> str:
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind: {kind}")
+        job_id = self.store.create(kind, params)
+        self._pool.submit(self._run, job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        if job["status"] in (QUEUED, RUNNING):
+            if not self.store.transition(job_id, QUEUED, status=CANCELLED, cancel_requested=1):
+                # Already claimed; the handler stops at its next cancellation check
+                self.store.update(job_id, cancel_requested=1)
+        return self.store.get(job_id)
+
+    def resume_unfinished(self) -> int:
+        """Pick up queued jobs and running jobs whose process stopped heartbeating.
+
+        Safe to call from every worker: each job is still run only by the
+        process that claims it.
+        """
+        stale = self.store.requeue_stale(self.lease_seconds)
+        job_ids = self.store.queued()
+        for job_id in job_ids:
+            self._pool.submit(self._run, job_id)
+        if job_ids:
+            logger.info(f"Resumed {len(job_ids)} unfinished jobs ({len(stale)} from stopped workers)")
+        return len(job_ids)
+
+    def close(self):
+        self._stopping.set()
+
+    def _maintain(self):
+        """Renew leases on this process's jobs and take over jobs of processes that died"""
+        interval = max(1.0, self.lease_seconds / 3)
+        checks = 0
+        while not self._stopping.wait(interval):
+            try:
+                self.store.heartbeat(self.owner)
+                checks += 1
+                if checks % 3 == 0:
+                    for job_id in self.store.requeue_stale(self.lease_seconds):
+                        logger.info(f"Taking over job {job_id} from a stopped worker")
+                        self._pool.submit(self._run, job_id)
+            except Exception as e:
+                logger.warning(f"Job heartbeat failed: {e}")
+
+    def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None or job["status"] != QUEUED:
+            return
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            self.store.transition(job_id, QUEUED, status=FAILED, error=f"Unknown job kind: {job['kind']}")
+            return
+
+        ctx = JobContext(self.store, job_id)
+        if ctx.is_cancelled():
+            self.store.transition(job_id, QUEUED, status=CANCELLED)
+            return
+
+        if not self.store.claim(job_id, self.owner):
+            return  # Claimed by another worker
+        # Final states only land while this process still holds the job, so
+        # a worker whose lease lapsed cannot overwrite the one that took over
+        try:
+            result = handler(job["params"], ctx)
+            self.store.transition(job_id, RUNNING, held_by=self.owner, status=SUCCEEDED, result=result)
+        except JobCancelled:
+            self.store.transition(job_id, RUNNING, held_by=self.owner, status=CANCELLED)
+        except Exception as e:
+            logger.error(f"Job {job_id} ({job['kind']}) failed: {e}")
+            self.store.transition(job_id, RUNNING, held_by=self.owner, status=FAILED, error=str(e))
@@ -0,0 +1,272 @@
+# lexical_index.py
+import json
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from chunk_index import chunk_hash
+from memory_metadata import MemoryRecord, strip_metadata_header
+
+LEXICAL_INDEX_ENABLED = os.environ.get("LEXICAL_INDEX_ENABLED", "true").lower() == "true"
+LEXICAL_INDEX_PATH = os.environ.get("LEXICAL_INDEX_PATH", "./lexical_index.db")
+LEXICAL_CANDIDATES = int(os.environ.get("LEXICAL_CANDIDATES", "10"))  # BM25 hits fused per recall
+HYBRID_RRF_K = int(os.environ.get("HYBRID_RRF_K", "60"))
+# Backends that report no memory ids never tombstone entries, so the index
+# is bounded instead: oldest entries beyond the cap, or past the TTL, go first
+LEXICAL_INDEX_MAX_ENTRIES = int(os.environ.get("LEXICAL_INDEX_MAX_ENTRIES", "50000"))  # Per bank
+LEXICAL_INDEX_TTL_DAYS = float(os.environ.get("LEXICAL_INDEX_TTL_DAYS", "0"))  # 0 keeps entries until the cap
+
+# Identifiers such as "DFX-12" or "PN_4471" stay single terms
+_TERM_RE = re.compile(r"\w[\w\-]*")
+_MAX_QUERY_TERMS = 32
+# BM25 weights of the bank, content, tags and source columns
+_COLUMN_WEIGHTS = (0.0, 1.0, 2.0, 1.5)
+# New entries per bank between pruning passes
+_PRUNE_EVERY = 500
+
+
+@dataclass
+class LexicalHit:
+    """A stored memory matching a lexical query (same fields as a recall result)"""
+    id: Optional[str]
+    text: str
+    metadata: Dict[str, str] = field(default_factory=dict)
+    tags: List[str] = field(default_factory=list)
+    mentioned_at: Optional[str] = None
+    score: float = 0.0
+
+
+class LexicalIndex:
+    """BM25 full-text index of retained memories, kept locally in SQLite FTS5.
+
+    Semantic recall is weak at exact identifiers: a rule ID or part number
+    is one token among many in an embedding. This index stores each
+    retained memory's text, tags and source file so such lookups become
+    exact term matches, ranked by SQLite's built-in ``bm25()``. Entries are
+    keyed by content hash per bank; ``memory_id`` is filled in when the
+    backend reports ids (the local store does), so tombstoned memories can
+    be removed. Each bank keeps at most ``max_entries`` entries (and none
+    older than ``ttl_days``, when set); the oldest are pruned as new ones
+    arrive.
+    """
+
+    def __init__(
+        self,
+        db_path: str = LEXICAL_INDEX_PATH,
+        max_entries: int = LEXICAL_INDEX_MAX_ENTRIES,
+        ttl_days: float = LEXICAL_INDEX_TTL_DAYS
+    ):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_days = ttl_days
+        self._added: Dict[str, int] = {}  # New entries per bank since its last prune
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS memories (
+                    rowid INTEGER PRIMARY KEY,
+                    bank_id TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    memory_id TEXT,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    tags TEXT NOT NULL,
+                    retained_at TEXT NOT NULL,
+                    UNIQUE (bank_id, content_hash)
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS memories_by_id ON memories (bank_id, memory_id)"
+            )
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS memory_terms USING fts5(
+                    bank, content, tags, source,
+                    tokenize = "unicode61 tokenchars '-_'"
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def add(self, bank_id: str, items: Iterable[Dict[str, Any]], memory_ids: Optional[List[str]] = None):
+        """Index retain keyword-argument dicts (content, metadata, tags) for ``bank_id``"""
+        now = datetime.now().isoformat()
+        items = list(items)
+        ids = list(memory_ids) if memory_ids and len(memory_ids) == len(items) else [None] * len(items)
+        with self._lock, self._connect() as conn:
+            for item, memory_id in zip(items, ids):
+                metadata = item.get("metadata") or {}
+                tags = list(item.get("tags") or [])
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO memories "
+                    "(bank_id, content_hash, memory_id, text, metadata, tags, retained_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (bank_id, chunk_hash(item["content"]), memory_id, item["content"],
+                     json.dumps(metadata), json.dumps(tags), now)
+                )
+                if cursor.rowcount:
+                    source = metadata.get("source") or ""
+                    conn.execute(
+                        "INSERT INTO memory_terms (rowid, bank, content, tags, source) VALUES (?, ?, ?, ?, ?)",
+                        (cursor.lastrowid, bank_id, strip_metadata_header(item["content"]), " ".join(tags),
+                         f"{source} {os.path.basename(source)}")
+                    )
+                    self._added[bank_id] = self._added.get(bank_id, 0) + 1
+                elif memory_id is not None:
+                    conn.execute(
+                        "UPDATE memories SET memory_id = ? WHERE bank_id = ? AND content_hash = ?",
+                        (memory_id, bank_id, chunk_hash(item["content"]))
+                    )
+            if self._added.get(bank_id, 0) >= _PRUNE_EVERY:
+                self._added[bank_id] = 0
+                self._prune(conn, bank_id)
+
+    def prune(self, bank_id: str):
+        """Drop ``bank_id``'s entries beyond the size cap or past the TTL"""
+        with self._lock, self._connect() as conn:
+            self._prune(conn, bank_id)
+
+    def _prune(self, conn: sqlite3.Connection, bank_id: str):
+        rowids = conn.execute(
+            "SELECT rowid FROM memories WHERE bank_id = ? AND rowid <= ("
+            "SELECT rowid FROM memories WHERE bank_id = ? ORDER BY rowid DESC LIMIT 1 OFFSET ?)",
+            (bank_id, bank_id, self.max_entries)
+        ).fetchall()
+        if self.ttl_days > 0:
+            cutoff = (datetime.now() - timedelta(days=self.ttl_days)).isoformat()
+            rowids += conn.execute(
+                "SELECT rowid FROM memories WHERE bank_id = ? AND retained_at < ?", (bank_id, cutoff)
+            ).fetchall()
+        conn.executemany("DELETE FROM memories WHERE rowid = ?", rowids)
+        conn.executemany("DELETE FROM memory_terms WHERE rowid = ?", rowids)
+
+    def set_memory_ids(self, bank_id: str, memory_ids: Dict[str, str]):
+        """Attach backend ids, keyed by ``chunk_hash`` of the content, to indexed entries"""
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "UPDATE memories SET memory_id = ? WHERE bank_id = ? AND content_hash = ?",
+                [(memory_id, bank_id, digest) for digest, memory_id in memory_ids.items()]
+            )
+
+    def remove(
+        self,
+        bank_id: str,
+        memory_ids: Optional[List[str]] = None,
+        content_hashes: Optional[List[str]] = None
+    ):
+        """Drop entries by backend memory id or by ``chunk_hash`` of their content"""
+        with self._lock, self._connect() as conn:
+            rowids = []
+            for memory_id in memory_ids or []:
+                rowids += conn.execute(
+                    "SELECT rowid FROM memories WHERE bank_id = ? AND memory_id = ?", (bank_id, memory_id)
+                ).fetchall()
+            for digest in content_hashes or []:
+                rowids += conn.execute(
+                    "SELECT rowid FROM memories WHERE bank_id = ? AND content_hash = ?",
+                    (bank_id, digest)
+                ).fetchall()
+            conn.executemany("DELETE FROM memories WHERE rowid = ?", rowids)
+            conn.executemany("DELETE FROM memory_terms WHERE rowid = ?", rowids)
+
+    def search(
+        self,
+        bank_id: str,
+        query: str,
+        limit: int = LEXICAL_CANDIDATES,
+        tags: Optional[List[str]] = None
+    ) -> List[LexicalHit]:
+        """Best BM25 matches for any term of ``query``; ``tags`` must all be present"""
+        match = _match_expression(query)
+        if not match:
+            return []
+        # Narrow to the bank inside the full-text query rather than after it
+        match = f"bank : {_quote(bank_id)} AND ({match})"
+        if tags:
+            match += "".join(f" AND tags : {_quote(tag)}" for tag in tags)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT m.memory_id, m.text, m.metadata, m.tags, m.retained_at,
+                       bm25(memory_terms, {", ".join(map(str, _COLUMN_WEIGHTS))}) AS rank
+                FROM memory_terms JOIN memories m ON m.rowid = memory_terms.rowid
+                WHERE memory_terms MATCH ? AND m.bank_id = ?
+                ORDER BY rank
+                LIMIT ?
+                """,
+                (match, bank_id, limit)
+            ).fetchall()
+        hits = [
+            LexicalHit(
+                id=memory_id,
+                text=text,
+                metadata=json.loads(metadata),
+                tags=json.loads(tag_list),
+                mentioned_at=retained_at,
+                score=-rank,  # bm25() is lower-is-better
+            )
+            for memory_id, text, metadata, tag_list, retained_at, rank in rows
+        ]
+        # The FTS tags column is tokenized; confirm whole-tag matches
+        return [hit for hit in hits if not tags or set(tags) <= set(hit.tags)]
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _match_expression(query: str) -> str:
+    """FTS5 query matching any term of free text (operators in it are not interpreted)"""
+    terms = list(dict.fromkeys(_TERM_RE.findall(query)))[:_MAX_QUERY_TERMS]
+    return " OR ".join(_quote(term) for term in terms)
+
+
+def hybrid_fuse(
+    semantic: List[MemoryRecord],
+    lexical: List[MemoryRecord],
+    rrf_k: int = HYBRID_RRF_K
+) -> List[MemoryRecord]:
+    """Merge semantic and BM25 rankings by reciprocal rank fusion.
+
+    The same memory found by both keeps the semantic record, taking the
+    lexical side's id if it has none. Records match on their text without
+    the metadata header, or, since Hindsight recalls facts extracted from
+    the retained text rather than the text itself, a lexical hit matches
+    the best-ranked semantic record with the same ``content_hash``.
+    """
+    fused: Dict[str, List[Any]] = {}
+    by_hash: Dict[str, str] = {}  # content_hash -> key of its best semantic record
+    for ranking in (semantic, lexical):
+        for rank, record in enumerate(ranking):
+            key = " ".join(strip_metadata_header(record.text).split())
+            if ranking is lexical and record.content_hash in by_hash:
+                key = by_hash[record.content_hash]
+            elif ranking is semantic and record.content_hash:
+                by_hash.setdefault(record.content_hash, key)
+            entry = fused.get(key)
+            if entry is None:
+                fused[key] = [record, 0.0]
+                entry = fused[key]
+            elif entry[0].id is None and record.id is not None:
+                entry[0] = replace(entry[0], id=record.id)
+            entry[1] += 1.0 / (rrf_k + rank + 1)
+    return [record for record, _ in sorted(fused.values(), key=lambda entry: entry[1], reverse=True)]
+
+
+_lexical_index: Optional[LexicalIndex] = None
+_lexical_index_lock = threading.Lock()
+
+
+def get_lexical_index() -> Optional[LexicalIndex]:
+    """Process-wide lexical index, or None when ``LEXICAL_INDEX_ENABLED`` is false"""
+    global _lexical_index
+    if not LEXICAL_INDEX_ENABLED:
+        return None
+    with _lexical_index_lock:
+        if _lexical_index is None:
+            _lexical_index = LexicalIndex()
+    return _lexical_index
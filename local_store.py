@@ -0,0 +1,805 @@
+# local_store.py
+import asyncio
+import hashlib
+import heapq
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+import logging
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: banks are not locked, run a single worker
+    fcntl = None
+
+from embeddings import get_embedder
+from memory_metadata import strip_metadata_header
+from tokenizer import count_tokens
+
+logger = logging.getLogger(__name__)
+
+LOCAL_STORE_PATH = os.environ.get("LOCAL_STORE_PATH", "./local_memory")
+# Rows per segment file set; the active segment is scanned on startup
+LOCAL_SEGMENT_ROWS = int(os.environ.get("LOCAL_SEGMENT_ROWS", "16384"))
+# Sealed segments at least this large get an IVF index; smaller ones are searched exactly
+LOCAL_ANN_MIN_SIZE = int(os.environ.get("LOCAL_ANN_MIN_SIZE", "2000"))
+LOCAL_ANN_NPROBE = int(os.environ.get("LOCAL_ANN_NPROBE", "8"))
+LOCAL_RECALL_MAX_RESULTS = int(os.environ.get("LOCAL_RECALL_MAX_RESULTS", "50"))
+LOCAL_COMPACT_INTERVAL = float(os.environ.get("LOCAL_COMPACT_INTERVAL", "60"))  # Seconds; 0 disables
+# Share of tombstoned rows that makes a lone segment worth rewriting
+LOCAL_COMPACT_TOMBSTONE_RATIO = float(os.environ.get("LOCAL_COMPACT_TOMBSTONE_RATIO", "0.2"))
+# Banks kept open at once; each holds a few file handles and maps per segment
+LOCAL_MAX_OPEN_BANKS = int(os.environ.get("LOCAL_MAX_OPEN_BANKS", "64"))
+
+# Bank ids used verbatim as directory names; anything else is hashed
+_SAFE_BANK_ID_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,127}")
+
+
+@dataclass
+class LocalRecallResult:
+    """Same fields the code reads from a Hindsight recall result"""
+    id: str
+    text: str
+    metadata: Dict[str, str] = field(default_factory=dict)
+    tags: List[str] = field(default_factory=list)
+    mentioned_at: Optional[str] = None
+    document_id: Optional[str] = None
+    context: Optional[str] = None
+
+
+@dataclass
+class LocalRecallResponse:
+    results: List[LocalRecallResult]
+
+
+@dataclass
+class LocalRetainResponse:
+    success: bool
+    memory_ids: List[str]
+
+
+@dataclass
+class LocalReflectResponse:
+    text: str
+
+
+class IVFIndex:
+    """Inverted-file approximate nearest-neighbour index over unit vectors.
+
+    Vectors are clustered with a few rounds of spherical k-means into about
+    sqrt(n) lists; a query only scores the vectors in its ``nprobe`` closest
+    lists. The lists are stored flat (``rows`` grouped by list, ``offsets``
+    marking the boundaries) so a saved index loads without parsing.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, rows: np.ndarray):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, iterations: int = 8) -> "IVFIndex":
+        n = len(vectors)
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(0)
+        sample = np.asarray(vectors[np.sort(rng.choice(n, size=min(n, nlist * 64), replace=False))])
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    mean = members.mean(axis=0)
+                    centroids[c] = mean / (np.linalg.norm(mean) or 1.0)
+
+        assignment = np.concatenate([
+            np.argmax(np.asarray(vectors[start:start + 65536]) @ centroids.T, axis=1)
+            for start in range(0, n, 65536)
+        ])
+        rows = np.argsort(assignment, kind="stable").astype(np.int32)
+        offsets = np.searchsorted(assignment[rows], np.arange(nlist + 1)).astype(np.int64)
+        return cls(centroids, offsets, rows)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(data["centroids"], data["offsets"], data["rows"])
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=self.centroids, offsets=self.offsets, rows=self.rows)
+        os.replace(tmp_path, path)
+
+    def candidates(self, query: np.ndarray, nprobe: int = LOCAL_ANN_NPROBE) -> np.ndarray:
+        nprobe = min(nprobe, len(self.centroids))
+        probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.rows[self.offsets[c]:self.offsets[c + 1]] for c in probed])
+
+
+_COLUMNS = np.dtype([("seq", "<i8"), ("offset", "<u8"), ("length", "<u4")])
+
+
+class Segment:
+    """A fixed-capacity slice of a bank, stored as memory-mapped files.
+
+    ``<name>.vec``   float32 embedding rows
+    ``<name>.cols``  one ``(seq, offset, length)`` column entry per row
+    ``<name>.data``  JSON payloads the column entries point into
+    ``<name>.tomb``  tombstone bitmap, one bit per row
+    ``<name>.tags``  tag postings, written when the segment is sealed
+    ``<name>.ivf``   ANN index, built for sealed segments by compaction
+
+    Files are preallocated to ``capacity`` rows, so appending never remaps;
+    a row exists once its column entry has a non-zero length, which is
+    written last. Only the active (last, unsealed) segment is appended to;
+    sealed segments change only through their tombstones.
+    """
+
+    def __init__(self, directory: str, name: str, dim: int, capacity: int, sealed: bool, rows: Optional[int] = None):
+        self.name = name
+        self.dim = dim
+        self.capacity = capacity
+        self.sealed = sealed
+        self._base = os.path.join(directory, name)
+        mode = "r" if sealed else "r+"
+        self.vectors = np.memmap(f"{self._base}.vec", dtype=np.float32, mode=mode, shape=(capacity, dim))
+        self.columns = np.memmap(f"{self._base}.cols", dtype=_COLUMNS, mode=mode, shape=(capacity,))
+        self.tombstones = np.memmap(f"{self._base}.tomb", dtype=np.uint8, mode="r+", shape=((capacity + 7) // 8,))
+        self._data = open(f"{self._base}.data", "rb" if sealed else "r+b")
+
+        if rows is None:
+            # Rows fill in order, so the first empty column entry ends the segment
+            rows = int(np.searchsorted(-(self.columns["length"] > 0).astype(np.int8), 0))
+        self.rows = rows
+        self._data_end = int(self.columns["offset"][rows - 1] + self.columns["length"][rows - 1]) if rows else 0
+        if not sealed:
+            self._data.truncate(self._data_end)  # Drop a payload torn by a crash
+
+        self._tags: Optional[Dict[str, List[int]]] = None
+        self._untagged: Optional[List[int]] = None
+        if not sealed:
+            self._load_tags_from_payloads()
+        self._ivf: Optional[IVFIndex] = None
+
+    @classmethod
+    def create(cls, directory: str, name: str, dim: int, capacity: int) -> "Segment":
+        base = os.path.join(directory, name)
+        for suffix, size in (
+            (".vec", capacity * dim * 4),
+            (".cols", capacity * _COLUMNS.itemsize),
+            (".tomb", (capacity + 7) // 8),
+            (".data", 0),
+        ):
+            with open(base + suffix, "wb") as f:
+                f.truncate(size)  # Sparse until written
+        return cls(directory, name, dim, capacity, sealed=False)
+
+    @property
+    def full(self) -> bool:
+        return self.rows >= self.capacity
+
+    @property
+    def ivf(self) -> Optional[IVFIndex]:
+        """The segment's ANN index, read on first use"""
+        if self._ivf is None and self.sealed and os.path.exists(f"{self._base}.ivf"):
+            self._ivf = IVFIndex.load(f"{self._base}.ivf")
+        return self._ivf
+
+    @property
+    def first_seq(self) -> int:
+        return int(self.columns["seq"][0])
+
+    @property
+    def last_seq(self) -> int:
+        return int(self.columns["seq"][self.rows - 1])
+
+    def append(self, seqs: List[int], records: List[Dict[str, Any]], vectors: np.ndarray):
+        """Write rows at the end; the caller keeps within ``capacity``"""
+        start = self.rows
+        end = start + len(records)
+        payloads = [json.dumps(record).encode("utf-8") for record in records]
+        self._data.seek(self._data_end)
+        self._data.write(b"".join(payloads))
+        self._data.flush()
+        self.vectors[start:end] = vectors
+        self.vectors.flush()
+
+        entries = np.zeros(len(records), dtype=_COLUMNS)
+        entries["seq"] = seqs
+        entries["length"] = [len(p) for p in payloads]
+        entries["offset"] = self._data_end + np.concatenate([[0], np.cumsum(entries["length"][:-1])])
+        self.columns[start:end] = entries
+        self.columns.flush()
+
+        self._data_end += sum(len(p) for p in payloads)
+        self.rows = end
+        for row, record in enumerate(records, start):
+            self._index_tags(row, record["tags"])
+
+    def record(self, row: int) -> Dict[str, Any]:
+        entry = self.columns[row]
+        return json.loads(os.pread(self._data.fileno(), int(entry["length"]), int(entry["offset"])))
+
+    def seqs(self) -> np.ndarray:
+        return self.columns["seq"][:self.rows]
+
+    def row_of(self, seq: int) -> Optional[int]:
+        seqs = self.seqs()
+        row = int(np.searchsorted(seqs, seq))
+        return row if row < self.rows and seqs[row] == seq else None
+
+    def dead(self) -> np.ndarray:
+        return np.unpackbits(self.tombstones, count=self.rows, bitorder="little").astype(bool)
+
+    def dead_count(self) -> int:
+        return int(np.count_nonzero(self.dead()))
+
+    def tombstone(self, rows: List[int]):
+        for row in rows:
+            self.tombstones[row >> 3] |= np.uint8(1 << (row & 7))
+        self.tombstones.flush()
+
+    def seal(self):
+        """Stop appending; persist tag postings so reopening skips the payloads"""
+        with open(f"{self._base}.tags", "w", encoding="utf-8") as f:
+            json.dump({"tags": self._tags, "untagged": self._untagged}, f)
+        self.sealed = True
+
+    def build_index(self):
+        self._ivf = IVFIndex.build(self.vectors[:self.rows])
+        self._ivf.save(f"{self._base}.ivf")
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        tags: Optional[List[str]],
+        tags_match: str,
+        nprobe: int
+    ) -> List[tuple]:
+        """``(similarity, row)`` of the ``k`` best live rows passing the tag filter"""
+        if self.rows == 0:
+            return []
+        live = ~self.dead()
+        allowed = self._tag_mask(tags, tags_match)
+        if allowed is not None:
+            live &= allowed
+        rows = None
+        if self.ivf is not None:
+            rows = self.ivf.candidates(query, nprobe)
+            rows = rows[live[rows]]
+            if len(rows) < k:
+                rows = None  # Too few near the query after filtering; search exactly
+        if rows is None:
+            rows = np.flatnonzero(live)
+        if len(rows) == 0:
+            return []
+        rows = np.sort(rows)  # Sequential page access through the memmap
+        scores = self.vectors[rows] @ query
+        top = np.argpartition(-scores, min(k, len(rows)) - 1)[:k]
+        return [(float(scores[i]), int(rows[i])) for i in top]
+
+    def close(self):
+        # Mappings are released with the last reference; files may already be unlinked
+        self.tombstones.flush()
+        self._data.close()
+
+    def delete_files(self):
+        for suffix in (".vec", ".cols", ".tomb", ".data", ".tags", ".ivf"):
+            try:
+                os.remove(self._base + suffix)
+            except FileNotFoundError:
+                pass
+
+    def _load_tags_from_payloads(self):
+        self._tags, self._untagged = {}, []
+        for row in range(self.rows):
+            self._index_tags(row, self.record(row)["tags"])
+
+    def _index_tags(self, row: int, tags: List[str]):
+        if not tags:
+            self._untagged.append(row)
+        for tag in tags:
+            self._tags.setdefault(tag, []).append(row)
+
+    def _tag_mask(self, tags: Optional[List[str]], tags_match: str) -> Optional[np.ndarray]:
+        """Rows passing a Hindsight-style tag filter, or None for all rows"""
+        if not tags:
+            return None
+        if self._tags is None:
+            with open(f"{self._base}.tags", encoding="utf-8") as f:
+                postings = json.load(f)
+            self._tags, self._untagged = postings["tags"], postings["untagged"]
+        masks = []
+        for tag in tags:
+            mask = np.zeros(self.rows, dtype=bool)
+            mask[self._tags.get(tag, [])] = True
+            masks.append(mask)
+        matched = np.logical_or.reduce(masks) if tags_match.startswith("any") else np.logical_and.reduce(masks)
+        if tags_match == "exact":
+            wanted = set(tags)
+            for row in np.flatnonzero(matched):
+                matched[row] = set(self.record(row)["tags"]) == wanted
+        elif not tags_match.endswith("_strict"):
+            matched[self._untagged] = True
+        return matched
+
+
+class LocalBank:
+    """One bank on disk: a manifest and a list of append-only segments.
+
+    ``manifest.json`` names the segments in order and is replaced
+    atomically, so it is the only state a restart reads: segments are
+    memory-mapped, not loaded, and only the active segment (at most
+    ``segment_rows`` rows) is scanned to rebuild its tag postings. Cold start
+    therefore costs the same for a thousand memories as for millions.
+    Memory ids are bank-wide sequence numbers, increasing across segments,
+    so an id is found by range then binary search.
+
+    Row counts and the next id are cached in memory, so a bank has a single
+    writer: opening it takes an exclusive lock on ``.lock`` in its
+    directory, and a second handle (from another process, or a second
+    ``LocalBank`` on the same directory) is refused instead of silently
+    overwriting the first one's rows.
+    """
+
+    def __init__(self, path: str, dim: int, segment_rows: int = LOCAL_SEGMENT_ROWS):
+        self.path = path
+        self.dim = dim
+        os.makedirs(path, exist_ok=True)
+        self._dir_lock = _lock_directory(path)
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._manifest_path = os.path.join(path, "manifest.json")
+
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest["dim"] != dim:
+                raise ValueError(
+                    f"Local bank {path} holds {manifest['dim']}-dimensional embeddings, "
+                    f"but the embedder produces {dim}"
+                )
+        else:
+            manifest = {"dim": dim, "segment_rows": segment_rows, "next_segment": 0, "next_seq": 0, "segments": []}
+        self.segment_rows = manifest["segment_rows"]
+        self._next_segment = manifest["next_segment"]
+        self._remove_unlisted_files({entry["name"] for entry in manifest["segments"]})
+        self.segments: List[Segment] = [
+            Segment(path, entry["name"], dim, entry["capacity"], entry["sealed"], entry.get("rows"))
+            for entry in manifest["segments"]
+        ]
+        self._next_seq = max(
+            [manifest["next_seq"]] + [s.last_seq + 1 for s in self.segments if s.rows]
+        )
+        if not self.segments or self.segments[-1].sealed:
+            self._start_segment()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(s.rows - s.dead_count() for s in self.segments)
+
+    def add(self, records: List[Dict[str, Any]], vectors: np.ndarray) -> List[int]:
+        """Append memories; returns their ids"""
+        with self._lock:
+            seqs = list(range(self._next_seq, self._next_seq + len(records)))
+            self._next_seq += len(records)
+            done = 0
+            while done < len(records):
+                active = self.segments[-1]
+                take = min(len(records) - done, active.capacity - active.rows)
+                active.append(seqs[done:done + take], records[done:done + take], vectors[done:done + take])
+                done += take
+                if active.full:
+                    active.seal()
+                    self._start_segment()  # Also saves the manifest
+            return seqs
+
+    def get(self, seq: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            located = self._locate(seq)
+            return located[0].record(located[1]) if located else None
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        tags: Optional[List[str]] = None,
+        tags_match: str = "any",
+        nprobe: int = LOCAL_ANN_NPROBE
+    ) -> List[tuple]:
+        """``(id, similarity, record)`` of the ``k`` best matches across segments"""
+        with self._lock:
+            hits = []
+            for segment in self.segments:
+                hits.extend(
+                    (score, segment, row)
+                    for score, row in segment.search(query, k, tags, tags_match, nprobe)
+                )
+            hits = heapq.nlargest(k, hits, key=lambda hit: hit[0])
+            return [
+                (int(segment.columns["seq"][row]), score, segment.record(row))
+                for score, segment, row in hits
+            ]
+
+    def tombstone(self, seqs: List[int]) -> int:
+        """Hide memories from recall until compaction drops them; returns how many were live"""
+        hidden = 0
+        with self._lock:
+            for seq in seqs:
+                located = self._locate(seq)
+                if located and not located[0].dead()[located[1]]:
+                    located[0].tombstone([located[1]])
+                    hidden += 1
+        return hidden
+
+    def compact(self, tombstone_ratio: float = LOCAL_COMPACT_TOMBSTONE_RATIO):
+        """Index sealed segments and rewrite those with many tombstones.
+
+        Adjacent sealed segments are merged while their live rows fit in one
+        segment. The new segment is written without holding the bank lock;
+        only the swap (and tombstones set meanwhile) happens under it.
+        """
+        with self._compact_lock:
+            with self._lock:
+                sealed = [s for s in self.segments if s.sealed]
+            for segment in sealed:
+                if segment.ivf is None and segment.rows >= LOCAL_ANN_MIN_SIZE:
+                    segment.build_index()
+
+            for group in self._merge_groups(sealed, tombstone_ratio):
+                self._merge(group)
+
+    def close(self):
+        with self._lock:
+            for segment in self.segments:
+                segment.close()
+            # Closing the lock file releases the bank for the next handle
+            self._dir_lock.close()
+
+    def _merge_groups(self, sealed: List[Segment], tombstone_ratio: float) -> List[List[Segment]]:
+        groups, current, live = [], [], 0
+        for segment in sealed:
+            segment_live = segment.rows - segment.dead_count()
+            if current and live + segment_live > self.segment_rows:
+                groups.append(current)
+                current, live = [], 0
+            current.append(segment)
+            live += segment_live
+        if current:
+            groups.append(current)
+        return [
+            group for group in groups
+            if len(group) > 1 or group[0].dead_count() >= tombstone_ratio * max(group[0].rows, 1)
+        ]
+
+    def _merge(self, group: List[Segment]):
+        with self._lock:
+            name = self._new_segment_name()
+            snapshots = [segment.dead() for segment in group]
+        live_rows = [np.flatnonzero(~dead) for dead in snapshots]
+        total = sum(len(rows) for rows in live_rows)
+
+        merged = None
+        if total:
+            merged = Segment.create(self.path, name, self.dim, total)
+            for segment, rows in zip(group, live_rows):
+                for start in range(0, len(rows), 4096):
+                    chunk = rows[start:start + 4096]
+                    merged.append(
+                        [int(seq) for seq in segment.columns["seq"][chunk]],
+                        [segment.record(int(row)) for row in chunk],
+                        np.asarray(segment.vectors[chunk]),
+                    )
+            merged.seal()
+            if merged.rows >= LOCAL_ANN_MIN_SIZE:
+                merged.build_index()
+
+        with self._lock:
+            # Carry over tombstones set while the merge was running
+            offset = 0
+            for segment, rows, before in zip(group, live_rows, snapshots):
+                now_dead = segment.dead()[rows]
+                if merged is not None and now_dead.any():
+                    merged.tombstone([offset + int(i) for i in np.flatnonzero(now_dead)])
+                offset += len(rows)
+            first = self.segments.index(group[0])
+            self.segments[first:first + len(group)] = [merged] if merged is not None else []
+            self._save_manifest()
+        for segment in group:
+            segment.close()
+            segment.delete_files()
+        logger.info(
+            f"Compacted {len(group)} segment(s) of {self.path} into {total} live rows"
+        )
+
+    def _locate(self, seq: int) -> Optional[tuple]:
+        for segment in self.segments:
+            if segment.rows and segment.first_seq <= seq <= segment.last_seq:
+                row = segment.row_of(seq)
+                return (segment, row) if row is not None else None
+        return None
+
+    def _start_segment(self):
+        self.segments.append(Segment.create(self.path, self._new_segment_name(), self.dim, self.segment_rows))
+        self._save_manifest()
+
+    def _new_segment_name(self) -> str:
+        name = f"seg-{self._next_segment:06d}"
+        self._next_segment += 1
+        return name
+
+    def _save_manifest(self):
+        manifest = {
+            "dim": self.dim,
+            "segment_rows": self.segment_rows,
+            "next_segment": self._next_segment,
+            "next_seq": self._next_seq,
+            "segments": [
+                {
+                    "name": s.name,
+                    "capacity": s.capacity,
+                    "sealed": s.sealed,
+                    "rows": s.rows if s.sealed else None,
+                }
+                for s in self.segments
+            ],
+        }
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._manifest_path)
+
+    def _remove_unlisted_files(self, names: set):
+        """Delete segment files a crash left outside the manifest"""
+        for filename in os.listdir(self.path):
+            if filename.startswith("seg-") and filename.split(".")[0] not in names:
+                os.remove(os.path.join(self.path, filename))
+
+
+class LocalMemoryStore:
+    """In-process stand-in for the Hindsight client.
+
+    Implements the ``retain``/``retain_batch``/``recall``/``reflect`` calls
+    (and their ``a*`` async forms) used by the memory classes, backed by
+    local embeddings and one ``LocalBank`` per bank id under ``root``.
+    Recall ranks by cosine similarity and honours the ``tags``/``tags_match``
+    filters; ``reflect`` summarizes the closest memories without an LLM.
+    ``tombstone`` hides superseded memories, and a background thread
+    compacts banks every ``compact_interval`` seconds. At most
+    ``max_open_banks`` banks stay open; the least recently used bank that
+    no call is using is closed when another one opens.
+    """
+
+    def __init__(
+        self,
+        root: str = LOCAL_STORE_PATH,
+        compact_interval: float = LOCAL_COMPACT_INTERVAL,
+        max_open_banks: int = LOCAL_MAX_OPEN_BANKS
+    ):
+        self.root = root
+        self.max_open_banks = max(1, max_open_banks)
+        self.embedder = get_embedder()
+        self._banks: "OrderedDict[str, LocalBank]" = OrderedDict()
+        self._users: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._compactor = None
+        if compact_interval > 0:
+            self._compactor = threading.Thread(
+                target=self._compact_loop, args=(compact_interval,), name="local-store-compactor", daemon=True
+            )
+            self._compactor.start()
+
+    def bank_path(self, bank_id: str) -> str:
+        """Directory of a bank; ids that are not plain names map to a hash so they cannot escape ``root``"""
+        if _SAFE_BANK_ID_RE.fullmatch(bank_id):
+            name = bank_id
+        else:
+            # The leading "_" keeps hashed names apart from verbatim ones
+            name = "_" + hashlib.sha256(bank_id.encode("utf-8")).hexdigest()[:40]
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(root, name))
+        if os.path.dirname(path) != root:
+            raise ValueError(f"Bank id {bank_id!r} resolves outside {self.root}")
+        return path
+
+    @contextmanager
+    def bank(self, bank_id: str) -> Iterator[LocalBank]:
+        """Open bank for the duration of a call; it is not closed while in use"""
+        path = self.bank_path(bank_id)
+        with self._lock:
+            bank = self._banks.get(bank_id)
+            if bank is None:
+                dim = len(self.embedder.embed("dimension probe"))
+                bank = LocalBank(path, dim)
+                self._banks[bank_id] = bank
+            self._banks.move_to_end(bank_id)
+            self._users[bank_id] = self._users.get(bank_id, 0) + 1
+        try:
+            yield bank
+        finally:
+            with self._lock:
+                self._users[bank_id] -= 1
+                if not self._users[bank_id]:
+                    del self._users[bank_id]
+                # Closed before the lock is released, so reopening the same
+                # bank never finds its directory still locked by this handle
+                for old in self._evict():
+                    old.close()
+
+    def _evict(self) -> List[LocalBank]:
+        """Drop least recently used idle banks beyond ``max_open_banks`` (caller holds the lock)"""
+        evicted = []
+        for bank_id in list(self._banks):
+            if len(self._banks) <= self.max_open_banks:
+                break
+            if bank_id not in self._users:
+                evicted.append(self._banks.pop(bank_id))
+        return evicted
+
+    def retain(
+        self,
+        bank_id: str,
+        content: str,
+        context: Optional[str] = None,
+        metadata: Optional[Dict[str, str]] = None,
+        tags: Optional[List[str]] = None,
+        document_id: Optional[str] = None,
+        timestamp: Optional[Any] = None,
+        **kwargs
+    ) -> LocalRetainResponse:
+        return self.retain_batch(bank_id, [{
+            "content": content,
+            "context": context,
+            "metadata": metadata,
+            "tags": tags,
+            "document_id": document_id,
+            "timestamp": timestamp,
+        }])
+
+    def retain_batch(self, bank_id: str, items: List[Dict[str, Any]], **kwargs) -> LocalRetainResponse:
+        now = datetime.now().isoformat()
+        records = [
+            {
+                "text": item["content"],
+                "context": item.get("context"),
+                "metadata": item.get("metadata") or {},
+                "tags": list(item.get("tags") or []),
+                "document_id": item.get("document_id"),
+                "mentioned_at": _isoformat(item.get("timestamp")) or now,
+            }
+            for item in items
+        ]
+        vectors = self.embedder.embed_many([strip_metadata_header(r["text"]) for r in records])
+        with self.bank(bank_id) as bank:
+            seqs = bank.add(records, vectors)
+        return LocalRetainResponse(success=True, memory_ids=[str(seq) for seq in seqs])
+
+    def recall(
+        self,
+        bank_id: str,
+        query: str,
+        max_tokens: int = 4096,
+        tags: Optional[List[str]] = None,
+        tags_match: str = "any",
+        **kwargs
+    ) -> LocalRecallResponse:
+        query_vector = self.embedder.embed(query)
+        with self.bank(bank_id) as bank:
+            hits = bank.search(query_vector, LOCAL_RECALL_MAX_RESULTS, tags, tags_match)
+        results = []
+        used = 0
+        for seq, _, record in hits:
+            used += count_tokens(record["text"])
+            if results and used > max_tokens:
+                break
+            results.append(LocalRecallResult(
+                id=str(seq),
+                text=record["text"],
+                metadata=record["metadata"],
+                tags=record["tags"],
+                mentioned_at=record["mentioned_at"],
+                document_id=record.get("document_id"),
+                context=record.get("context"),
+            ))
+        return LocalRecallResponse(results=results)
+
+    def tombstone(self, bank_id: str, memory_ids: List[str]) -> int:
+        """Hide memories (by recall result id) from recall; returns how many were hidden"""
+        with self.bank(bank_id) as bank:
+            return bank.tombstone([int(memory_id) for memory_id in memory_ids])
+
+    def compact(self):
+        with self._lock:
+            bank_ids = list(self._banks)
+        for bank_id in bank_ids:
+            try:
+                with self.bank(bank_id) as bank:
+                    bank.compact()
+            except Exception as e:
+                logger.warning(f"Compaction of bank {bank_id} failed: {e}")
+
+    def _compact_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            self.compact()
+
+    def reflect(self, bank_id: str, query: str, **kwargs) -> LocalReflectResponse:
+        results = self.recall(bank_id, query, max_tokens=1024).results[:5]
+        if not results:
+            return LocalReflectResponse(text="")
+        lines = [f"- {strip_metadata_header(r.text)}" for r in results]
+        return LocalReflectResponse(text=f"Most relevant memories about {query}:\n" + "\n".join(lines))
+
+    # Async forms: local work is CPU-bound, so it runs off the event loop
+
+    async def aretain(self, *args, **kwargs) -> LocalRetainResponse:
+        return await asyncio.to_thread(self.retain, *args, **kwargs)
+
+    async def aretain_batch(self, *args, **kwargs) -> LocalRetainResponse:
+        return await asyncio.to_thread(self.retain_batch, *args, **kwargs)
+
+    async def arecall(self, *args, **kwargs) -> LocalRecallResponse:
+        return await asyncio.to_thread(self.recall, *args, **kwargs)
+
+    async def areflect(self, *args, **kwargs) -> LocalReflectResponse:
+        return await asyncio.to_thread(self.reflect, *args, **kwargs)
+
+    def close(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            banks, self._banks = list(self._banks.values()), OrderedDict()
+        for bank in banks:
+            bank.close()
+
+    async def aclose(self):
+        # One store serves every event loop; it is closed at exit, not per loop
+        pass
+
+
+def _lock_directory(path: str):
+    """Hold an exclusive lock on ``path``/.lock; raises if another handle holds it"""
+    lock = open(os.path.join(path, ".lock"), "a")
+    if fcntl is None:
+        return lock
+    try:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        raise RuntimeError(
+            f"Local bank {path} is already open in another process; "
+            "MEMORY_BACKEND=local supports a single worker process (WEB_WORKERS=1)"
+        )
+    return lock
+
+
+def _isoformat(timestamp: Any) -> Optional[str]:
+    if isinstance(timestamp, datetime):
+        return timestamp.isoformat()
+    return timestamp
+
+
+_store: Optional[LocalMemoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_local_store() -> LocalMemoryStore:
+    """Process-wide local memory store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LocalMemoryStore()
+    return _store
@@ -1,49 +1,288 @@
 # memory_layer.py
-from typing import List
+import asyncio
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional
 import logging
 
-try:
-    from hindsight_client import Hindsight
-except ImportError:
-    # Fallback for different package structures
-    try:
-        from hindsight import Hindsight
-    except ImportError:
-        raise ImportError(
-            "Hindsight client not found. Please install: pip install hindsight-all"
-        )
+from circuit_breaker import CircuitOpenError
+from hindsight_pool import get_async_client, get_client
+from metrics import RECALLED_MEMORIES, RECALLS, stage, swallowed_error
+from recall_cache import get_recall_cache, normalize_query
 
 logger = logging.getLogger(__name__)
 
+RETAIN_BATCH_SIZE = int(os.environ.get("RETAIN_BATCH_SIZE", "25"))
+RETAIN_MAX_CONCURRENCY = int(os.environ.get("RETAIN_MAX_CONCURRENCY", "4"))
+RETAIN_MAX_RETRIES = int(os.environ.get("RETAIN_MAX_RETRIES", "3"))
+
+
+@dataclass
+class RetainResult:
+    index: int
+    ok: bool
+    error: str | None = None
+    memory_ids: List[str] = field(default_factory=list)  # Empty when the backend reports no ids
+
+
+@dataclass
+class RetainReport:
+    """Per-item outcome of a bulk retain"""
+    results: List[RetainResult] = field(default_factory=list)
+
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for r in self.results if r.ok)
+
+    @property
+    def failed(self) -> List[RetainResult]:
+        return [r for r in self.results if not r.ok]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "succeeded": self.succeeded,
+            "failed": len(self.failed),
+            "failures": [{"index": r.index, "error": r.error} for r in self.failed],
+        }
+
+
+def retain_batched(
+    client,
+    bank_id: str,
+    items: Iterable[Dict[str, Any]],
+    batch_size: int = RETAIN_BATCH_SIZE,
+    max_concurrency: int = RETAIN_MAX_CONCURRENCY,
+    max_retries: int = RETAIN_MAX_RETRIES,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    should_cancel: Optional[Callable[[], bool]] = None,
+) -> RetainReport:
+    """Retain ``items`` (dicts of ``client.retain`` keyword arguments) in batches.
+
+    ``items`` may be a lazy iterable: batches are pulled from it only as fast
+    as they can be sent, with at most ``max_concurrency`` in flight, so a
+    streaming producer never runs far ahead of the server.
+    Batches go through ``client.retain_batch`` when the client supports it,
+    otherwise item by item. Each batch is retried with exponential backoff
+    before its items are reported as failed.
+    ``on_progress(done, total)`` is called as batches finish (``total`` counts
+    the items read so far when ``items`` has no length). Once
+    ``should_cancel()`` turns true no further items are read, and batches not
+    yet sent are reported as cancelled.
+    """
+    def send(start: int, batch: List[Dict[str, Any]]) -> List[RetainResult]:
+        indices = range(start, start + len(batch))
+        if should_cancel is not None and should_cancel():
+            return [RetainResult(index=i, ok=False, error="cancelled") for i in indices]
+        last_error = None
+        for attempt in range(max_retries):
+            try:
+                with stage("memory.retain_batch", bank_id=bank_id):
+                    if hasattr(client, "retain_batch"):
+                        response = client.retain_batch(bank_id=bank_id, items=batch)
+                        ids = list(getattr(response, "memory_ids", None) or [])
+                        # Only attributable when the backend reports one id per item
+                        item_ids = [[i] for i in ids] if len(ids) == len(batch) else [[] for _ in batch]
+                    else:
+                        item_ids = [
+                            list(getattr(client.retain(bank_id=bank_id, **item), "memory_ids", None) or [])
+                            for item in batch
+                        ]
+                return [RetainResult(index=i, ok=True, memory_ids=ids) for i, ids in zip(indices, item_ids)]
+            except CircuitOpenError as e:
+                # The server is known to be down; retrying now would only fail fast again
+                last_error = e
+                break
+            except Exception as e:
+                last_error = e
+                if attempt + 1 < max_retries:
+                    time.sleep(0.5 * 2 ** attempt)
+        logger.warning(
+            f"Failed to retain batch of {len(batch)} items after {max_retries} attempts: {last_error}"
+        )
+        swallowed_error("memory", "retain_batch")
+        return [RetainResult(index=i, ok=False, error=str(last_error)) for i in indices]
+
+    report = RetainReport()
+    known_total = len(items) if hasattr(items, "__len__") else None
+    iterator = iter(items)
+    read = 0
+    in_flight = set()
+    max_concurrency = max(1, max_concurrency)
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        while True:
+            cancelled = should_cancel is not None and should_cancel()
+            batch = [] if cancelled else list(islice(iterator, batch_size))
+            if batch:
+                in_flight.add(pool.submit(send, read, batch))
+                read += len(batch)
+            if not in_flight:
+                break
+            if batch and len(in_flight) < max_concurrency:
+                continue
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                report.results.extend(future.result())
+            if on_progress is not None:
+                on_progress(len(report.results), known_total or read)
+    report.results.sort(key=lambda r: r.index)
+    return report
+
+
+def recall_results(response) -> list:
+    """Result list of a recall call (newer SDKs wrap it in a response object)"""
+    return getattr(response, "results", response)
+
 
 class HindsightMemory:
     def __init__(self, base_url: str, bank_id: str, enabled: bool = True):
-        self.client = Hindsight(base_url=base_url)
+        self.base_url = base_url
+        self.client = get_client(base_url)
         self.bank_id = bank_id
         self.enabled = enabled
 
-    def retain(self, content: str, context: str | None = None):
+    def retain(self, content: str, context: str | None = None, background: bool = False):
+        """Store a memory; with ``background`` it is queued in the write-behind buffer"""
         if not self.enabled:
             return
+        if background:
+            from write_behind import get_write_behind
+            buffer = get_write_behind()
+            if buffer is not None:
+                buffer.submit(self.base_url, self.bank_id, {"content": content, "context": context})
+                return
         try:
-            self.client.retain(
-                bank_id=self.bank_id,
-                content=content,
-                context=context,
-            )
+            with stage("memory.retain", bank_id=self.bank_id):
+                self.client.retain(
+                    bank_id=self.bank_id,
+                    content=content,
+                    context=context,
+                )
+        except CircuitOpenError:
+            self._hold_for_replay({"content": content, "context": context})
+        except Exception as e:
+            logger.warning(f"Failed to retain memory: {e}")
+            swallowed_error("memory", "retain")
+        finally:
+            get_recall_cache().invalidate_bank(self.bank_id)
+
+    async def aretain(self, content: str, context: str | None = None, background: bool = False):
+        """Async ``retain`` for the ASGI serving path"""
+        if not self.enabled:
+            return
+        if background:
+            from write_behind import get_write_behind
+            buffer = get_write_behind()
+            if buffer is not None:
+                # submit() may block briefly under backpressure; keep it off the loop
+                await asyncio.to_thread(
+                    buffer.submit, self.base_url, self.bank_id, {"content": content, "context": context}
+                )
+                return
+        try:
+            with stage("memory.retain", bank_id=self.bank_id):
+                await get_async_client(self.base_url).aretain(
+                    bank_id=self.bank_id,
+                    content=content,
+                    context=context,
+                )
+        except CircuitOpenError:
+            await asyncio.to_thread(self._hold_for_replay, {"content": content, "context": context})
         except Exception as e:
             logger.warning(f"Failed to retain memory: {e}")
+            swallowed_error("memory", "retain")
+        finally:
+            get_recall_cache().invalidate_bank(self.bank_id)
+
+    def _hold_for_replay(self, retain_kwargs: Dict[str, Any]):
+        """Keep a write the server could not take in the write-behind journal for later delivery"""
+        from write_behind import get_write_behind
+        buffer = get_write_behind()
+        if buffer is None:
+            logger.warning(f"Hindsight unavailable and write-behind disabled; dropping write to {self.bank_id}")
+            swallowed_error("memory", "retain")
+            return
+        buffer.submit(self.base_url, self.bank_id, retain_kwargs)
+
+    def retain_many(
+        self,
+        items: Iterable[Dict[str, Any]],
+        batch_size: int = RETAIN_BATCH_SIZE,
+        max_concurrency: int = RETAIN_MAX_CONCURRENCY,
+        max_retries: int = RETAIN_MAX_RETRIES,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+    ) -> RetainReport:
+        """Retain many ``{"content", "context"}`` items with per-item results"""
+        if not self.enabled:
+            return RetainReport()
+        try:
+            return retain_batched(
+                self.client, self.bank_id, items, batch_size, max_concurrency, max_retries,
+                on_progress, should_cancel,
+            )
+        finally:
+            get_recall_cache().invalidate_bank(self.bank_id)
 
     def recall(self, query: str) -> List[str]:
         if not self.enabled:
             return []
+        cache = get_recall_cache()
+        cache_key = ("recall", normalize_query(query))
+        cached = cache.get(self.bank_id, cache_key)
+        if cached is not None:
+            RECALLS.inc(outcome="cache_hit")
+            return list(cached)
+        version = cache.bank_version(self.bank_id)
         try:
-            results = self.client.recall(
-                bank_id=self.bank_id,
-                query=query,
-            )
-            return [r.text for r in results]  # per SDK docs
+            with stage("memory.recall", bank_id=self.bank_id):
+                results = self.client.recall(
+                    bank_id=self.bank_id,
+                    query=query,
+                )
+            memories = [r.text for r in recall_results(results)]  # per SDK docs
+            RECALLS.inc(outcome="backend")
+            RECALLED_MEMORIES.inc(len(memories), source="semantic")
+            cache.put(self.bank_id, cache_key, memories, version)
+            return list(memories)
+        except CircuitOpenError:
+            RECALLS.inc(outcome="circuit_open")
+            return []
         except Exception as e:
             logger.warning(f"Failed to recall memory: {e}")
+            RECALLS.inc(outcome="error")
+            swallowed_error("memory", "recall")
             return []
 
+    async def arecall(self, query: str) -> List[str]:
+        """Async ``recall``; shares the recall cache with the sync path"""
+        if not self.enabled:
+            return []
+        cache = get_recall_cache()
+        cache_key = ("recall", normalize_query(query))
+        cached = cache.get(self.bank_id, cache_key)
+        if cached is not None:
+            RECALLS.inc(outcome="cache_hit")
+            return list(cached)
+        version = cache.bank_version(self.bank_id)
+        try:
+            with stage("memory.recall", bank_id=self.bank_id):
+                results = await get_async_client(self.base_url).arecall(
+                    bank_id=self.bank_id,
+                    query=query,
+                )
+            memories = [r.text for r in recall_results(results)]
+            RECALLS.inc(outcome="backend")
+            RECALLED_MEMORIES.inc(len(memories), source="semantic")
+            cache.put(self.bank_id, cache_key, memories, version)
+            return list(memories)
+        except CircuitOpenError:
+            RECALLS.inc(outcome="circuit_open")
+            return []
+        except Exception as e:
+            logger.warning(f"Failed to recall memory: {e}")
+            RECALLS.inc(outcome="error")
+            swallowed_error("memory", "recall")
+            return []
@@ -0,0 +1,149 @@
+# memory_metadata.py
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+IMPORTANCE_ORDER = {"critical": 3, "high": 2, "normal": 1, "low": 0}
+
+# Hindsight tag carrying importance, so importance filters run server-side
+IMPORTANCE_TAG_PREFIX = "importance:"
+
+# "[IMPORTANCE: high] [VERSION: 2.0] ... [DATE: ...]" fields of the text header
+_HEADER_FIELD_RE = re.compile(r"\[(?:IMPORTANCE|VERSION|SOURCE|TAGS|DATE): [^\]]*\]\s*")
+
+_VERSION_PART_RE = re.compile(r"\d+|[^\W\d_]+")
+
+
+@dataclass
+class MemoryRecord:
+    """A recalled memory with its metadata as structured fields"""
+    text: str
+    importance: str = "normal"
+    version: Optional[str] = None
+    source: Optional[str] = None
+    tags: List[str] = field(default_factory=list)
+    date: Optional[datetime] = None
+    id: Optional[str] = None
+    score: Optional[float] = None  # Set by rerankers; higher is more relevant
+    content_hash: Optional[str] = None  # Hash of the retained text, shared by facts extracted from it
+
+    @property
+    def importance_level(self) -> int:
+        return IMPORTANCE_ORDER.get(self.importance, 1)
+
+
+def build_metadata(
+    importance: str = "normal",
+    source: Optional[str] = None,
+    version: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    date: Optional[datetime] = None
+) -> Tuple[Dict[str, str], List[str]]:
+    """Hindsight ``metadata`` (string values) and ``tags`` for a memory"""
+    metadata = {
+        "importance": importance,
+        "date": (date or datetime.now()).isoformat(),
+    }
+    if version:
+        metadata["version"] = version
+    if source:
+        metadata["source"] = source
+    if tags:
+        metadata["tags"] = ",".join(tags)
+    return metadata, list(tags or []) + [f"{IMPORTANCE_TAG_PREFIX}{importance}"]
+
+
+def version_key(version: str) -> Tuple:
+    """Sort key ordering versions numerically rather than as strings.
+
+    "9.0" < "10.0", "1.2" == "1.2.0" == "v1.2", and a pre-release
+    ("2.0-rc1") sorts before its release ("2.0").
+    """
+    def parts(text: str) -> Tuple:
+        # Numbers sort after words at the same position, so "1.0a" < "1.0.1"
+        return tuple(
+            (1, int(part), "") if part.isdigit() else (0, 0, part.lower())
+            for part in _VERSION_PART_RE.findall(text)
+        )
+
+    release, _, pre_release = version.strip().lstrip("vV").partition("-")
+    release_parts = parts(release)
+    while release_parts and release_parts[-1] == (1, 0, ""):
+        release_parts = release_parts[:-1]
+    return release_parts, ((0,) + parts(pre_release) if pre_release else (1,))
+
+
+def importance_tag_filter(min_importance: str) -> Tuple[List[str], str]:
+    """Recall ``tags``/``tags_match`` selecting memories at or above ``min_importance``.
+
+    Memories without tags count as "normal" (the default importance), so
+    they are only kept when the threshold is "normal" or lower.
+    """
+    min_value = IMPORTANCE_ORDER.get(min_importance, 0)
+    allowed = [
+        f"{IMPORTANCE_TAG_PREFIX}{level}"
+        for level, value in IMPORTANCE_ORDER.items()
+        if value >= min_value
+    ]
+    return allowed, "any" if min_value <= IMPORTANCE_ORDER["normal"] else "any_strict"
+
+
+def record_from_result(result: Any) -> MemoryRecord:
+    """Build a record from a Hindsight recall result"""
+    metadata = getattr(result, "metadata", None) or {}
+    tags = [
+        tag for tag in (getattr(result, "tags", None) or [])
+        if not tag.startswith(IMPORTANCE_TAG_PREFIX)
+    ]
+    record = MemoryRecord(
+        text=result.text,
+        importance=metadata.get("importance", "normal"),
+        version=metadata.get("version"),
+        source=metadata.get("source"),
+        tags=tags,
+        id=getattr(result, "id", None),
+        content_hash=metadata.get("content_hash"),
+    )
+    date = metadata.get("date") or getattr(result, "mentioned_at", None)
+    if date:
+        record.date = _parse_date(str(date))
+    if not metadata and "[IMPORTANCE:" in result.text:
+        _apply_legacy_header(record)
+    return record
+
+
+def strip_metadata_header(text: str) -> str:
+    """Memory text without the readable metadata header(s) added on retain"""
+    return _HEADER_FIELD_RE.sub("", text).strip()
+
+
+def _apply_legacy_header(record: MemoryRecord):
+    """Fill fields from the text header written before metadata was structured.
+
+    Only memories retained without Hindsight metadata take this path.
+    """
+    header = record.text.split("\n", 1)[0]
+    fields = {}
+    for part in header.split("]"):
+        name, sep, value = part.strip().lstrip("[").partition(":")
+        if sep:
+            fields[name.strip()] = value.strip()
+    record.importance = fields.get("IMPORTANCE", record.importance)
+    record.version = fields.get("VERSION", record.version)
+    record.source = fields.get("SOURCE", record.source)
+    if "TAGS" in fields:
+        record.tags = [tag.strip() for tag in fields["TAGS"].split(",")]
+    if "DATE" in fields:
+        record.date = _parse_date(fields["DATE"]) or record.date
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    """Parse an ISO date as naive local time so all dates compare"""
+    try:
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if date.tzinfo is not None:
+        date = date.astimezone().replace(tzinfo=None)
+    return date
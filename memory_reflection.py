@@ -1,7 +1,17 @@
 # memory_reflection.py
-from typing import List, Optional
+import csv
+import io
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
 import logging
 
+from consolidation import get_consolidator
+from memory_layer import RetainReport
+from memory_metadata import version_key
+from metrics import stage, swallowed_error
+from rule_registry import get_rule_registry
+
 logger = logging.getLogger(__name__)
 
 
@@ -14,43 +24,39 @@ class MemoryReflection:
     def reflect_and_summarize(self, topic: str) -> Optional[str]:
         """Use reflection to create higher-level insights"""
         try:
-            reflection = self.memory.reflect(f"Summarize and consolidate knowledge about: {topic}")
-            
-            if reflection:
-                # Store the reflection as important knowledge
-                self.memory.retain_with_metadata(
-                    content=reflection,
-                    context="reflection",
-                    importance="high",
-                    source="reflection",
-                    tags=["summary", "consolidated_knowledge", topic.lower().replace(" ", "_")]
-                )
-                return reflection
+            with stage("reflection.summarize", topic=topic):
+                reflection = self.memory.reflect(f"Summarize and consolidate knowledge about: {topic}")
+                
+                if reflection:
+                    # Store the reflection as important knowledge
+                    self.memory.retain_with_metadata(
+                        content=reflection,
+                        context="reflection",
+                        importance="high",
+                        source="reflection",
+                        tags=["summary", "consolidated_knowledge", topic.lower().replace(" ", "_")]
+                    )
+                    return reflection
         except Exception as e:
             logger.warning(f"Reflection failed: {e}")
+            swallowed_error("reflection", "summarize")
         
         return None
     
     def identify_outdated_info(self, topic: str) -> List[str]:
         """Identify potentially outdated information"""
-        memories = self.memory.recall_with_priority(topic, limit=50)
+        with stage("reflection.identify_outdated", topic=topic):
+            records = self.memory.recall_records(topic, min_importance="normal", limit=50)
         
         # Group by version and identify old ones
         versioned_memories = {}
-        for memory in memories:
-            if "[VERSION:" in memory:
-                try:
-                    version = memory.split("[VERSION:")[1].split("]")[0].strip()
-                    if version not in versioned_memories:
-                        versioned_memories[version] = []
-                    versioned_memories[version].append(memory)
-                except:
-                    pass
+        for record in records:
+            if record.version:
+                versioned_memories.setdefault(record.version, []).append(record.text)
         
         # If multiple versions exist, flag older ones
         if len(versioned_memories) > 1:
-            # Sort versions (simple string comparison - could be improved)
-            sorted_versions = sorted(versioned_memories.keys(), reverse=True)
+            sorted_versions = sorted(versioned_memories.keys(), key=version_key, reverse=True)
             outdated = []
             for old_version in sorted_versions[1:]:  # All except the latest
                 outdated.extend(versioned_memories[old_version])
@@ -59,6 +65,50 @@ class MemoryReflection:
         return []
 
 
+@dataclass
+class RuleUpdate:
+    """One row of a bulk rule update (same fields as ``/admin/update-rule``)"""
+    rule_id: str
+    content: str
+    version: str = "1.0"
+    summary: str = ""
+
+
+def parse_rule_updates(data: str, fmt: str) -> List[RuleUpdate]:
+    """Rule updates from an uploaded ``csv`` or ``json`` document.
+    
+    CSV needs a header row with ``rule_id`` and ``content`` columns and may
+    add ``version`` and ``summary``. JSON is a list of objects with the same
+    keys, or an object holding that list under ``rules``. Raises ValueError
+    naming the first invalid row.
+    """
+    if fmt == "csv":
+        rows: List[Any] = list(csv.DictReader(io.StringIO(data)))
+    elif fmt == "json":
+        parsed = json.loads(data)
+        rows = parsed.get("rules", []) if isinstance(parsed, dict) else parsed
+        if not isinstance(rows, list):
+            raise ValueError("Expected a list of rule updates")
+    else:
+        raise ValueError(f"Unsupported rule update format: {fmt}")
+    
+    updates = []
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            raise ValueError(f"Row {number}: expected an object")
+        rule_id = str(row.get("rule_id") or "").strip()
+        content = str(row.get("content") or "").strip()
+        if not rule_id or not content:
+            raise ValueError(f"Row {number}: rule_id and content are required")
+        updates.append(RuleUpdate(
+            rule_id=rule_id,
+            content=content,
+            version=str(row.get("version") or "1.0").strip(),
+            summary=str(row.get("summary") or "").strip()
+        ))
+    return updates
+
+
 class UpdateTracker:
     """Tracks updates to company rules and standards"""
     
@@ -72,36 +122,74 @@ class UpdateTracker:
         new_version: str,
         change_summary: str = ""
     ):
-        """Update a company rule and mark old version as superseded"""
-        # Store new version with high importance
-        content = f"RULE ID: {rule_id}\n"
-        if change_summary:
-            content += f"CHANGE SUMMARY: {change_summary}\n"
-        content += f"\n{new_content}"
+        """Update a company rule; older versions stop being recalled.
         
-        self.memory.retain_with_metadata(
-            content=content,
-            context=f"dfx_rule_{rule_id}",
-            importance="critical",
-            source="rule_update",
-            version=new_version,
-            tags=["dfx_rule", rule_id, "current"]
-        )
+        The new version is registered in the rule registry, which recall
+        consults to drop every other version of the rule. Backends with
+        tombstones (the local store) also hide the superseded memories.
+        """
+        item = self._rule_item(RuleUpdate(rule_id, new_content, new_version, change_summary))
         
-        # Mark old versions as superseded
-        old_memories = self.memory.recall_with_priority(f"RULE ID: {rule_id}", limit=20)
-        for old_memory in old_memories:
-            if "[VERSION:" in old_memory and new_version not in old_memory:
-                # Check if it's the same rule
-                if rule_id in old_memory:
-                    # Store superseded marker
-                    self.memory.retain_with_metadata(
-                        content=f"[SUPERSEDED BY v{new_version}] {old_memory}",
-                        context="superseded_rule",
-                        importance="low",
-                        source="rule_update",
-                        tags=["superseded", rule_id]
-                    )
+        with stage("reflection.update_rule", rule_id=rule_id):
+            memory_ids = self.memory.retain_with_metadata(**item)
+            if memory_ids is None:
+                raise RuntimeError(f"Failed to store rule {rule_id} version {new_version}")
+            
+            superseded = get_rule_registry().register(
+                self.memory.bank_id, rule_id, new_version, item["content"],
+                memory_ids[0] if memory_ids else None
+            )
+            self.memory.tombstone([v.memory_id for v in superseded if v.memory_id])
+            self._expire_summaries([rule_id])
         
         logger.info(f"Updated rule {rule_id} to version {new_version}")
-
+    
+    def update_rules(
+        self,
+        updates: List[RuleUpdate],
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> RetainReport:
+        """Apply many rule updates at once.
+        
+        All new versions go to Hindsight through one batched ``retain_many``,
+        the stored ones are registered in a single registry transaction, and
+        the versions they supersede are tombstoned in one call. Returns the
+        retain report; failed updates are not registered, so their rules keep
+        their current version.
+        """
+        items = [self._rule_item(update) for update in updates]
+        
+        with stage("reflection.update_rules", count=len(updates)):
+            report = self.memory.retain_many(items, on_progress=on_progress)
+            stored = [
+                (updates[r.index].rule_id, updates[r.index].version, items[r.index]["content"],
+                 r.memory_ids[0] if r.memory_ids else None)
+                for r in report.results if r.ok
+            ]
+            superseded = get_rule_registry().register_many(self.memory.bank_id, stored) if stored else []
+            self.memory.tombstone([v.memory_id for v in superseded if v.memory_id])
+            self._expire_summaries(list(dict.fromkeys(rule_id for rule_id, *_ in stored)))
+        
+        logger.info(f"Updated {report.succeeded} of {len(updates)} rules")
+        return report
+    
+    def _expire_summaries(self, rule_ids: List[str]):
+        """Consolidated summaries quoting an updated rule would repeat its old version"""
+        consolidator = get_consolidator()
+        if consolidator is not None:
+            consolidator.expire_summaries(self.memory.bank_id, rule_ids)
+    
+    def _rule_item(self, update: RuleUpdate) -> Dict[str, Any]:
+        """``retain_with_metadata`` arguments storing a rule version with critical importance"""
+        content = f"RULE ID: {update.rule_id}\n"
+        if update.summary:
+            content += f"CHANGE SUMMARY: {update.summary}\n"
+        content += f"\n{update.content}"
+        return {
+            "content": content,
+            "context": f"dfx_rule_{update.rule_id}",
+            "importance": "critical",
+            "source": "rule_update",
+            "version": update.version,
+            "tags": ["dfx_rule", update.rule_id, "current"],
+        }
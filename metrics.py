@@ -0,0 +1,327 @@
+# metrics.py
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_PREFIX = os.environ.get("METRICS_PREFIX", "gpt_lab")
+# Spans are exported only when this is on and the opentelemetry packages are installed
+OTEL_ENABLED = os.environ.get("OTEL_ENABLED", "false").lower() == "true"
+OTEL_SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "gpt-lab-agent")
+
+# Seconds; spans cache hits (sub-millisecond) up to slow LLM calls
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED or amount <= 0:
+            return
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_label_text(self.label_names, key)} {value}" for key, value in values]
+
+
+class Histogram:
+    """Bucketed observations per label combination (Prometheus cumulative buckets at render)"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = STAGE_BUCKETS
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.label_names, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics rendered in the Prometheus text exposition format.
+
+    Besides counters and histograms updated in place, collectors are called
+    at scrape time for values other components already keep (cache and
+    write-behind statistics), so those cost nothing between scrapes.
+    """
+
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], Iterator[Tuple[str, str, str, Dict[str, Any], float]]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, label_names)
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = STAGE_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, label_names, buckets)
+
+    def register_collector(self, collector: Callable[[], Iterator[Tuple[str, str, str, Dict[str, Any], float]]]):
+        """Add a scrape-time source of ``(name, kind, help, labels, value)`` samples"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            samples = metric.samples()
+            if samples:
+                lines.append(f"# HELP {metric.name} {metric.help_text}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(samples)
+        # A metric family's samples must be contiguous, whichever collector yields them
+        families: Dict[str, List[str]] = {}
+        for collector in collectors:
+            try:
+                for name, kind, help_text, labels, value in collector():
+                    name = f"{self.prefix}_{name}"
+                    if name not in families:
+                        families[name] = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                    families[name].append(f"{name}{_label_text(list(labels), list(labels.values()))} {value}")
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+        for family in families.values():
+            lines.extend(family)
+        return "\n".join(lines) + "\n"
+
+    def _get_or_create(self, metric_cls: type, name: str, help_text: str, label_names, *args):
+        full_name = f"{self.prefix}_{name}"
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = metric_cls(full_name, help_text, label_names, *args)
+            return metric
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Process-wide metrics registry"""
+    return _registry
+
+
+STAGE_SECONDS = _registry.histogram(
+    "stage_duration_seconds", "Time spent in each stage of chat turns, ingestion and reflection", ("stage",)
+)
+RECALLS = _registry.counter(
+    "recalls_total", "Memory recalls by outcome (cache_hit, backend, circuit_open or error)", ("outcome",)
+)
+RECALLED_MEMORIES = _registry.counter(
+    "recalled_memories_total", "Memories returned by backend and lexical recalls", ("source",)
+)
+SWALLOWED_ERRORS = _registry.counter(
+    "swallowed_errors_total", "Failures logged and recovered from instead of raised", ("component", "operation")
+)
+INGESTED_CHUNKS = _registry.counter(
+    "ingested_chunks_total", "Document chunks by ingestion outcome (stored, failed or skipped)", ("outcome",)
+)
+PROMPT_TOKENS = _registry.histogram(
+    "prompt_tokens", "Tokens in the system prompt of each chat turn", buckets=TOKEN_BUCKETS
+)
+CONTEXT_TOKENS = _registry.histogram(
+    "context_tokens", "Memory tokens placed in the prompt per chat turn, by source", ("source",),
+    buckets=TOKEN_BUCKETS
+)
+CONTEXT_MEMORIES = _registry.counter(
+    "context_memories_total",
+    "Recalled memories by source that context assembly included or dropped (truncated counts included ones cut short)",
+    ("source", "outcome")
+)
+
+
+def swallowed_error(component: str, operation: str):
+    """Count a failure that was logged and degraded around rather than raised"""
+    SWALLOWED_ERRORS.inc(component=component, operation=operation)
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+_tracer_loaded = False
+
+
+def _get_tracer():
+    """OpenTelemetry tracer, or None when tracing is off or not installed"""
+    global _tracer, _tracer_loaded
+    if not OTEL_ENABLED:
+        return None
+    if _tracer_loaded:
+        return _tracer
+    with _tracer_lock:
+        if not _tracer_loaded:
+            _tracer = _load_tracer()
+            _tracer_loaded = True
+    return _tracer
+
+
+def _load_tracer():
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        logger.warning("OTEL_ENABLED is set but opentelemetry-api is not installed; spans are disabled")
+        return None
+    # Keep a provider configured by the deployment (e.g. opentelemetry-instrument);
+    # otherwise export over OTLP, configured by the standard OTEL_EXPORTER_OTLP_* variables
+    if type(trace.get_tracer_provider()).__name__ == "ProxyTracerProvider":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            trace.set_tracer_provider(provider)
+        except ImportError:
+            logger.warning(
+                "opentelemetry-sdk or the OTLP exporter is not installed; spans go to the global provider"
+            )
+    return trace.get_tracer("gpt-lab-agent")
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """Time a block into ``stage_duration_seconds{stage=name}`` and, with tracing, a span.
+
+    ``attributes`` (bank ids and the like) are only attached to the span;
+    they would make too many series as metric labels.
+    """
+    tracer = _get_tracer()
+    started = time.perf_counter()
+    try:
+        if tracer is None:
+            yield
+        else:
+            with tracer.start_as_current_span(name, attributes=attributes):
+                yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+
+def record_stage(name: str, started: float, **attributes):
+    """Record a stage that began at ``time.perf_counter()`` value ``started`` and ends now.
+
+    For stages that span generator yields (streamed LLM output), where a
+    ``with stage(...)`` block could be resumed or closed in another context.
+    """
+    elapsed = time.perf_counter() - started
+    STAGE_SECONDS.observe(elapsed, stage=name)
+    tracer = _get_tracer()
+    if tracer is not None:
+        end_ns = time.time_ns()
+        span = tracer.start_span(name, attributes=attributes, start_time=end_ns - int(elapsed * 1e9))
+        span.end(end_time=end_ns)
+
+
+_WRITE_BEHIND_COUNTERS = {
+    "flushed": "Write-behind writes delivered",
+    "dropped": "Write-behind writes given up after repeated failures",
+    "sync_fallbacks": "Writes sent synchronously because the write-behind queue was full",
+    "deferred": "Write-behind writes left in the spill file for replay after restart",
+}
+
+
+def _component_stats() -> Iterator[Tuple[str, str, str, Dict[str, Any], float]]:
+    """Cache and write-behind statistics, read at scrape time"""
+    from recall_cache import get_recall_cache
+    from response_cache import get_response_cache
+    from write_behind import get_write_behind
+
+    for cache_name, stats in (("recall", get_recall_cache().stats()), ("response", get_response_cache().stats())):
+        labels = {"cache": cache_name}
+        for field in ("hits", "misses", "evictions", "invalidations"):
+            if field in stats:
+                yield f"cache_{field}_total", "counter", f"Cache {field}", labels, stats[field]
+        for field in ("entries", "bytes"):
+            if field in stats:
+                yield f"cache_{field}", "gauge", f"Cache {field} held", labels, stats[field]
+    buffer = get_write_behind()
+    if buffer is not None:
+        stats = buffer.stats()
+        yield "write_behind_queued", "gauge", "Writes waiting in the write-behind queue", {}, stats["queued"]
+        for field, help_text in _WRITE_BEHIND_COUNTERS.items():
+            yield f"write_behind_{field}_total", "counter", help_text, {}, stats[field]
+
+
+_registry.register_collector(_component_stats)
@@ -0,0 +1,157 @@
+# profile_store.py
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Dict, Optional
+
+PROFILE_STORE = os.environ.get("PROFILE_STORE", "sqlite")  # "sqlite" or "memory"
+PROFILE_DB_PATH = os.environ.get("PROFILE_DB_PATH", "./profiles.db")
+PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", "10000"))
+
+
+@dataclass
+class UserProfile:
+    user_id: str
+    allow_memory: bool
+
+
+class ProfileStore(ABC):
+    """Where user profiles live. Implementations must be thread-safe."""
+
+    @abstractmethod
+    def get_or_create(self, user_id: str) -> UserProfile:
+        ...
+
+    @abstractmethod
+    def set_consent(self, user_id: str, allow: bool) -> UserProfile:
+        ...
+
+
+class InMemoryProfileStore(ProfileStore):
+    """Process-local profiles; lost on restart and not shared between workers"""
+
+    def __init__(self):
+        self._profiles: Dict[str, UserProfile] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self, user_id: str) -> UserProfile:
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is None:
+                profile = UserProfile(user_id=user_id, allow_memory=False)
+                self._profiles[user_id] = profile
+            return replace(profile)
+
+    def set_consent(self, user_id: str, allow: bool) -> UserProfile:
+        with self._lock:
+            profile = UserProfile(user_id=user_id, allow_memory=allow)
+            self._profiles[user_id] = profile
+            return replace(profile)
+
+
+class SQLiteProfileStore(ProfileStore):
+    """Profiles in SQLite (WAL mode) behind a read-through in-process cache.
+
+    Every worker process keeps its own LRU cache. Before a cached profile is
+    returned, the store reads SQLite's ``data_version``, which changes when
+    any other connection (another worker) commits; a change empties the
+    cache, so consent set by one worker is seen by the others on their next
+    lookup. A cache hit costs one pragma and no table read.
+    """
+
+    def __init__(self, db_path: str = PROFILE_DB_PATH, cache_size: int = PROFILE_CACHE_SIZE):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, UserProfile]" = OrderedDict()
+        # One connection per process: data_version is only comparable
+        # between reads on the same connection
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS profiles (
+                    user_id TEXT PRIMARY KEY,
+                    allow_memory INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+        self._data_version = self._read_data_version()
+
+    def get_or_create(self, user_id: str) -> UserProfile:
+        with self._lock:
+            self._check_data_version()
+            profile = self._cache.get(user_id)
+            if profile is not None:
+                self._cache.move_to_end(user_id)
+                return replace(profile)
+
+            row = self._select(user_id)
+            if row is None:
+                now = datetime.now().isoformat()
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO profiles (user_id, allow_memory, created_at, updated_at) "
+                        "VALUES (?, 0, ?, ?)",
+                        (user_id, now, now)
+                    )
+                # Another worker may have created it first, with consent set
+                row = self._select(user_id)
+            profile = UserProfile(user_id=user_id, allow_memory=bool(row[0]))
+            self._cache_put(profile)
+            return replace(profile)
+
+    def set_consent(self, user_id: str, allow: bool) -> UserProfile:
+        now = datetime.now().isoformat()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO profiles (user_id, allow_memory, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (user_id) DO UPDATE SET "
+                    "allow_memory = excluded.allow_memory, updated_at = excluded.updated_at",
+                    (user_id, int(allow), now, now)
+                )
+            profile = UserProfile(user_id=user_id, allow_memory=allow)
+            self._cache_put(profile)
+            return replace(profile)
+
+    def _select(self, user_id: str):
+        return self._conn.execute(
+            "SELECT allow_memory FROM profiles WHERE user_id = ?", (user_id,)
+        ).fetchone()
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_data_version(self):
+        """Drop the cache if another connection has committed since the last check"""
+        version = self._read_data_version()
+        if version != self._data_version:
+            self._data_version = version
+            self._cache.clear()
+
+    def _cache_put(self, profile: UserProfile):
+        self._cache[profile.user_id] = profile
+        self._cache.move_to_end(profile.user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+_store: Optional[ProfileStore] = None
+_store_lock = threading.Lock()
+
+
+def get_profile_store() -> ProfileStore:
+    """Process-wide profile store for the configured ``PROFILE_STORE``"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = InMemoryProfileStore() if PROFILE_STORE == "memory" else SQLiteProfileStore()
+    return _store
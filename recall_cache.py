@@ -0,0 +1,184 @@
+# recall_cache.py
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+RECALL_CACHE_ENABLED = os.environ.get("RECALL_CACHE_ENABLED", "true").lower() == "true"
+RECALL_CACHE_MAX_MB = float(os.environ.get("RECALL_CACHE_MAX_MB", "64"))
+RECALL_CACHE_TTL = float(os.environ.get("RECALL_CACHE_TTL", "300"))
+RECALL_CACHE_VERSIONS_PATH = os.environ.get("RECALL_CACHE_VERSIONS_PATH", "./recall_cache.db")
+
+# Rough per-entry bookkeeping cost on top of the cached text
+_ENTRY_OVERHEAD_BYTES = 256
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class RecallCache:
+    """LRU + TTL cache of recall results with per-bank invalidation.
+
+    Every bank has a version number that writes bump. Entries remember the
+    version they were filled at, so a write makes all of that bank's entries
+    stale at once, including recalls that were already in flight.
+
+    Versions live in a SQLite file shared by every worker process, so a
+    write handled by one worker invalidates the others' entries too. Each
+    process caches the versions it has read, and, as in the rule registry,
+    SQLite's ``data_version`` drops that cache when another worker commits.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = int(RECALL_CACHE_MAX_MB * 1024 * 1024),
+        ttl_seconds: float = RECALL_CACHE_TTL,
+        enabled: bool = RECALL_CACHE_ENABLED,
+        versions_path: str = RECALL_CACHE_VERSIONS_PATH
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        # (bank_id, key) -> (value, version, stored_at, size), oldest first
+        self._entries: OrderedDict = OrderedDict()
+        self._bank_versions: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(versions_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS bank_versions (
+                    bank_id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            """)
+        self._data_version = self._read_data_version()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def bank_version(self, bank_id: str) -> int:
+        with self._lock:
+            return self._version(bank_id)
+
+    def get(self, bank_id: str, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get((bank_id, key))
+            if entry is not None:
+                value, version, stored_at, size = entry
+                fresh = (
+                    version == self._version(bank_id)
+                    and time.monotonic() - stored_at < self.ttl_seconds
+                )
+                if fresh:
+                    self._entries.move_to_end((bank_id, key))
+                    self.hits += 1
+                    return value
+                self._remove((bank_id, key))
+            self.misses += 1
+            return None
+
+    def put(self, bank_id: str, key: Hashable, value: Any, version: int):
+        """Store ``value`` computed while the bank was at ``version``"""
+        if not self.enabled:
+            return
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if version != self._version(bank_id):
+                return  # The bank changed while this recall was running
+            if (bank_id, key) in self._entries:
+                self._remove((bank_id, key))
+            self._entries[(bank_id, key)] = (value, version, time.monotonic(), size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_bank(self, bank_id: str):
+        """Mark every cached recall for ``bank_id`` stale"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO bank_versions (bank_id, version) VALUES (?, 1) "
+                "ON CONFLICT (bank_id) DO UPDATE SET version = version + 1",
+                (bank_id,)
+            )
+            self._bank_versions[bank_id] = self._conn.execute(
+                "SELECT version FROM bank_versions WHERE bank_id = ?", (bank_id,)
+            ).fetchone()[0]
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, full_key):
+        _, _, _, size = self._entries.pop(full_key)
+        self._bytes -= size
+
+    def _version(self, bank_id: str) -> int:
+        """Current version of ``bank_id`` (call with the lock held)"""
+        data_version = self._read_data_version()
+        if data_version != self._data_version:
+            # Another worker has invalidated a bank since the last check
+            self._data_version = data_version
+            self._bank_versions.clear()
+        version = self._bank_versions.get(bank_id)
+        if version is None:
+            row = self._conn.execute(
+                "SELECT version FROM bank_versions WHERE bank_id = ?", (bank_id,)
+            ).fetchone()
+            version = self._bank_versions[bank_id] = row[0] if row else 0
+        return version
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def _estimate_size(value: Any) -> int:
+    """Approximate memory held by a cached list of strings or records"""
+    size = _ENTRY_OVERHEAD_BYTES
+    for item in value:
+        text = item if isinstance(item, str) else getattr(item, "text", "")
+        size += sys.getsizeof(text) + 64
+    return size
+
+
+_recall_cache: Optional[RecallCache] = None
+_recall_cache_lock = threading.Lock()
+
+
+def get_recall_cache() -> RecallCache:
+    """Process-wide recall cache shared by all memory banks"""
+    global _recall_cache
+    with _recall_cache_lock:
+        if _recall_cache is None:
+            _recall_cache = RecallCache()
+    return _recall_cache
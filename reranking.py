@@ -0,0 +1,144 @@
+# reranking.py
+import os
+from abc import ABC, abstractmethod
+from dataclasses import replace
+from datetime import datetime
+from typing import Dict, List, Optional, Type
+
+import numpy as np
+
+from embeddings import HashingEmbedder
+from memory_metadata import MemoryRecord, strip_metadata_header
+
+RERANK_STRATEGY = os.environ.get("RERANK_STRATEGY", "fusion")  # "fusion" or "none"
+RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", "10"))  # Recalled per bank
+RERANK_TOP_K = int(os.environ.get("RERANK_TOP_K", "12"))  # Kept across all banks
+RERANK_RRF_K = int(os.environ.get("RERANK_RRF_K", "60"))
+RERANK_RECENCY_WEIGHT = float(os.environ.get("RERANK_RECENCY_WEIGHT", "0.2"))
+RERANK_HALF_LIFE_DAYS = float(os.environ.get("RERANK_HALF_LIFE_DAYS", "90"))
+
+# Score multiplier per importance level
+IMPORTANCE_WEIGHTS = {"critical": 1.5, "high": 1.25, "normal": 1.0, "low": 0.75}
+
+
+class Reranker(ABC):
+    """Reorders and trims recall results merged from several banks.
+
+    ``recalled`` maps a source name to records in the bank's own relevance
+    order; the result keeps at most ``limits[source]`` records per source
+    and ``top_k`` overall, best first, with ``score`` set where computed.
+    """
+
+    def __init__(self, top_k: int = RERANK_TOP_K):
+        self.top_k = top_k
+
+    @abstractmethod
+    def rerank(
+        self,
+        query: str,
+        recalled: Dict[str, List[MemoryRecord]],
+        limits: Dict[str, int]
+    ) -> Dict[str, List[MemoryRecord]]:
+        ...
+
+
+class PassthroughReranker(Reranker):
+    """Keeps each bank's own order; only applies the limits"""
+
+    def rerank(self, query, recalled, limits):
+        return {name: records[:limits.get(name, self.top_k)] for name, records in recalled.items()}
+
+
+class FusionReranker(Reranker):
+    """Reciprocal rank fusion with recency decay and importance weighting.
+
+    Two rankings are fused: each bank's relevance order from Hindsight, and
+    cosine similarity between the query and every merged candidate under a
+    local hashing embedding (so results from different banks become
+    comparable). The fused score is blended with an exponential recency
+    decay and multiplied by an importance weight (``rrf`` is min-max scaled
+    over the candidates)::
+
+        score = ((1 - w) * rrf + w * 0.5 ** (age_days / half_life)) * importance
+
+    All scoring runs as NumPy array operations over the merged candidates.
+    """
+
+    def __init__(
+        self,
+        top_k: int = RERANK_TOP_K,
+        rrf_k: int = RERANK_RRF_K,
+        recency_weight: float = RERANK_RECENCY_WEIGHT,
+        half_life_days: float = RERANK_HALF_LIFE_DAYS,
+        importance_weights: Optional[Dict[str, float]] = None
+    ):
+        super().__init__(top_k)
+        self.rrf_k = rrf_k
+        self.recency_weight = recency_weight
+        self.half_life_days = half_life_days
+        self.importance_weights = importance_weights or IMPORTANCE_WEIGHTS
+        self.embedder = HashingEmbedder()
+
+    def rerank(self, query, recalled, limits):
+        sources, records, bank_ranks = [], [], []
+        for name, bank_records in recalled.items():
+            for rank, record in enumerate(bank_records):
+                sources.append(name)
+                records.append(record)
+                bank_ranks.append(rank)
+        if not records:
+            return {name: [] for name in recalled}
+
+        scores = self.score(query, records, np.asarray(bank_ranks))
+
+        # Best first, then per-source limits, then the overall cut
+        kept: Dict[str, List[MemoryRecord]] = {name: [] for name in recalled}
+        total = 0
+        for i in np.argsort(-scores, kind="stable"):
+            if total >= self.top_k:
+                break
+            name = sources[i]
+            if len(kept[name]) >= limits.get(name, self.top_k):
+                continue
+            kept[name].append(replace(records[i], score=float(scores[i])))
+            total += 1
+        return kept
+
+    def score(self, query: str, records: List[MemoryRecord], bank_ranks: np.ndarray) -> np.ndarray:
+        """Fused score for each record (higher is better)"""
+        texts = [strip_metadata_header(record.text) for record in records]
+        similarity = self.embedder.embed_many(texts) @ self.embedder.embed(query)
+        similarity_ranks = np.empty(len(records), dtype=np.int64)
+        similarity_ranks[np.argsort(-similarity, kind="stable")] = np.arange(len(records))
+
+        rrf = 1.0 / (self.rrf_k + bank_ranks + 1) + 1.0 / (self.rrf_k + similarity_ranks + 1)
+        # Fused scores of a few candidates differ only slightly; stretch them
+        # to [0, 1] so they are not swamped by the recency term
+        spread = rrf.max() - rrf.min()
+        rrf = (rrf - rrf.min()) / spread if spread > 0 else np.ones_like(rrf)
+
+        now = datetime.now()
+        ages = np.array([
+            (now - record.date).total_seconds() / 86400 if record.date else np.inf
+            for record in records
+        ])
+        recency = np.power(0.5, np.maximum(ages, 0) / self.half_life_days)
+
+        importance = np.array([
+            self.importance_weights.get(record.importance, 1.0) for record in records
+        ])
+        return ((1 - self.recency_weight) * rrf + self.recency_weight * recency) * importance
+
+
+RERANKERS: Dict[str, Type[Reranker]] = {
+    "fusion": FusionReranker,
+    "none": PassthroughReranker,
+}
+
+
+def get_reranker(strategy: Optional[str] = None, **kwargs) -> Reranker:
+    """Reranker for ``strategy`` (defaults to ``RERANK_STRATEGY``)"""
+    strategy = strategy or RERANK_STRATEGY
+    if strategy not in RERANKERS:
+        raise ValueError(f"Unknown rerank strategy: {strategy}. Available: {sorted(RERANKERS)}")
+    return RERANKERS[strategy](**kwargs)
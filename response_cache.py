@@ -0,0 +1,174 @@
+# response_cache.py
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from embeddings import get_embedder
+from recall_cache import get_recall_cache
+
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "2048"))
+SEMANTIC_CACHE_TTL = float(os.environ.get("SEMANTIC_CACHE_TTL", "3600"))
+
+# Scope of answers whose prompt held no user-specific memory
+SHARED_SCOPE = "*"
+
+
+@dataclass
+class _Entry:
+    question: str
+    answer: str
+    embedding: np.ndarray
+    bank_versions: Dict[str, int]
+    stored_at: float
+
+
+class SemanticResponseCache:
+    """Caches LLM answers for similar questions asked against the same context.
+
+    Entries are grouped by ``(scope, context hash)``: an answer is only reused
+    when the recalled context in the prompt is identical, and the question's
+    embedding is within ``threshold`` cosine similarity of a cached one.
+    ``scope`` is the user id whenever user memory contributed to the prompt,
+    so personal answers are never served to another user. Entries also record
+    the recall-cache version of every bank they drew on, so a write to any of
+    those banks retires them.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = SEMANTIC_CACHE_TTL,
+        enabled: bool = SEMANTIC_CACHE_ENABLED
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        # (scope, prompt hash) -> entries, least recently used first
+        self._buckets: OrderedDict = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(
+        self,
+        question: str,
+        context: str,
+        bank_ids: Iterable[str],
+        user_id: Optional[str] = None
+    ) -> Optional[str]:
+        """Cached answer for ``question`` asked with prompt ``context``, if any"""
+        if not self.enabled:
+            return None
+        key = (user_id or SHARED_SCOPE, _context_hash(context))
+        embedding = get_embedder().embed(question)
+        versions = self._bank_versions(bank_ids)
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket:
+                live = [
+                    e for e in bucket
+                    if e.bank_versions == versions and now - e.stored_at < self.ttl_seconds
+                ]
+                self._size -= len(bucket) - len(live)
+                bucket[:] = live
+            if bucket:
+                similarities = np.stack([e.embedding for e in bucket]) @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._buckets.move_to_end(key)
+                    self.hits += 1
+                    return bucket[best].answer
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        question: str,
+        context: str,
+        answer: str,
+        bank_ids: Iterable[str],
+        user_id: Optional[str] = None,
+        bank_versions: Optional[Dict[str, int]] = None
+    ):
+        """Remember ``answer``. Pass ``bank_versions`` captured before recall
+        so writes that raced with this turn still invalidate the entry.
+        """
+        if not self.enabled:
+            return
+        key = (user_id or SHARED_SCOPE, _context_hash(context))
+        entry = _Entry(
+            question=question,
+            answer=answer,
+            embedding=get_embedder().embed(question),
+            bank_versions=bank_versions or self._bank_versions(bank_ids),
+            stored_at=time.monotonic(),
+        )
+        with self._lock:
+            self._buckets.setdefault(key, []).append(entry)
+            self._buckets.move_to_end(key)
+            self._size += 1
+            while self._size > self.max_entries:
+                _, evicted = self._buckets.popitem(last=False)
+                self._size -= len(evicted)
+
+    async def alookup(self, *args, **kwargs) -> Optional[str]:
+        """``lookup`` off the event loop (embedding may be a network call)"""
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self.lookup, *args, **kwargs)
+
+    async def astore(self, *args, **kwargs):
+        """``store`` off the event loop"""
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self.store, *args, **kwargs)
+
+    def bank_versions(self, bank_ids: Iterable[str]) -> Dict[str, int]:
+        """Current versions of ``bank_ids``, to pass to ``store`` later"""
+        return self._bank_versions(bank_ids)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _bank_versions(self, bank_ids: Iterable[str]) -> Dict[str, int]:
+        recall_cache = get_recall_cache()
+        return {bank_id: recall_cache.bank_version(bank_id) for bank_id in sorted(set(bank_ids))}
+
+
+def _context_hash(context: str) -> str:
+    return hashlib.sha256(context.encode("utf-8")).hexdigest()
+
+
+_response_cache: Optional[SemanticResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> SemanticResponseCache:
+    """Process-wide semantic response cache"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = SemanticResponseCache()
+    return _response_cache
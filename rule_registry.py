@@ -0,0 +1,195 @@
+# rule_registry.py
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from chunk_index import chunk_hash
+from memory_metadata import MemoryRecord, version_key
+
+RULE_REGISTRY_PATH = os.environ.get("RULE_REGISTRY_PATH", "./rule_registry.db")
+
+# Tag on the "[SUPERSEDED BY vX]" copies older releases retained for each old version
+SUPERSEDED_TAG = "superseded"
+
+
+@dataclass
+class RuleVersion:
+    rule_id: str
+    version: str
+    memory_id: Optional[str]  # Set when the backend reports ids on retain
+    content_hash: str
+    registered_at: str
+
+
+class RuleRegistry:
+    """Every retained version of each rule, per bank, in version order.
+
+    The current version of a rule is the highest by ``version_key`` (so
+    "10.0" supersedes "9.0"), whatever order versions were registered in.
+    Current versions are cached per bank and looked up in O(1); as with the
+    profile store, SQLite's ``data_version`` empties the cache when another
+    worker registers a version. Recall uses ``filter_superseded`` to drop
+    old versions of a rule, so updates no longer need to retain marked
+    copies of them.
+    """
+
+    def __init__(self, db_path: str = RULE_REGISTRY_PATH):
+        self.db_path = db_path
+        self._current: Dict[str, Dict[str, Tuple[str, Tuple]]] = {}
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS rule_versions (
+                    bank_id TEXT NOT NULL,
+                    rule_id TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    memory_id TEXT,
+                    content_hash TEXT NOT NULL,
+                    registered_at TEXT NOT NULL,
+                    PRIMARY KEY (bank_id, rule_id, version)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS current_rules (
+                    bank_id TEXT NOT NULL,
+                    rule_id TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    PRIMARY KEY (bank_id, rule_id)
+                )
+            """)
+        self._data_version = self._read_data_version()
+
+    def register(
+        self,
+        bank_id: str,
+        rule_id: str,
+        version: str,
+        content: str,
+        memory_id: Optional[str] = None
+    ) -> List[RuleVersion]:
+        """Record a retained rule version; returns the rule's versions that are now superseded"""
+        return self.register_many(bank_id, [(rule_id, version, content, memory_id)])
+
+    def register_many(
+        self,
+        bank_id: str,
+        entries: Iterable[Tuple[str, str, str, Optional[str]]]
+    ) -> List[RuleVersion]:
+        """Record many ``(rule_id, version, content, memory_id)`` versions in one transaction.
+
+        Returns every version of the affected rules that is now superseded.
+        """
+        now = datetime.now().isoformat()
+        rows = [
+            (bank_id, rule_id, version, memory_id, chunk_hash(content), now)
+            for rule_id, version, content, memory_id in entries
+        ]
+        rule_ids = list(dict.fromkeys(row[1] for row in rows))
+        superseded: List[RuleVersion] = []
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO rule_versions "
+                    "(bank_id, rule_id, version, memory_id, content_hash, registered_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (bank_id, rule_id, version) DO UPDATE SET "
+                    "memory_id = excluded.memory_id, content_hash = excluded.content_hash, "
+                    "registered_at = excluded.registered_at",
+                    rows
+                )
+                current = {}
+                for rule_id in rule_ids:
+                    versions = self._select_versions(bank_id, rule_id)
+                    current[rule_id] = versions[-1].version
+                    superseded.extend(versions[:-1])
+                self._conn.executemany(
+                    "INSERT INTO current_rules (bank_id, rule_id, version) VALUES (?, ?, ?) "
+                    "ON CONFLICT (bank_id, rule_id) DO UPDATE SET version = excluded.version",
+                    [(bank_id, rule_id, version) for rule_id, version in current.items()]
+                )
+            cached = self._current.get(bank_id)
+            if cached is not None:
+                for rule_id, version in current.items():
+                    cached[rule_id] = (version, version_key(version))
+            return superseded
+
+    def versions(self, bank_id: str, rule_id: str) -> List[RuleVersion]:
+        """All registered versions of a rule, oldest first"""
+        with self._lock:
+            return self._select_versions(bank_id, rule_id)
+
+    def current_version(self, bank_id: str, rule_id: str) -> Optional[str]:
+        current = self._current_rules(bank_id).get(rule_id)
+        return current[0] if current else None
+
+    def filter_superseded(self, bank_id: str, records: List[MemoryRecord]) -> List[MemoryRecord]:
+        """Drop records of a registered rule other than its current version.
+
+        A record belongs to a rule when it is tagged with the rule id. Old
+        "[SUPERSEDED BY ...]" copies are dropped along with the versions.
+        """
+        current = self._current_rules(bank_id)
+        if not current:
+            return records
+        return [record for record in records if not self._is_superseded(record, current)]
+
+    def _is_superseded(self, record: MemoryRecord, current: Dict[str, Tuple[str, Tuple]]) -> bool:
+        for tag in record.tags:
+            rule = current.get(tag)
+            if rule is None:
+                continue
+            if SUPERSEDED_TAG in record.tags:
+                return True
+            if record.version and version_key(record.version) != rule[1]:
+                return True
+        return False
+
+    def _current_rules(self, bank_id: str) -> Dict[str, Tuple[str, Tuple]]:
+        """rule_id -> (current version, its sort key) for a bank, cached"""
+        with self._lock:
+            self._check_data_version()
+            current = self._current.get(bank_id)
+            if current is None:
+                rows = self._conn.execute(
+                    "SELECT rule_id, version FROM current_rules WHERE bank_id = ?", (bank_id,)
+                ).fetchall()
+                current = {rule_id: (version, version_key(version)) for rule_id, version in rows}
+                self._current[bank_id] = current
+            return current
+
+    def _select_versions(self, bank_id: str, rule_id: str) -> List[RuleVersion]:
+        rows = self._conn.execute(
+            "SELECT rule_id, version, memory_id, content_hash, registered_at "
+            "FROM rule_versions WHERE bank_id = ? AND rule_id = ?",
+            (bank_id, rule_id)
+        ).fetchall()
+        return sorted((RuleVersion(*row) for row in rows), key=lambda v: version_key(v.version))
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_data_version(self):
+        """Drop the cache if another connection has committed since the last check"""
+        version = self._read_data_version()
+        if version != self._data_version:
+            self._data_version = version
+            self._current.clear()
+
+
+_registry: Optional[RuleRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_rule_registry() -> RuleRegistry:
+    """Process-wide rule registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = RuleRegistry()
+    return _registry
@@ -50,9 +50,31 @@ if ! curl -s http://localhost:8888/health > /dev/null 2>&1; then
     fi
 fi
 
-echo "✅ Starting Flask application..."
-echo "   Web interface: http://localhost:5001"
+# --dev runs the Flask debug server with auto-reload
+if [ "$1" == "--dev" ]; then
+    echo "✅ Starting Flask development server..."
+    echo "   Web interface: http://localhost:5001"
+    echo ""
+    exec python app.py
+fi
+
+echo "✅ Starting ASGI server (uvicorn)..."
+echo "   Web interface: http://localhost:${PORT:-5001}"
 echo ""
 
-python app.py
+# One worker by default. More workers (WEB_WORKERS) share the job journal,
+# write-behind journals and recall cache invalidation through local files,
+# so keep them on one host. The embedded store (MEMORY_BACKEND=local) has a
+# single writer per bank, so it runs with one worker only
+if [ "${MEMORY_BACKEND:-hindsight}" == "local" ] && [ "${WEB_WORKERS:-1}" -gt 1 ]; then
+    echo "❌ Error: MEMORY_BACKEND=local supports a single worker (WEB_WORKERS=1)"
+    exit 1
+fi
+
+exec uvicorn asgi:app \
+    --host 0.0.0.0 \
+    --port "${PORT:-5001}" \
+    --workers "${WEB_WORKERS:-1}" \
+    --timeout-graceful-shutdown 30 \
+    --no-access-log
 
@@ -0,0 +1,63 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunk_index import ChunkIndex, chunk_hash
+from chunking import Chunker
+from document_ingestion import DocumentIngestion
+from memory_layer import RetainReport, RetainResult
+
+
+class LineChunker(Chunker):
+    """Every line is its own chunk"""
+
+    def _units(self, pages):
+        for page in pages:
+            for line in page.splitlines():
+                yield line, True
+
+
+class FakeMemory:
+    bank_id = "company-kb"
+
+    def __init__(self):
+        self.retained = []
+
+    def retain_many(self, items, **kwargs):
+        items = list(items)
+        self.retained.extend(item["content"] for item in items)
+        return RetainReport(results=[RetainResult(index=i, ok=True) for i in range(len(items))])
+
+
+def test_new_version_replaces_the_sources_old_rows(tmp_path):
+    index = ChunkIndex(str(tmp_path / "chunk_index.db"))
+    index.record("bank", "rules.md", "1.0", [(chunk_hash("a"), 0), (chunk_hash("b"), 1), (chunk_hash("c"), 2)])
+    index.record("bank", "rules.md", "2.0", [(chunk_hash("a"), 0), (chunk_hash("d"), 1)])
+
+    assert index.positions("bank", "rules.md") == {0: chunk_hash("a"), 1: chunk_hash("d")}
+    assert index.present("bank", [chunk_hash(text) for text in "abcd"]) == {chunk_hash("a"), chunk_hash("d")}
+
+
+def test_hashes_owned_by_another_source_are_kept(tmp_path):
+    index = ChunkIndex(str(tmp_path / "chunk_index.db"))
+    index.record("bank", "a.md", "1.0", [(chunk_hash("shared"), 0)])
+    index.record("bank", "b.md", "1.0", [(chunk_hash("shared"), 3)])
+    index.record("bank", "b.md", "2.0", [])
+
+    assert index.positions("bank", "a.md") == {0: chunk_hash("shared")}
+    assert index.present("bank", [chunk_hash("shared")]) == {chunk_hash("shared")}
+
+
+def test_reingest_counts_only_against_the_previous_version(tmp_path):
+    memory = FakeMemory()
+    ingestion = DocumentIngestion(
+        memory, chunker=LineChunker(max_tokens=64, overlap_tokens=0),
+        index=ChunkIndex(str(tmp_path / "chunk_index.db"))
+    )
+    ingestion.ingest_document("rules.md", version="1.0", content="rule one\nrule two\nrule three")
+    ingestion.ingest_document("rules.md", version="2.0", content="rule one\nrule 2")
+    report = ingestion.ingest_document("rules.md", version="3.0", content="rule one\nrule 2\nrule four")
+
+    assert (report.skipped, report.changed, report.added) == (2, 0, 1)
+    assert memory.retained == ["rule one", "rule two", "rule three", "rule 2", "rule four"]
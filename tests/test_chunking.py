@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chunking import MarkdownChunker, iter_sentences
+
+DFX_PDF = os.path.join(ROOT, "uploads", "Smart_Environmental_Monitoring_Device_DFX.pdf")
+
+
+def test_bundled_pdf_keeps_each_rule_on_one_line():
+    PyPDF2 = pytest.importorskip("PyPDF2")
+    with open(DFX_PDF, "rb") as f:
+        pages = [page.extract_text() or "" for page in PyPDF2.PdfReader(f).pages]
+
+    chunks = list(MarkdownChunker().chunk(pages))
+
+    rule = "2. Limit PCB layers to ≤ 4 layers unless signal integrity requires more."
+    assert sum(rule in chunk.split("\n") for chunk in chunks) == 1
+    # Extraction puts a whitespace-only line between words; it must not split units
+    lines = [line for chunk in chunks for line in chunk.split("\n")]
+    assert sum(len(line.split()) for line in lines) / len(lines) > 5
+
+
+def test_blank_lines_and_headings_still_split_units():
+    text = "# Solder Mask\nFirst sentence. Second one!\n\nNew paragraph\n- list item"
+    assert list(MarkdownChunker().chunk([text])) == [
+        "# Solder Mask\nFirst sentence.\nSecond one!\nNew paragraph\n- list item"
+    ]
+
+
+def test_list_numbers_do_not_end_sentences():
+    assert list(iter_sentences(["Rules: 1. Use standard parts. 12. Keep it simple."])) == [
+        "Rules: 1. Use standard parts.",
+        "12. Keep it simple.",
+    ]
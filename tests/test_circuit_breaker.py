@@ -0,0 +1,99 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def open_breaker(reset_timeout=0.05):
+    breaker = CircuitBreaker("http://hindsight.test", failure_threshold=2, reset_timeout=reset_timeout)
+    for _ in range(2):
+        breaker.record_failure(ConnectionError("refused"))
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_cancelled_probe_reopens_the_circuit():
+    breaker = open_breaker()
+    time.sleep(0.06)
+
+    async def slow_recall():
+        await asyncio.sleep(10)
+
+    async def probe_with_timeout():
+        await asyncio.wait_for(breaker.acall(slow_recall), timeout=0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(probe_with_timeout())
+    assert breaker.state == OPEN
+
+    async def answer():
+        return "ok"
+
+    # The next call is let through as a new probe and closes the circuit
+    assert asyncio.run(breaker.acall(answer)) == "ok"
+    assert breaker.state == CLOSED
+
+
+def test_only_one_probe_while_half_open():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure(ConnectionError("refused"))
+    assert breaker.state == OPEN
+
+
+def test_abandoned_call_that_is_not_a_probe_changes_nothing():
+    breaker = CircuitBreaker("http://hindsight.test", failure_threshold=2, reset_timeout=0.05)
+    assert breaker.before_call() is False
+    breaker.abandon(False)
+    assert breaker.state == CLOSED
+
+
+class ApiError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+def test_only_transport_errors_and_5xx_are_outages():
+    from circuit_breaker import is_outage
+
+    assert is_outage(ConnectionError("refused"))
+    assert is_outage(asyncio.TimeoutError())
+    assert is_outage(ApiError(503))
+    assert is_outage(ApiError(429))
+    assert not is_outage(ApiError(404))
+    assert not is_outage(TypeError("bad argument"))
+    assert not is_outage(ValueError("bad response"))
+
+
+def test_local_errors_do_not_trip_the_breaker():
+    breaker = CircuitBreaker("http://hindsight.test", failure_threshold=2, reset_timeout=0.05)
+    for _ in range(5):
+        breaker.record_failure(TypeError("bad argument"))
+    assert breaker.state == CLOSED
+
+
+def test_pool_wait_does_not_count_as_a_failure():
+    import hindsight_pool
+
+    class SlowPool:
+        base_url = "http://pool-contention.test"
+
+        def connection(self):
+            raise TimeoutError("No Hindsight connection available")
+
+    client = hindsight_pool.PooledHindsightClient(SlowPool())
+    for _ in range(10):
+        with pytest.raises(TimeoutError):
+            client.recall(bank_id="b", query="q")
+    assert client._breaker.state == CLOSED
@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_assembly import ContextAssembler
+from memory_metadata import MemoryRecord
+from tokenizer import count_tokens
+
+
+def test_truncated_memories_stay_within_the_budgets():
+    long_text = " ".join(f"rule{i} requires clearance" for i in range(200))
+    recalled = {
+        "company": [MemoryRecord(text=long_text, importance="critical")],
+        "user": [MemoryRecord(text=long_text + " user")],
+    }
+    assembler = ContextAssembler(budget=120, source_budgets={"company": 80, "user": 100}, min_snippet_tokens=10)
+
+    assembled = assembler.assemble(recalled)
+
+    for name, usage in assembled.usage.items():
+        assert usage.truncated == 1
+        assert usage.tokens <= usage.budget
+        # The reported count is the real size of what reached the prompt, ellipsis included
+        section = assembled.sections[name]
+        assert section.endswith("…")
+        assert usage.tokens == count_tokens(section[len("- "):])
+    assert assembled.tokens <= assembled.budget
+    assert assembled.tokens == sum(usage.tokens for usage in assembled.usage.values())
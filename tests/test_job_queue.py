@@ -0,0 +1,118 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_queue import (
+    CANCELLED, QUEUED, RUNNING, SUCCEEDED,
+    JobCancelled, JobContext, JobStore, LocalJobQueue,
+)
+
+
+def wait_for_status(queue, job_id, status, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is {queue.get(job_id)['status']}, not {status}")
+
+
+def set_heartbeat(store, job_id, heartbeat_at):
+    with store._connect() as conn:
+        conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (heartbeat_at, job_id))
+
+
+def owner_of(store, job_id):
+    with store._connect() as conn:
+        return conn.execute("SELECT owner FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+
+def test_a_job_is_claimed_only_once(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    first, second = JobStore(path), JobStore(path)
+    job_id = first.create("ingest", {"path": "doc.pdf"})
+
+    assert first.claim(job_id, "worker-a")
+    assert not second.claim(job_id, "worker-b")
+    assert second.get(job_id)["status"] == RUNNING
+    assert owner_of(second, job_id) == "worker-a"
+
+
+def test_only_jobs_with_an_expired_lease_are_requeued(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    live, stale = store.create("ingest", {}), store.create("ingest", {})
+    store.claim(live, "worker-a")
+    store.claim(stale, "worker-b")
+    set_heartbeat(store, live, time.time() - 100)
+    set_heartbeat(store, stale, time.time() - 100)
+
+    store.heartbeat("worker-a")
+    assert store.requeue_stale(lease_seconds=60) == [stale]
+    assert store.get(live)["status"] == RUNNING
+    assert store.get(stale)["status"] == QUEUED
+    assert owner_of(store, stale) is None
+    # The worker that lost the lease cannot record an outcome any more
+    assert not store.transition(stale, RUNNING, held_by="worker-b", status=SUCCEEDED)
+
+
+def test_resume_unfinished_runs_jobs_of_a_stopped_worker(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    queued, orphaned = store.create("echo", {"n": 1}), store.create("echo", {"n": 2})
+    store.claim(orphaned, "stopped-worker")
+    set_heartbeat(store, orphaned, time.time() - 100)
+
+    queue = LocalJobQueue(store, max_workers=2, lease_seconds=60)
+    queue.register("echo", lambda params, ctx: params["n"])
+    try:
+        assert queue.resume_unfinished() == 2
+        assert wait_for_status(queue, queued, SUCCEEDED)["result"] == 1
+        assert wait_for_status(queue, orphaned, SUCCEEDED)["result"] == 2
+        assert owner_of(store, orphaned) == queue.owner
+    finally:
+        queue.close()
+
+
+def test_cancelling_a_running_job_stops_it_at_its_next_check(tmp_path):
+    queue = LocalJobQueue(JobStore(str(tmp_path / "jobs.db")), max_workers=1)
+    started = threading.Event()
+
+    def handler(params, ctx):
+        started.set()
+        while not ctx.is_cancelled():
+            time.sleep(0.01)
+        raise JobCancelled()
+
+    queue.register("loop", handler)
+    try:
+        job_id = queue.submit("loop", {})
+        assert started.wait(5)
+        assert queue.cancel(job_id)["cancel_requested"]
+        wait_for_status(queue, job_id, CANCELLED)
+    finally:
+        queue.close()
+
+
+def test_cancelling_a_queued_job_keeps_it_from_running(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    queue = LocalJobQueue(store, max_workers=1)
+    ran = []
+    queue.register("echo", lambda params, ctx: ran.append(params))
+    try:
+        job_id = store.create("echo", {"n": 1})
+        assert queue.cancel(job_id)["status"] == CANCELLED
+        assert queue.resume_unfinished() == 0
+        assert JobContext(store, job_id).is_cancelled()
+        assert not ran
+    finally:
+        queue.close()
+
+
+def test_unknown_jobs_count_as_cancelled(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job_id = store.create("echo", {})
+    assert not JobContext(store, job_id).is_cancelled()
+    assert JobContext(store, "missing").is_cancelled()
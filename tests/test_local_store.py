@@ -0,0 +1,63 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_store import LocalBank, LocalMemoryStore
+
+DIM = 8
+
+
+def vectors(n):
+    return np.ones((n, DIM), dtype=np.float32)
+
+
+def record(text):
+    return {"text": text, "context": None, "metadata": {}, "tags": [], "document_id": None, "mentioned_at": None}
+
+
+def test_second_handle_on_a_bank_is_refused(tmp_path):
+    path = str(tmp_path / "bank")
+    first = LocalBank(path, DIM)
+    assert first.add([record("from A")], vectors(1)) == [0]
+
+    with pytest.raises(RuntimeError, match="already open"):
+        LocalBank(path, DIM)
+
+    first.close()
+    second = LocalBank(path, DIM)
+    assert second.add([record("from B")], vectors(1)) == [1]
+    assert [second.get(seq)["text"] for seq in (0, 1)] == ["from A", "from B"]
+    second.close()
+
+
+def test_store_keeps_memories_across_restarts_and_hides_tombstoned_ones(tmp_path):
+    store = LocalMemoryStore(root=str(tmp_path), compact_interval=0)
+    ids = store.retain_batch("user-alice", [{"content": "DFX-2 v1.0"}, {"content": "DFX-2 v2.0"}]).memory_ids
+    assert store.tombstone("user-alice", [ids[0]]) == 1
+    store.close()
+
+    store = LocalMemoryStore(root=str(tmp_path), compact_interval=0)
+    texts = [r.text for r in store.recall("user-alice", "DFX-2").results]
+    assert texts == ["DFX-2 v2.0"]
+    store.close()
+
+
+def test_evicted_bank_can_be_reopened(tmp_path):
+    store = LocalMemoryStore(root=str(tmp_path), compact_interval=0, max_open_banks=1)
+    for bank_id in ("user-a", "user-b", "user-a"):
+        store.retain(bank_id, content=f"note for {bank_id}")
+    assert len(store.recall("user-a", "note").results) == 2
+    store.close()
+
+
+def test_bank_ids_cannot_escape_the_root(tmp_path):
+    store = LocalMemoryStore(root=str(tmp_path), compact_interval=0)
+    for bank_id in ("user-../../../pwned", "../user-alice", "/etc"):
+        path = store.bank_path(bank_id)
+        assert os.path.dirname(path) == os.path.realpath(str(tmp_path))
+        assert os.path.basename(path).startswith("_")
+    store.close()
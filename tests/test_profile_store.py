@@ -0,0 +1,34 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profile_store import SQLiteProfileStore
+
+
+def test_consent_set_by_one_worker_is_seen_by_the_others(tmp_path):
+    path = str(tmp_path / "profiles.db")
+    worker_a, worker_b = SQLiteProfileStore(path), SQLiteProfileStore(path)
+    # Warm both caches
+    assert not worker_a.get_or_create("alice").allow_memory
+    assert not worker_b.get_or_create("alice").allow_memory
+
+    worker_a.set_consent("alice", True)
+    assert worker_b.get_or_create("alice").allow_memory
+
+    worker_b.set_consent("alice", False)
+    assert not worker_a.get_or_create("alice").allow_memory
+
+
+def test_cached_profiles_are_copies(tmp_path):
+    store = SQLiteProfileStore(str(tmp_path / "profiles.db"))
+    store.get_or_create("alice").allow_memory = True
+    assert not store.get_or_create("alice").allow_memory
+
+
+def test_cache_is_bounded(tmp_path):
+    store = SQLiteProfileStore(str(tmp_path / "profiles.db"), cache_size=2)
+    for user_id in ("alice", "bob", "carol"):
+        store.get_or_create(user_id)
+    assert list(store._cache) == ["bob", "carol"]
+    assert not store.get_or_create("alice").allow_memory
@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recall_cache import RecallCache
+
+
+def test_invalidation_in_one_worker_reaches_the_others(tmp_path):
+    path = str(tmp_path / "versions.db")
+    worker_a, worker_b = RecallCache(versions_path=path), RecallCache(versions_path=path)
+    version = worker_a.bank_version("user-alice")
+    worker_a.put("user-alice", "dfx-2", ["DFX-2 v1.0"], version)
+    worker_a.put("user-bob", "dfx-2", ["bob's DFX-2"], worker_a.bank_version("user-bob"))
+    assert worker_a.get("user-alice", "dfx-2") == ["DFX-2 v1.0"]
+
+    worker_b.invalidate_bank("user-alice")
+
+    assert worker_a.get("user-alice", "dfx-2") is None
+    assert worker_a.get("user-bob", "dfx-2") == ["bob's DFX-2"]
+    assert worker_a.bank_version("user-alice") == worker_b.bank_version("user-alice") == version + 1
+
+
+def test_recall_started_before_an_invalidation_is_not_cached(tmp_path):
+    path = str(tmp_path / "versions.db")
+    worker_a, worker_b = RecallCache(versions_path=path), RecallCache(versions_path=path)
+    version = worker_a.bank_version("user-alice")
+
+    worker_b.invalidate_bank("user-alice")
+    worker_a.put("user-alice", "dfx-2", ["DFX-2 v1.0"], version)
+
+    assert worker_a.get("user-alice", "dfx-2") is None
@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_metadata import MemoryRecord, version_key
+from rule_registry import SUPERSEDED_TAG, RuleRegistry
+
+
+@pytest.mark.parametrize("older, newer", [
+    ("9.0", "10.0"),
+    ("1.2", "1.10"),
+    ("1.0a", "1.0.1"),
+    ("2.0-rc1", "2.0"),
+    ("2.0-rc1", "2.0-rc2"),
+    ("2.0", "2.0.1"),
+])
+def test_version_key_orders_numerically(older, newer):
+    assert version_key(older) < version_key(newer)
+
+
+@pytest.mark.parametrize("version", ["1.2.0", "v1.2", "V1.2.0.0", " 1.2 "])
+def test_version_key_treats_equivalent_spellings_as_equal(version):
+    assert version_key(version) == version_key("1.2")
+
+
+def rule(version, rule_id="DFX-2", tags=()):
+    return MemoryRecord(text=f"{rule_id} {version}", version=version, tags=[rule_id, *tags])
+
+
+def test_register_returns_superseded_versions_whatever_the_order(tmp_path):
+    registry = RuleRegistry(str(tmp_path / "rule_registry.db"))
+    assert registry.register("kb", "DFX-2", "10.0", "ten", memory_id="m10") == []
+
+    superseded = registry.register("kb", "DFX-2", "9.0", "nine", memory_id="m9")
+
+    assert [(v.version, v.memory_id) for v in superseded] == [("9.0", "m9")]
+    assert registry.current_version("kb", "DFX-2") == "10.0"
+
+
+def test_filter_superseded_keeps_only_the_current_version(tmp_path):
+    registry = RuleRegistry(str(tmp_path / "rule_registry.db"))
+    registry.register_many("kb", [("DFX-2", "1.0", "old", None), ("DFX-2", "2.0", "new", None)])
+    records = [
+        rule("1.0"),
+        rule("v2.0.0"),
+        rule("1.0", tags=[SUPERSEDED_TAG]),
+        rule("1.0", rule_id="DFX-9"),  # Not registered: left alone
+        MemoryRecord(text="untagged note"),
+    ]
+
+    kept = registry.filter_superseded("kb", records)
+
+    assert [r.text for r in kept] == ["DFX-2 v2.0.0", "DFX-9 1.0", "untagged note"]
+    # Other banks have their own rules
+    assert registry.filter_superseded("other", records) == records
+
+
+def test_versions_registered_by_another_worker_are_seen(tmp_path):
+    path = str(tmp_path / "rule_registry.db")
+    mine, other = RuleRegistry(path), RuleRegistry(path)
+    mine.register("kb", "DFX-2", "1.0", "old")
+    assert mine.filter_superseded("kb", [rule("1.0")]) == [rule("1.0")]
+
+    other.register("kb", "DFX-2", "2.0", "new")
+
+    assert mine.filter_superseded("kb", [rule("1.0")]) == []
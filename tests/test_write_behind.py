@@ -0,0 +1,51 @@
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import write_behind
+from recall_cache import RecallCache
+from write_behind import WriteBehindBuffer
+
+
+class FakeClient:
+    def __init__(self):
+        self.retained = []
+        self._lock = threading.Lock()
+
+    def retain_batch(self, bank_id, items, **kwargs):
+        with self._lock:
+            self.retained.extend(item["content"] for item in items)
+        return SimpleNamespace(success=True)
+
+
+def test_full_queue_sends_inline_without_losing_counts(tmp_path, monkeypatch):
+    client = FakeClient()
+    cache = RecallCache(versions_path=str(tmp_path / "recall_cache.db"))
+    monkeypatch.setattr(write_behind, "get_client", lambda base_url: client)
+    monkeypatch.setattr(write_behind, "get_recall_cache", lambda: cache)
+    buffer = WriteBehindBuffer(
+        max_queue=2, batch_size=2, block_timeout=0, spill_path=str(tmp_path / "write_behind.jsonl")
+    )
+
+    def submit_many(worker):
+        for i in range(50):
+            buffer.submit("http://hindsight.test", "bank", {"content": f"{worker}-{i}"})
+
+    threads = [threading.Thread(target=submit_many, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    buffer.flush(timeout=10)
+
+    stats = buffer.stats()
+    assert stats["flushed"] == 400
+    assert stats["sync_fallbacks"] > 0
+    assert sorted(client.retained) == sorted(f"{n}-{i}" for n in range(8) for i in range(50))
+
+    buffer.close()
+    # Everything was delivered, so nothing is left to replay
+    assert not list(tmp_path.glob("write_behind.*.jsonl"))
@@ -0,0 +1,80 @@
+# tokenizer.py
+import os
+import re
+from typing import List
+import logging
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_ENCODING = os.environ.get("TOKENIZER_ENCODING", "o200k_base")
+
+# Rough stand-in for BPE tokens: words, numbers and individual punctuation marks
+_APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class Tokenizer:
+    """Local token counter.
+
+    Uses tiktoken when it is installed and its encoding is available offline;
+    otherwise falls back to a regex approximation that is close enough for
+    sizing chunks and prompt budgets.
+    """
+
+    def __init__(self, encoding: str = TOKENIZER_ENCODING):
+        self._encoding = None
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(encoding)
+        except ImportError:
+            pass
+        except Exception as e:
+            logger.warning(f"tiktoken encoding {encoding} unavailable, approximating tokens: {e}")
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(_APPROX_TOKEN_RE.findall(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of ``text`` that fits in ``max_tokens``"""
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else self._encoding.decode(tokens[:max_tokens])
+        for i, match in enumerate(_APPROX_TOKEN_RE.finditer(text)):
+            if i == max_tokens:
+                return text[:match.start()].rstrip()
+        return text
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        """Cut ``text`` into consecutive pieces of at most ``max_tokens``"""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return [
+                self._encoding.decode(tokens[start:start + max_tokens])
+                for start in range(0, len(tokens), max_tokens)
+            ]
+        pieces = []
+        start = 0
+        for i, match in enumerate(_APPROX_TOKEN_RE.finditer(text)):
+            if i and i % max_tokens == 0:
+                pieces.append(text[start:match.start()].strip())
+                start = match.start()
+        pieces.append(text[start:].strip())
+        return [piece for piece in pieces if piece]
+
+
+_tokenizer = None
+
+
+def get_tokenizer() -> Tokenizer:
+    """Process-wide tokenizer (loading an encoding is expensive)"""
+    global _tokenizer
+    if _tokenizer is None:
+        _tokenizer = Tokenizer()
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    return get_tokenizer().count(text)
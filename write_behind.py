@@ -0,0 +1,337 @@
+# write_behind.py
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: no journal locking, run a single worker
+    fcntl = None
+
+from circuit_breaker import get_breaker
+from hindsight_pool import get_client
+from memory_layer import retain_batched
+from metrics import swallowed_error
+from recall_cache import get_recall_cache
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED = os.environ.get("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+WRITE_BEHIND_MAX_QUEUE = int(os.environ.get("WRITE_BEHIND_MAX_QUEUE", "1000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", "20"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get("WRITE_BEHIND_FLUSH_INTERVAL", "1.0"))
+WRITE_BEHIND_BLOCK_TIMEOUT = float(os.environ.get("WRITE_BEHIND_BLOCK_TIMEOUT", "0.5"))
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.environ.get("WRITE_BEHIND_MAX_ATTEMPTS", "3"))
+WRITE_BEHIND_SPILL_PATH = os.environ.get("WRITE_BEHIND_SPILL_PATH", "./write_behind.jsonl")
+# Rewrite the journal with only pending writes once it holds this many records
+WRITE_BEHIND_COMPACT_RECORDS = int(os.environ.get("WRITE_BEHIND_COMPACT_RECORDS", "10000"))
+
+
+def _try_lock(fd: int) -> bool:
+    """Take an exclusive lock on ``fd`` without waiting; False if another process holds it"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+class WriteBehindBuffer:
+    """Acknowledges retains immediately and sends them to Hindsight in batches.
+
+    Every accepted write is first appended to a local spill file, and a
+    "done" record is appended once Hindsight has it, so writes still pending
+    after a crash are replayed on the next start. When the in-memory queue is
+    full, ``submit`` blocks for up to ``block_timeout`` seconds and then
+    writes synchronously, which pushes back on callers instead of growing
+    without bound.
+
+    ``spill_path`` names a family of journals: each process writes its own
+    ``<name>.<pid><ext>`` and holds an exclusive lock on it while running.
+    At start, journals no process holds any more (left by a crashed or
+    stopped worker) are adopted and replayed, so several workers can share
+    one directory without duplicating or losing writes.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = WRITE_BEHIND_MAX_QUEUE,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+        block_timeout: float = WRITE_BEHIND_BLOCK_TIMEOUT,
+        spill_path: str = WRITE_BEHIND_SPILL_PATH,
+        compact_records: int = WRITE_BEHIND_COMPACT_RECORDS
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.base_spill_path = spill_path
+        root, ext = os.path.splitext(spill_path)
+        self.spill_path = f"{root}.{os.getpid()}{ext}"
+        self.compact_records = compact_records
+        self._spill_lock = threading.Lock()
+        # Sends run on the worker and, when the queue is full, on request
+        # threads; one at a time keeps the counters and requeues consistent
+        self._send_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.flushed = 0
+        self.dropped = 0
+        self.sync_fallbacks = 0
+        self.deferred = 0
+
+        # Writes accepted but not yet delivered, mirrored from the journal
+        self._live: Dict[str, Dict[str, Any]] = {}
+        self._records = 0
+
+        with self._directory_lock():
+            orphans = self._orphaned_journals()
+            pending = self._load_spill(orphans)
+            self._rewrite_spill()
+            for path in orphans:
+                if path != self.spill_path:
+                    os.remove(path)
+        # Replayed writes were already accepted, so they may exceed max_queue
+        self._queue: queue.Queue = queue.Queue(maxsize=max(max_queue, len(pending)))
+        for item in pending:
+            self._queue.put_nowait(item)
+        if pending:
+            logger.info(f"Replaying {len(pending)} pending writes from {len(orphans)} journals")
+
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._worker.start()
+
+    def submit(self, base_url: str, bank_id: str, retain_kwargs: Dict[str, Any]):
+        """Queue ``client.retain(bank_id=..., **retain_kwargs)`` for background delivery"""
+        item = {
+            "id": uuid.uuid4().hex,
+            "base_url": base_url,
+            "bank_id": bank_id,
+            "retain": retain_kwargs,
+            "attempts": 0,
+        }
+        self._journal({"pending": item})
+        try:
+            self._queue.put(item, timeout=self.block_timeout)
+        except queue.Full:
+            logger.warning("Write-behind queue full, retaining synchronously")
+            with self._send_lock:
+                self.sync_fallbacks += 1
+            self._send([item])
+
+    def flush(self, timeout: Optional[float] = None):
+        """Block until everything queued so far has been sent"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.warning(f"{self._queue.unfinished_tasks} writes still pending after flush timeout")
+                return
+            time.sleep(0.05)
+
+    def close(self, timeout: float = 30.0):
+        """Flush pending writes and stop the worker (called on shutdown)"""
+        self.flush(timeout)
+        self._stopping.set()
+        self._worker.join(timeout=self.flush_interval + 1)
+        with self._spill_lock:
+            if not self._live:
+                # Everything was delivered; nothing for the next run to replay
+                os.remove(self.spill_path)
+            # Closing releases the lock, so the next process adopts what is left
+            self._spill.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "sync_fallbacks": self.sync_fallbacks,
+            "deferred": self.deferred,
+        }
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                delivered = self._send(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if self._records >= max(self.compact_records, 2 * len(self._live)):
+                self._compact()
+            if not delivered:
+                # A server is down; give its breaker time before trying again
+                self._stopping.wait(self.flush_interval)
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _send(self, items: List[Dict[str, Any]]) -> bool:
+        """Deliver ``items``; False if some were held back because their server's circuit is open"""
+        with self._send_lock:
+            return self._send_locked(items)
+
+    def _send_locked(self, items: List[Dict[str, Any]]) -> bool:
+        """Body of ``_send``; the caller holds ``_send_lock``"""
+        delivered = True
+        by_bank: Dict[tuple, List[Dict[str, Any]]] = {}
+        for item in items:
+            by_bank.setdefault((item["base_url"], item["bank_id"]), []).append(item)
+
+        for (base_url, bank_id), bank_items in by_bank.items():
+            breaker = get_breaker(base_url)
+            if breaker.is_open() and not self._stopping.is_set():
+                # Hold the writes until the breaker lets a probe through
+                for item in bank_items:
+                    self._requeue(item)
+                delivered = False
+                continue
+            report = retain_batched(
+                get_client(base_url), bank_id, [item["retain"] for item in bank_items],
+                batch_size=self.batch_size, max_concurrency=1
+            )
+            get_recall_cache().invalidate_bank(bank_id)
+            for result in report.results:
+                item = bank_items[result.index]
+                if result.ok:
+                    self.flushed += 1
+                    self._journal({"done": item["id"]})
+                elif self._stopping.is_set():
+                    # Still pending in the spill file; replayed on the next start
+                    self.deferred += 1
+                    logger.warning(f"Keeping failed write to {bank_id} for replay after restart")
+                elif breaker.is_open():
+                    # The server is down rather than rejecting the write; keep it without spending an attempt
+                    self._requeue(item)
+                    delivered = False
+                else:
+                    item["attempts"] += 1
+                    if item["attempts"] < WRITE_BEHIND_MAX_ATTEMPTS:
+                        self._requeue(item)
+                    else:
+                        self.dropped += 1
+                        logger.warning(f"Dropping write to {bank_id} after {item['attempts']} attempts")
+                        swallowed_error("write_behind", "retain")
+                        self._journal({"done": item["id"]})
+        return delivered
+
+    def _requeue(self, item: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # Left in the spill file; it is replayed on the next start
+            self.deferred += 1
+            logger.warning(f"Write-behind queue full, deferring write to {item['bank_id']} to restart")
+
+    def _journal(self, record: Dict[str, Any]):
+        with self._spill_lock:
+            if self._spill.closed:
+                return
+            self._spill.write(json.dumps(record) + "\n")
+            self._spill.flush()
+            self._records += 1
+            if "pending" in record:
+                self._live[record["pending"]["id"]] = record["pending"]
+            else:
+                self._live.pop(record["done"], None)
+
+    def _compact(self):
+        """Drop delivered writes from the journal so it does not grow for the life of the process"""
+        with self._directory_lock(), self._spill_lock:
+            if self._spill.closed:
+                return
+            self._spill.close()
+            self._rewrite_spill()
+
+    @contextmanager
+    def _directory_lock(self):
+        """Serialize adopting and replacing journals across processes"""
+        with open(self.base_spill_path + ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            yield
+
+    def _orphaned_journals(self) -> List[str]:
+        """Journals of this family that no running process holds"""
+        root, ext = os.path.splitext(self.base_spill_path)
+        candidates = [self.base_spill_path] + [
+            path for path in glob.glob(f"{glob.escape(root)}.*{ext}")
+            if path[len(root) + 1:len(path) - len(ext)].isdigit()
+        ]
+        orphans = []
+        for path in candidates:
+            if not os.path.exists(path):
+                continue
+            with open(path, "a") as journal:
+                if _try_lock(journal.fileno()):
+                    orphans.append(path)
+        return orphans
+
+    def _load_spill(self, paths: List[str]) -> List[Dict[str, Any]]:
+        pending: Dict[str, Dict[str, Any]] = {}
+        for path in paths:
+            with open(path, encoding="utf-8") as spill:
+                for line in spill:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Torn write at crash time
+                    if "pending" in record:
+                        pending[record["pending"]["id"]] = record["pending"]
+                    elif "done" in record:
+                        pending.pop(record["done"], None)
+        self._live = dict(pending)
+        return list(pending.values())
+
+    def _rewrite_spill(self):
+        """Atomically replace this process's journal with only the live entries and lock it.
+
+        Called with the directory lock held, so no other process sees the
+        new file before it is locked.
+        """
+        tmp_path = self.spill_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as spill:
+            for item in self._live.values():
+                spill.write(json.dumps({"pending": item}) + "\n")
+            spill.flush()
+            os.fsync(spill.fileno())
+        os.replace(tmp_path, self.spill_path)
+        self._spill = open(self.spill_path, "a", encoding="utf-8")
+        _try_lock(self._spill.fileno())
+        self._records = len(self._live)
+
+
+_buffer: Optional[WriteBehindBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_behind() -> Optional[WriteBehindBuffer]:
+    """Process-wide write-behind buffer, or None when disabled"""
+    global _buffer
+    if not WRITE_BEHIND_ENABLED:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = WriteBehindBuffer()
+            atexit.register(_buffer.close)
+    return _buffer